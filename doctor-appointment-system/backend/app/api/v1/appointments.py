@@ -1,24 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import base64
+import binascii
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import date, datetime, timedelta
-from app.core.database import get_db
-from app.schemas.schemas import AppointmentCreate, AppointmentResponse, AppointmentUpdate
+from typing import List, Optional
+from datetime import date, datetime, time, timedelta
+from app.core.config import settings
+from app.core.database import get_async_db, get_db, get_read_db
+from app.core.write_queue import GroupCommitQueue, WriteOperation, get_write_queue
+from app.schemas.schemas import AppointmentCreate, AppointmentResponse, AppointmentRowResponse, AppointmentUpdate
 from app.models.models import Appointment, AppointmentStatus, UserRole
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, run_read
+from app.crud import crud_appointment_async
 from app.crud.crud_appointment import (
-    create_appointment, get_appointment, get_appointments_by_patient,
-    get_appointments_by_doctor, update_appointment, delete_appointment,
-    check_slot_availability
+    AppointmentCursor, book_appointment, insert_booking, get_appointment, find_appointment,
+    get_appointment_rows_by_patient, get_appointment_rows_by_doctor, update_appointment, apply_appointment_update,
+    delete_appointment, check_slot_availability, SlotDurationMismatch
 )
 
 router = APIRouter()
 
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(appointment: dict) -> str:
+    key = f"{appointment['appointment_date'].isoformat()},{appointment['appointment_time'].isoformat()}," \
+          f"{appointment['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[AppointmentCursor]:
+    if not cursor:
+        return None
+    try:
+        day, slot_time, appointment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return date.fromisoformat(day), time.fromisoformat(slot_time), int(appointment_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def paginate(response: Response, appointments: List[dict], limit: int) -> List[dict]:
+    """Trim the extra row fetched past the page and advertise the next cursor"""
+    if len(appointments) > limit:
+        appointments = appointments[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(appointments[-1])
+    return appointments
+
+
+def run_queued_write(db: Session, write_queue: GroupCommitQueue, operation: WriteOperation) -> Appointment:
+    """Run an appointment write on the group-commit queue and load the result in this session"""
+    def queued(session: Session) -> Optional[int]:
+        appointment = operation(session)
+        return appointment.id if appointment is not None else None
+
+    try:
+        # A write that times out before it starts is cancelled, so retrying cannot double-book
+        appointment_id = write_queue.run(queued, settings.WRITE_QUEUE_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Booking queue is busy, please retry",
+            headers={"Retry-After": "1"}
+        )
+    if appointment_id is None:
+        # Deleted between the permission check and the queued write
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Appointment not found"
+        )
+    return db.get(Appointment, appointment_id, populate_existing=True)
+
 
 @router.post("/", response_model=AppointmentResponse)
 def create_new_appointment(
         appointment: AppointmentCreate,
         db: Session = Depends(get_db),
+        write_queue: Optional[GroupCommitQueue] = Depends(get_write_queue),
         current_user=Depends(get_current_user)
 ):
     # Only patients can create appointments
@@ -28,16 +90,18 @@ def create_new_appointment(
             detail="Only patients can book appointments"
         )
 
-    # Check if slot is available
-    if not check_slot_availability(db, appointment.doctor_id, appointment.appointment_date,
-                                   appointment.appointment_time):
+    # Schedule membership, slot availability and the insert happen in one statement
+    try:
+        if write_queue is not None:
+            return run_queued_write(
+                db, write_queue, lambda session: insert_booking(session, appointment, current_user.id)
+            )
+        return book_appointment(db, appointment, current_user.id)
+    except SlotDurationMismatch as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This time slot is not available"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
         )
-
-    try:
-        return create_appointment(db, appointment, current_user.id)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -45,22 +109,42 @@ def create_new_appointment(
         )
 
 
-@router.get("/my", response_model=List[AppointmentResponse])
-def get_my_appointments(
-        db: Session = Depends(get_db),
+@router.get("/my", response_model=List[AppointmentRowResponse])
+async def get_my_appointments(
+        response: Response,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        status_filter: Optional[AppointmentStatus] = Query(None, alias="status"),
+        cursor: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=500),
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db),
         current_user=Depends(get_current_user)
 ):
+    filters = dict(from_date=from_date, to_date=to_date, status=status_filter,
+                   after=decode_cursor(cursor), limit=limit + 1)
+    # Lists are read as response dicts straight from a Core select; no ORM objects are built
     if current_user.role == UserRole.PATIENT:
-        return get_appointments_by_patient(db, current_user.id)
+        appointments = await run_read(async_db, db, crud_appointment_async.get_appointment_rows_by_patient,
+                                      get_appointment_rows_by_patient, current_user.id, **filters)
     else:  # Doctor
-        return get_appointments_by_doctor(db, current_user.id)
+        appointments = await run_read(async_db, db, crud_appointment_async.get_appointment_rows_by_doctor,
+                                      get_appointment_rows_by_doctor, current_user.id, **filters)
+    return paginate(response, appointments, limit)
 
 
-@router.get("/doctor/{doctor_id}", response_model=List[AppointmentResponse])
-def get_doctor_appointments(
+@router.get("/doctor/{doctor_id}", response_model=List[AppointmentRowResponse])
+async def get_doctor_appointments(
         doctor_id: int,
+        response: Response,
         appointment_date: date = None,
-        db: Session = Depends(get_db),
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        status_filter: Optional[AppointmentStatus] = Query(None, alias="status"),
+        cursor: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=500),
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db),
         current_user=Depends(get_current_user)
 ):
     # Only doctors can see all appointments, patients can only see their own
@@ -70,22 +154,27 @@ def get_doctor_appointments(
             detail="You can only view your own appointments"
         )
 
-    appointments = get_appointments_by_doctor(db, doctor_id)
-
-    # Filter by date if provided
+    # A single appointment_date is shorthand for from_date == to_date
     if appointment_date:
-        appointments = [a for a in appointments if a.appointment_date == appointment_date]
+        from_date = to_date = appointment_date
 
-    return appointments
+    appointments = await run_read(
+        async_db, db, crud_appointment_async.get_appointment_rows_by_doctor, get_appointment_rows_by_doctor, doctor_id,
+        from_date=from_date, to_date=to_date, status=status_filter, after=decode_cursor(cursor), limit=limit + 1
+    )
+    return paginate(response, appointments, limit)
 
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
-def get_appointment_by_id(
+async def get_appointment_by_id(
         appointment_id: int,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db),
         current_user=Depends(get_current_user)
 ):
-    appointment = get_appointment(db, appointment_id)
+    # Archived appointments stay readable by id
+    appointment = await run_read(async_db, db, crud_appointment_async.find_appointment, find_appointment,
+                                 appointment_id)
     if not appointment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -112,6 +201,7 @@ def update_appointment_by_id(
         appointment_id: int,
         appointment_update: AppointmentUpdate,
         db: Session = Depends(get_db),
+        write_queue: Optional[GroupCommitQueue] = Depends(get_write_queue),
         current_user=Depends(get_current_user)
 ):
     appointment = get_appointment(db, appointment_id)
@@ -153,13 +243,24 @@ def update_appointment_by_id(
                 detail="The new time slot is not available"
             )
 
-    return update_appointment(db, appointment_id, appointment_update)
+    try:
+        if write_queue is not None:
+            return run_queued_write(
+                db, write_queue, lambda session: apply_appointment_update(session, appointment_id, appointment_update)
+            )
+        return update_appointment(db, appointment_id, appointment_update)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 
 @router.delete("/{appointment_id}")
 def cancel_appointment(
         appointment_id: int,
         db: Session = Depends(get_db),
+        write_queue: Optional[GroupCommitQueue] = Depends(get_write_queue),
         current_user=Depends(get_current_user)
 ):
     appointment = get_appointment(db, appointment_id)
@@ -183,6 +284,11 @@ def cancel_appointment(
 
     # Update status to cancelled instead of deleting
     appointment_update = AppointmentUpdate(status=AppointmentStatus.CANCELLED)
-    update_appointment(db, appointment_id, appointment_update)
+    if write_queue is not None:
+        run_queued_write(
+            db, write_queue, lambda session: apply_appointment_update(session, appointment_id, appointment_update)
+        )
+    else:
+        update_appointment(db, appointment_id, appointment_update)
 
     return {"message": "Appointment cancelled successfully"}
\ No newline at end of file
@@ -1,18 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+import math
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from app.core.database import get_db
-from app.core.security import verify_password, create_access_token, decode_access_token
+from typing import Callable, Optional, TypeVar
+from datetime import datetime, timedelta
+from app.api.v1.dependencies import is_token_revoked, run_read
+from app.core.config import settings
+from app.core.database import get_async_db, get_db, get_read_db
+from app.core.password_pool import PasswordPool, PoolSaturated, get_password_pool
+from app.core.rate_limit import RateLimiter, client_ip, get_rate_limiter, parse_networks
+from app.core.security import (
+    get_password_hash, verify_password, password_needs_rehash, create_access_token, decode_access_token
+)
 from app.schemas.schemas import UserCreate, UserLogin, Token, UserResponse
-from app.crud.crud_user import create_user, get_user_by_username
+from app.crud import crud_user_async
+from app.crud.crud_revoked_token import revoke_token
+from app.crud.crud_refresh_token import issue_refresh_token, revoke_refresh_token, rotate_refresh_token
+from app.crud.crud_user import create_user, get_user_by_username, queue_password_rehash
+from app.models.models import User
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# The refresh token is only sent to the auth endpoints
+REFRESH_COOKIE_PATH = "/api/v1/auth"
+
+# Proxies whose X-Forwarded-For names the client to rate limit
+TRUSTED_PROXIES = parse_networks(settings.TRUSTED_PROXIES)
+
+
+async def run_password_task(pool: Optional[PasswordPool], func: Callable[..., T], *args) -> T:
+    """Run bcrypt on the password pool, or in the threadpool when the pool is disabled"""
+    if pool is None:
+        return await run_in_threadpool(func, *args)
+    try:
+        return await pool.run(func, *args)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress, please retry",
+            headers={"Retry-After": str(settings.PASSWORD_POOL_RETRY_AFTER_SECONDS)}
+        )
+
+
+async def enforce_rate_limit(limiter: Optional[RateLimiter], request: Request,
+                             username: Optional[str] = None) -> None:
+    """Take a token for the client IP and username before any bcrypt work, or refuse with 429"""
+    if limiter is None:
+        return
+    wait = await run_in_threadpool(limiter.check, ip=client_ip(request, TRUSTED_PROXIES), username=username)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please retry later",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+async def rehash_password(pool: Optional[PasswordPool], user_id: int, old_hash: str, password: str) -> None:
+    """Hash a just-verified password at the current cost and queue it for the next batched write"""
+    try:
+        new_hash = await run_password_task(pool, get_password_hash, password, settings.BCRYPT_ROUNDS)
+    except HTTPException:
+        return  # Pool saturated; the user's next login tries again
+    queue_password_rehash(user_id, old_hash, new_hash)
+
+
+def start_session(response: Response, user: User, refresh_token: str) -> dict:
+    """Issue an access token for the user and set both session cookies"""
+    access_token = create_access_token(
+        data={"sub": user.username, "user_id": user.id, "role": user.role}
+    )
+
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=False,  # Set to True in production with HTTPS
+        samesite="lax",
+        max_age=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=False,  # Set to True in production with HTTPS
+        samesite="strict",
+        path=REFRESH_COOKIE_PATH,
+        max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+    )
+
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "user": UserResponse.from_orm(user)
+    }
+
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(
+        request: Request,
+        user: UserCreate,
+        db: Session = Depends(get_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db),
+        pool: Optional[PasswordPool] = Depends(get_password_pool),
+        limiter: Optional[RateLimiter] = Depends(get_rate_limiter)
+):
+    await enforce_rate_limit(limiter, request)
+
     # Check if user already exists
-    db_user = get_user_by_username(db, username=user.username)
+    db_user = await run_read(async_db, db, crud_user_async.get_user_by_username,
+                             get_user_by_username, user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -20,14 +121,28 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         )
 
     # Create new user
-    return create_user(db, user)
+    hashed_password = await run_password_task(pool, get_password_hash, user.password, settings.BCRYPT_ROUNDS)
+    return await run_in_threadpool(create_user, db, user, hashed_password)
 
 
 @router.post("/login")
-def login(response: Response, user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(
+        request: Request,
+        response: Response,
+        background_tasks: BackgroundTasks,
+        user_credentials: UserLogin,
+        db: Session = Depends(get_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db),
+        pool: Optional[PasswordPool] = Depends(get_password_pool),
+        limiter: Optional[RateLimiter] = Depends(get_rate_limiter)
+):
+    await enforce_rate_limit(limiter, request, user_credentials.username.lower())
+
     # Authenticate user
-    user = get_user_by_username(db, username=user_credentials.username)
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+    user = await run_read(async_db, db, crud_user_async.get_user_by_username,
+                          get_user_by_username, user_credentials.username)
+    if not user or not await run_password_task(pool, verify_password, user_credentials.password,
+                                               user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -40,36 +155,56 @@ def login(response: Response, user_credentials: UserLogin, db: Session = Depends
             detail="Inactive user"
         )
 
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.id, "role": user.role}
-    )
+    # Upgrade hashes made at another bcrypt cost once the response is sent
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(rehash_password, pool, user.id, user.hashed_password,
+                                  user_credentials.password)
 
-    # Set cookie
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        secure=False,  # Set to True in production with HTTPS
-        samesite="lax",
-        max_age=1800  # 30 minutes
-    )
+    refresh_token = await run_in_threadpool(issue_refresh_token, db, user.id)
+    return start_session(response, user, refresh_token)
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": UserResponse.from_orm(user)
-    }
+
+@router.post("/refresh")
+def refresh(request: Request, response: Response, db: Session = Depends(get_db)):
+    # Renew the session from the refresh cookie without re-checking the password
+    token = request.cookies.get("refresh_token")
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+
+    try:
+        user, refresh_token = rotate_refresh_token(db, token)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
+
+    return start_session(response, user, refresh_token)
 
 
 @router.post("/logout")
-def logout(response: Response):
+def logout(request: Request, response: Response, db: Session = Depends(get_db)):
+    token = request.cookies.get("refresh_token")
+    if token:
+        revoke_refresh_token(db, token)
+    # Revoke the access token too, so it stops working before its exp
+    payload = decode_access_token(request.cookies.get("access_token", ""))
+    if payload and "jti" in payload:
+        revoke_token(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
     response.delete_cookie(key="access_token")
+    response.delete_cookie(key="refresh_token", path=REFRESH_COOKIE_PATH)
     return {"message": "Successfully logged out"}
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(
+        request: Request,
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db)
+):
     # Get token from cookie
     token = request.cookies.get("access_token")
     if not token:
@@ -85,9 +220,15 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
+    if await is_token_revoked(db, async_db, payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
 
     # Get user
-    user = get_user_by_username(db, username=payload.get("sub"))
+    user = await run_read(async_db, db, crud_user_async.get_user_by_username,
+                          get_user_by_username, payload.get("sub"))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
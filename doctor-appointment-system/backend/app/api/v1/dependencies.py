@@ -1,11 +1,66 @@
+from typing import Awaitable, Callable, Optional, TypeVar
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_async_db, get_read_db
 from app.core.security import decode_access_token
-from app.crud.crud_user import get_user_by_username
+from app.crud import crud_revoked_token, crud_revoked_token_async, crud_user, crud_user_async
+from app.crud.crud_user import Principal, principal_cache
 
+T = TypeVar("T")
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+
+async def run_read(
+        async_db: Optional[AsyncSession],
+        db: Session,
+        async_read: Callable[..., Awaitable[T]],
+        sync_read: Callable[..., T],
+        *args,
+        **kwargs
+) -> T:
+    """Run a read on the async session when one is configured, else the sync CRUD in the threadpool"""
+    if async_db is not None:
+        return await async_read(async_db, *args, **kwargs)
+    return await run_in_threadpool(sync_read, db, *args, **kwargs)
+
+
+async def is_token_revoked(db: Session, async_db: Optional[AsyncSession], payload: dict) -> bool:
+    """Check the token's jti against the revocation filter, confirming filter hits in the database"""
+    jti = payload.get("jti")
+    if jti is None or jti not in crud_revoked_token.revocation_filter:
+        return False
+    revoked = await run_read(async_db, db, crud_revoked_token_async.get_revoked_token,
+                             crud_revoked_token.get_revoked_token, jti)
+    return revoked is not None
+
+
+async def load_principal(
+        db: Session,
+        async_db: Optional[AsyncSession],
+        username: str,
+        user_id: Optional[int]
+) -> Principal:
+    """Look the token's user up by primary key, or by username for tokens without a user_id"""
+    if user_id is not None:
+        user = await run_read(async_db, db, crud_user_async.get_user_by_id, crud_user.get_user_by_id, user_id)
+    else:
+        user = await run_read(async_db, db, crud_user_async.get_user_by_username,
+                              crud_user.get_user_by_username, username)
+    if user is None or user.username != username:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Principal.from_user(user)
+
+
+async def get_current_user(
+        request: Request,
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db)
+) -> Principal:
     # Get token from cookie
     token = request.cookies.get("access_token")
     if not token:
@@ -24,7 +79,6 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Get user from database
     username = payload.get("sub")
     if username is None:
         raise HTTPException(
@@ -33,18 +87,26 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = get_user_by_username(db, username=username)
-    if user is None:
+    if await is_token_revoked(db, async_db, payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if not user.is_active:
+    # Tokens without user_id/iat predate the principal cache and fall back to the username
+    user_id = payload.get("user_id")
+    cache_key = (user_id, payload.get("iat")) if user_id is not None and "iat" in payload else None
+    principal = principal_cache.get(cache_key) if cache_key is not None else None
+    if principal is None:
+        principal = await load_principal(db, async_db, username, user_id)
+        if cache_key is not None:
+            principal_cache.set(cache_key, principal)
+
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
 
-    return user
\ No newline at end of file
+    return principal
@@ -1,18 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+import json
+from typing import List, Optional, Union
 from datetime import date, datetime, timedelta, time
-from app.core.database import get_db
-from app.schemas.schemas import ScheduleCreate, ScheduleResponse, ScheduleUpdate, AvailableSlot
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
+from app.schemas.schemas import (
+    ScheduleCreate, ScheduleResponse, ScheduleUpdate, AvailableSlot, NextAvailableSlot,
+    SlotFormat, CompactAvailability
+)
 from app.models.models import Schedule, UserRole
 from app.api.v1.dependencies import get_current_user
+from app.core.slot_engine import encode_day, render_slots_json, render_slots_ndjson
+from app.crud.crud_availability import get_free_slot_masks, iter_free_slot_masks, find_next_available_slots
 from app.crud.crud_schedule import (
     create_schedule, get_schedule, get_schedules_by_doctor,
-    update_schedule, delete_schedule, get_available_slots
+    update_schedule, delete_schedule
 )
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def stream_available_slots(bind, doctor_id: int, start_date: date, end_date: date, slot_format: SlotFormat):
+    # The request session is closed before a streamed body is sent, so the stream owns its own
+    db = Session(bind=bind, autoflush=False)
+    try:
+        days = iter_free_slot_masks(db, doctor_id, start_date, end_date)
+        if slot_format == SlotFormat.SLOTS:
+            yield from render_slots_ndjson(doctor_id, days)
+        else:
+            for day, mask in days:
+                yield (json.dumps(encode_day(day, mask, slot_format.value), separators=(",", ":")) + "\n").encode()
+    finally:
+        db.close()
+
 
 @router.post("/", response_model=ScheduleResponse)
 def create_doctor_schedule(
@@ -38,7 +62,7 @@ def create_doctor_schedule(
 
 @router.get("/my", response_model=List[ScheduleResponse])
 def get_my_schedules(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user=Depends(get_current_user)
 ):
     if current_user.role != UserRole.DOCTOR:
@@ -53,31 +77,73 @@ def get_my_schedules(
 @router.get("/doctor/{doctor_id}", response_model=List[ScheduleResponse])
 def get_doctor_schedules(
         doctor_id: int,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     return get_schedules_by_doctor(db, doctor_id)
 
 
-@router.get("/doctor/{doctor_id}/available-slots", response_model=List[AvailableSlot])
+@router.get("/doctor/{doctor_id}/available-slots", response_model=Union[List[AvailableSlot], CompactAvailability],
+            responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}})
 def get_doctor_available_slots(
         doctor_id: int,
+        request: Request,
         start_date: date = Query(..., description="Start date for availability search"),
         end_date: date = Query(..., description="End date for availability search"),
+        slot_format: SlotFormat = Query(SlotFormat.SLOTS, alias="format",
+                                        description="slots (one object per slot), runs or bitmap (per day)"),
+        # Availability is read from the primary: masks read off a lagging replica would be
+        # cached for every client until the TTL runs out
         db: Session = Depends(get_db)
 ):
+    # Clients sending "Accept: application/x-ndjson" get a day-by-day stream over longer ranges
+    streaming = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    max_range_days = (settings.AVAILABILITY_STREAM_MAX_RANGE_DAYS if streaming
+                      else settings.AVAILABILITY_MAX_RANGE_DAYS)
+
     if end_date < start_date:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="End date must be after start date"
         )
 
-    if (end_date - start_date).days > 30:
+    if (end_date - start_date).days > max_range_days:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Date range cannot exceed 30 days"
+            detail=f"Date range cannot exceed {max_range_days} days"
+        )
+
+    if streaming:
+        return StreamingResponse(
+            stream_available_slots(db.get_bind(), doctor_id, start_date, end_date, slot_format),
+            media_type=NDJSON_MEDIA_TYPE
         )
 
-    return get_available_slots(db, doctor_id, start_date, end_date)
+    # Slots stay as per-day bitmaps until they are rendered straight to JSON
+    days = get_free_slot_masks(db, doctor_id, start_date, end_date)
+    if slot_format == SlotFormat.SLOTS:
+        return Response(content=render_slots_json(doctor_id, days), media_type="application/json")
+
+    compact = {
+        "doctor_id": doctor_id,
+        "format": slot_format.value,
+        "days": [encode_day(day, mask, slot_format.value) for day, mask in days],
+    }
+    return Response(content=json.dumps(compact, separators=(",", ":")), media_type="application/json")
+
+
+@router.get("/next-available", response_model=List[NextAvailableSlot])
+def get_next_available_slots(
+        limit: int = Query(10, ge=1, le=100, description="Number of slots to return"),
+        doctor_id: Optional[List[int]] = Query(None, description="Restrict the search to these doctors"),
+        from_date: Optional[date] = Query(None, description="Earliest date to search from (default today)"),
+        max_days: int = Query(30, ge=1, le=90, description="Number of days to search"),
+        db: Session = Depends(get_db)
+):
+    slots = find_next_available_slots(db, limit, from_date, max_days, doctor_id)
+    return [
+        NextAvailableSlot(date=slot_date, time=slot_time, doctor_id=slot_doctor_id, doctor_name=doctor_name)
+        for slot_date, slot_time, slot_doctor_id, doctor_name in slots
+    ]
 
 
 @router.put("/{schedule_id}", response_model=ScheduleResponse)
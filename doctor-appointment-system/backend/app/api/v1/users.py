@@ -1,22 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
-from app.schemas.schemas import UserResponse
+from typing import List, Optional
+from app.api.v1.dependencies import run_read
+from app.core.database import get_async_db, get_read_db
+from app.schemas.schemas import UserResponse, UserRowResponse
 from app.models.models import UserRole
-from app.crud.crud_user import get_all_doctors, get_user_by_id
+from app.crud import crud_user_async
+from app.crud.crud_user import get_doctor_rows, get_user_by_id
 
 router = APIRouter()
 
-@router.get("/doctors", response_model=List[UserResponse])
-def get_doctors_list(db: Session = Depends(get_db)):
+@router.get("/doctors", response_model=List[UserRowResponse])
+async def get_doctors_list(
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db)
+):
     """Get list of all doctors"""
-    return get_all_doctors(db)
+    return await run_read(async_db, db, crud_user_async.get_doctor_rows, get_doctor_rows)
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user_details(user_id: int, db: Session = Depends(get_db)):
+async def get_user_details(
+        user_id: int,
+        db: Session = Depends(get_read_db),
+        async_db: Optional[AsyncSession] = Depends(get_async_db)
+):
     """Get user details by ID"""
-    user = get_user_by_id(db, user_id)
+    user = await run_read(async_db, db, crud_user_async.get_user_by_id, get_user_by_id, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,62 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings with lookup counters.
+
+    Sized for ``capacity`` items at a false positive rate of ``error_rate``. A miss
+    is definite; a hit only means the item may have been added. Items cannot be
+    removed, so the filter is rebuilt from its source of truth instead.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.items = 0
+        self.lookups = 0
+        self.positives = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k probes derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.items += 1
+
+    def __contains__(self, item: str) -> bool:
+        # One buffer for the whole probe, even if clear() swaps it meanwhile
+        bits = self._bits
+        found = all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+        with self._lock:
+            self.lookups += 1
+            if found:
+                self.positives += 1
+        return found
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bits = bytearray(len(self._bits))
+            self.items = 0
+
+    def stats(self) -> dict:
+        return {
+            "items": self.items,
+            "capacity": self.capacity,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "lookups": self.lookups,
+            "positives": self.positives,
+        }
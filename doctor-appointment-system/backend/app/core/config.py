@@ -1,12 +1,90 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./appointments.db"
+    # Connection pool of a server database such as PostgreSQL; SQLite keeps SQLAlchemy's defaults
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Read-only endpoints use their own pool: a replica when set, else a read-only view of DATABASE_URL
+    READ_DATABASE_URL: Optional[str] = None
+    READ_POOL_SIZE: int = 10
+    READ_POOL_MAX_OVERFLOW: int = 10
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+
+    # Verified access tokens kept in memory so repeat requests skip signature checks
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+
+    # Bloom filter of revoked access token ids; only filter hits are checked in the database
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+
+    # SQLite connection PRAGMAs: "wal" or "default"; the SQLITE_* values override the profile's
+    SQLITE_PROFILE: str = "wal"
+    SQLITE_BUSY_TIMEOUT_MS: Optional[int] = None
+    SQLITE_MMAP_SIZE: Optional[int] = None
+    SQLITE_CACHE_SIZE: Optional[int] = None
+    # Background WAL checkpoints; a WAL larger than SQLITE_CHECKPOINT_TRUNCATE_PAGES is truncated
+    SQLITE_CHECKPOINT_INTERVAL_SECONDS: int = 60  # 0 disables the checkpoint task
+    SQLITE_CHECKPOINT_TRUNCATE_PAGES: int = 10000
+
+    # Materialized slot availability
+    AVAILABILITY_HORIZON_DAYS: int = 60
+    AVAILABILITY_REFRESH_INTERVAL_SECONDS: int = 3600  # 0 disables the horizon job
+
+    # In-process cache of per-day free slots, keyed by (doctor_id, date)
+    AVAILABILITY_CACHE_MAX_ENTRIES: int = 10000
+    AVAILABILITY_CACHE_TTL_SECONDS: int = 300
+
+    # In-process cache of authenticated users, keyed by (user_id, token iat)
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+
+    # Longest range served by the available-slots endpoint as JSON and as NDJSON
+    AVAILABILITY_MAX_RANGE_DAYS: int = 30
+    AVAILABILITY_STREAM_MAX_RANGE_DAYS: int = 365
+
+    # Completed and cancelled appointments older than this many days move to appointments_archive
+    APPOINTMENT_ARCHIVE_AFTER_DAYS: int = 90
+    APPOINTMENT_ARCHIVE_BATCH_SIZE: int = 500
+    APPOINTMENT_ARCHIVE_INTERVAL_SECONDS: int = 3600  # 0 disables the archive job
+
+    # Group-commit queue batching booking writes into one transaction (meant for SQLite)
+    WRITE_QUEUE_ENABLED: bool = False
+    WRITE_QUEUE_MAX_BATCH: int = 64
+    WRITE_QUEUE_MAX_DELAY_MS: int = 5
+    WRITE_QUEUE_TIMEOUT_SECONDS: int = 10
+
+    # bcrypt cost; unset calibrates the highest cost hashing within BCRYPT_TARGET_MS at startup
+    BCRYPT_ROUNDS: Optional[int] = None
+    BCRYPT_TARGET_MS: int = 250
+    # Never calibrate below the passlib default that existing hashes were made at
+    BCRYPT_MIN_ROUNDS: int = 12
+    # Hashes upgraded to the current cost on login are written in one batch this often
+    PASSWORD_REHASH_FLUSH_INTERVAL_SECONDS: int = 5
+
+    # Process pool for bcrypt hashing and verification; 0 workers runs bcrypt in the request threadpool
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_POOL_MAX_PENDING: int = 64
+    PASSWORD_POOL_RETRY_AFTER_SECONDS: int = 2
+
+    # Token buckets in front of bcrypt on login/register, per client IP and per username
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_IP_BURST: int = 20
+    RATE_LIMIT_IP_PER_MINUTE: float = 20
+    RATE_LIMIT_USERNAME_BURST: int = 5
+    RATE_LIMIT_USERNAME_PER_MINUTE: float = 5
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # SQLite file holding the buckets for all workers on a host; unset keeps them in process memory
+    RATE_LIMIT_STATE_PATH: Optional[str] = None
+    # Addresses or CIDR blocks of proxies (the frontend) whose X-Forwarded-For is trusted, as JSON
+    TRUSTED_PROXIES: List[str] = []
 
     class Config:
         env_file = ".env"
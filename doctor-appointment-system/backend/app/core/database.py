@@ -1,28 +1,163 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Optional
 from app.core.config import settings
 
+
+def is_async_url(url: str) -> bool:
+    """True when the URL names an async driver such as sqlite+aiosqlite or postgresql+asyncpg"""
+    return make_url(url).get_dialect().is_async
+
+
+def to_sync_url(url: str) -> str:
+    """The same database through the backend's default sync driver"""
+    parsed = make_url(url)
+    if not is_async_url(url):
+        return url
+    return parsed.set(drivername=parsed.get_backend_name()).render_as_string(hide_password=False)
+
+
+# Startup, migrations, background jobs and writes always use the sync engine
+SYNC_DATABASE_URL = to_sync_url(settings.DATABASE_URL)
+
 # SQLite specific connection args
 connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 
+
+def server_pool_options(url: str) -> dict:
+    """Pool sizing from the DB_POOL_* settings for a server database; empty for SQLite"""
+    if "sqlite" in url:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        # Replace connections before the server or a proxy drops them as idle
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+
 engine = create_engine(
-    settings.DATABASE_URL,
+    SYNC_DATABASE_URL,
     connect_args=connect_args,
-    pool_pre_ping=True  # Enable connection health checks
+    pool_pre_ping=True,  # Enable connection health checks
+    **server_pool_options(SYNC_DATABASE_URL)
 )
 
-# Enable foreign key constraints for SQLite
-if "sqlite" in settings.DATABASE_URL:
-    from sqlalchemy import event
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
+# PRAGMAs run on every new SQLite connection, by SQLITE_PROFILE
+SQLITE_PROFILES = {
+    # SQLite's defaults: rollback journal, readers and the writer block each other
+    "default": {"foreign_keys": "ON"},
+    # Readers never block the writer and commits skip the fsync of every transaction
+    "wal": {
+        "foreign_keys": "ON",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative is KiB: 64 MiB per connection
+    },
+}
+
+
+def sqlite_pragmas(profile: str = settings.SQLITE_PROFILE) -> dict:
+    """The profile's PRAGMAs with any SQLITE_* setting overriding its value"""
+    pragmas = dict(SQLITE_PROFILES[profile])
+    overrides = {
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+    pragmas.update({name: value for name, value in overrides.items() if value is not None})
+    return pragmas
+
+
+def sqlite_pragma_listener(pragmas: dict):
+    """A connect event listener applying ``pragmas`` to each new DBAPI connection"""
+    def apply_pragmas(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
         cursor.close()
+    return apply_pragmas
+
+
+set_sqlite_pragma = sqlite_pragma_listener(sqlite_pragmas())
+
+
+# Foreign keys and the performance profile for SQLite
+if "sqlite" in settings.DATABASE_URL:
+    event.listen(engine, "connect", set_sqlite_pragma)
+
+
+def create_writer_engine(url: str = SYNC_DATABASE_URL):
+    """Single-connection engine for the group-commit write queue.
+
+    On SQLite, pysqlite's implicit transaction handling is switched off and
+    SQLAlchemy emits BEGIN IMMEDIATE itself, so the per-operation SAVEPOINTs of a
+    batch nest inside one transaction and the write lock is taken up front.
+    """
+    writer_engine = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0)
+    if "sqlite" in url:
+        event.listen(writer_engine, "connect", set_sqlite_pragma)
+
+        @event.listens_for(writer_engine, "connect")
+        def disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(writer_engine, "begin")
+        def begin_immediate(connection):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_read_only_url(url: str) -> str:
+    """A SQLite file URL reopened read-only through a URI filename; other URLs are returned as is"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return url
+    return parsed.set(database=f"file:{parsed.database}", query={"mode": "ro", "uri": "true"}).render_as_string(
+        hide_password=False)
+
+
+def create_read_engine(url: str = SYNC_DATABASE_URL, replica_url: Optional[str] = None, **pool_options):
+    """Engine with its own pool for read-only requests.
+
+    Uses the replica when one is configured. Otherwise a SQLite file is opened in
+    ``mode=ro`` with ``query_only`` on, so reads can never take the write lock.
+    Other databases fall back to a separate pool on the primary. Returns None for
+    an in-memory SQLite database, which only the primary engine can see.
+    """
+    url = replica_url or url
+    if "sqlite" not in url:
+        return create_engine(url, pool_pre_ping=True, **{**server_pool_options(url), **pool_options})
+
+    read_url = to_read_only_url(url)
+    if read_url == url:
+        return None
+    read_engine = create_engine(read_url, connect_args=connect_args, **pool_options)
+    # The journal mode is the writer's to set; a read-only connection just follows it
+    pragmas = {name: value for name, value in sqlite_pragmas().items() if name != "journal_mode"}
+    pragmas["query_only"] = "ON"
+    event.listen(read_engine, "connect", sqlite_pragma_listener(pragmas))
+    return read_engine
+
+
+read_engine = create_read_engine(
+    replica_url=settings.READ_DATABASE_URL,
+    pool_size=settings.READ_POOL_SIZE,
+    max_overflow=settings.READ_POOL_MAX_OVERFLOW
+) or engine
+ReadSessionLocal = sessionmaker(autoflush=False, bind=read_engine)
+
 Base = declarative_base()
 
 # Dependency to get database session
@@ -31,4 +166,38 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Dependency yielding a session on the read-only engine, for endpoints that never write"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def create_async_database_engine(url: str, **engine_options):
+    if "sqlite" in url:
+        # aiosqlite otherwise opens (and starts a thread for) a new connection per session
+        engine_options.setdefault("poolclass", AsyncAdaptedQueuePool)
+    engine_options = {**server_pool_options(url), **engine_options}
+    async_engine = create_async_engine(url, pool_pre_ping=True, **engine_options)
+    if "sqlite" in url:
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragma)
+    return async_engine
+
+
+# Async reads are enabled by an async driver in DATABASE_URL
+async_engine = create_async_database_engine(settings.DATABASE_URL) if is_async_url(settings.DATABASE_URL) else None
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False) if async_engine is not None else None
+
+
+async def get_async_db():
+    """Dependency yielding an AsyncSession, or None when DATABASE_URL uses a sync driver"""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
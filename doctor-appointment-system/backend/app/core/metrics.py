@@ -0,0 +1,12 @@
+from typing import Callable, Dict
+
+# Named collectors returning a dict of counters, reported by GET /metrics
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, collector: Callable[[], dict]) -> None:
+    _collectors[name] = collector
+
+
+def collect() -> Dict[str, dict]:
+    return {name: collector() for name, collector in _collectors.items()}
@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class PoolSaturated(Exception):
+    """Raised when the password pool already has its maximum number of operations queued"""
+
+
+def _mp_context():
+    # forkserver forks workers from a clean process rather than the threaded server
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(["app.core.security"])
+    return context
+
+
+class PasswordPool:
+    """Bounded process pool for bcrypt hashing and verification.
+
+    Keeps bcrypt's CPU time off the request threadpool and the event loop. At most
+    ``max_pending`` operations may be queued or running; beyond that ``run`` raises
+    PoolSaturated instead of letting a login storm queue without bound.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ProcessPoolExecutor(max_workers, mp_context=_mp_context())
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated()
+            self.pending += 1
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _done(self, future: Optional[Future]) -> None:
+        with self._lock:
+            self.pending -= 1
+            if future is not None:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_pool: Optional[PasswordPool] = None
+
+
+def start_password_pool(max_workers: int, max_pending: int) -> PasswordPool:
+    global password_pool
+    password_pool = PasswordPool(max_workers, max_pending)
+    metrics.register("password_pool", password_pool.stats)
+    return password_pool
+
+
+def stop_password_pool() -> None:
+    global password_pool
+    if password_pool is not None:
+        password_pool.shutdown()
+        password_pool = None
+
+
+def get_password_pool() -> Optional[PasswordPool]:
+    """Dependency returning the running password pool, or None when bcrypt runs in the threadpool"""
+    return password_pool
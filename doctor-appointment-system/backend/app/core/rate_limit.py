@@ -0,0 +1,252 @@
+import ipaddress
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from starlette.requests import Request
+
+from app.core import metrics
+
+
+class BucketRule(NamedTuple):
+    """A bucket holds up to ``capacity`` tokens and regains ``refill_per_second`` of them"""
+    capacity: int
+    refill_per_second: float
+
+
+def refill(tokens: float, updated: float, rule: BucketRule, now: float) -> float:
+    return min(rule.capacity, tokens + (now - updated) * rule.refill_per_second)
+
+
+def take_token(tokens: float, updated: float, rule: BucketRule, now: float) -> Tuple[float, float]:
+    """Refill a bucket up to ``now`` and take one token; returns (tokens left, seconds to wait)"""
+    tokens = refill(tokens, updated, rule, now)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rule.refill_per_second
+
+
+def take_tokens(buckets: List[Tuple[float, float, BucketRule]], now: float) -> Tuple[List[float], List[float]]:
+    """Refill (tokens, updated, rule) buckets and take one token from each, but only if all have one.
+
+    Returns the tokens left and the seconds each bucket needs before it has a token.
+    When any bucket is empty, none is charged.
+    """
+    levels = [refill(tokens, updated, rule, now) for tokens, updated, rule in buckets]
+    waits = [0.0 if level >= 1 else (1 - level) / rule.refill_per_second
+             for level, (_, _, rule) in zip(levels, buckets)]
+    if any(waits):
+        return levels, waits
+    return [level - 1 for level in levels], waits
+
+
+class MemoryBucketStore:
+    """Buckets for one process, keeping the ``max_keys`` most recently used"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: BucketRule, now: float) -> float:
+        return self.take_all([(key, rule)], now)[0]
+
+    def take_all(self, buckets: List[Tuple[str, BucketRule]], now: float) -> List[float]:
+        """Take a token from every bucket or from none; returns the wait of each"""
+        with self._lock:
+            states = [self._buckets.pop(key, (rule.capacity, now)) for key, rule in buckets]
+            levels, waits = take_tokens(
+                [(tokens, updated, rule) for (tokens, updated), (_, rule) in zip(states, buckets)], now
+            )
+            for (key, _), level in zip(buckets, levels):
+                self._buckets[key] = (level, now)
+            while len(self._buckets) > self.max_keys:
+                # A forgotten bucket comes back full, which only errs towards allowing
+                self._buckets.popitem(last=False)
+            return waits
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBucketStore:
+    """Buckets in a SQLite file shared by every worker process on the host.
+
+    Each take runs in its own BEGIN IMMEDIATE transaction, so concurrent workers
+    serialize on the file lock rather than double-spending a token.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, max_idle_seconds: float = 3600):
+        self.path = path
+        self.max_idle_seconds = max_idle_seconds
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._takes = 0
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_updated ON rate_limit_buckets (updated)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One autocommit connection per thread; transactions are opened explicitly
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def take(self, key: str, rule: BucketRule, now: float) -> float:
+        return self.take_all([(key, rule)], now)[0]
+
+    def take_all(self, buckets: List[Tuple[str, BucketRule]], now: float) -> List[float]:
+        """Take a token from every bucket or from none; returns the wait of each"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            states = []
+            for key, rule in buckets:
+                row = connection.execute(
+                    "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row is not None else (rule.capacity, now)
+                states.append((tokens, updated, rule))
+            levels, waits = take_tokens(states, now)
+            connection.executemany(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                [(key, level, now) for (key, _), level in zip(buckets, levels)]
+            )
+            with self._lock:
+                self._takes += 1
+                prune = self._takes % self.PRUNE_EVERY == 0
+            if prune:
+                # Buckets idle this long have refilled and are equivalent to missing ones
+                connection.execute("DELETE FROM rate_limit_buckets WHERE updated < ?",
+                                   (now - self.max_idle_seconds,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return waits
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+class RateLimiter:
+    """Token-bucket limiter with one rule per scope, e.g. client IP and username.
+
+    ``check`` takes a token from the bucket of every scope given and returns how
+    many seconds to wait when any of them is empty, or 0 when the call may proceed.
+    A rejected call is charged to no bucket, so attempts refused for one username
+    do not use up the client IP's allowance.
+    """
+
+    def __init__(self, store, rules: Dict[str, BucketRule]):
+        self.store = store
+        self.rules = rules
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejections = 0
+        self.rejected = {scope: 0 for scope in rules}
+
+    def check(self, **keys: Optional[str]) -> float:
+        scopes = [scope for scope, key in keys.items() if key is not None]
+        waits = self.store.take_all(
+            [(f"{scope}:{keys[scope]}", self.rules[scope]) for scope in scopes], time.time()
+        ) if scopes else []
+        wait = max(waits, default=0.0)
+        with self._lock:
+            if wait > 0:
+                self.rejections += 1
+                for scope, scope_wait in zip(scopes, waits):
+                    if scope_wait > 0:
+                        self.rejected[scope] += 1
+            else:
+                self.allowed += 1
+        return wait
+
+    def stats(self) -> dict:
+        stats = {"allowed": self.allowed, "rejected": self.rejections}
+        stats.update({f"rejected_by_{scope}": count for scope, count in self.rejected.items()})
+        return stats
+
+
+def parse_networks(addresses: Iterable[str]) -> List[ipaddress._BaseNetwork]:
+    """Networks from addresses or CIDR blocks, e.g. ``["172.28.0.10", "10.0.0.0/8"]``"""
+    return [ipaddress.ip_network(address, strict=False) for address in addresses]
+
+
+def _is_trusted(address: str, trusted_proxies: List[ipaddress._BaseNetwork]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_ip(request: Request, trusted_proxies: List[ipaddress._BaseNetwork]) -> Optional[str]:
+    """The address to rate limit a request by, or None to skip the IP rule.
+
+    ``X-Forwarded-For`` is only believed from a trusted proxy, such as the
+    Streamlit frontend calling on behalf of browsers. Its entries are read from
+    the right, skipping further trusted proxies, since anything left of those
+    was supplied by the client. A trusted proxy that forwards no address is not
+    limited per IP, so it cannot turn the IP rule into one global bucket.
+    """
+    # Clients without an address share one bucket rather than bypassing the limit
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted(peer, trusted_proxies):
+        return peer
+    forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",")]
+    forwarded = [address for address in forwarded if address]
+    for address in reversed(forwarded):
+        if not _is_trusted(address, trusted_proxies):
+            return address
+    return forwarded[0] if forwarded else None
+
+
+rate_limiter: Optional[RateLimiter] = None
+
+
+def start_rate_limiter(rules: Dict[str, BucketRule], state_path: Optional[str] = None,
+                       max_keys: int = 100000) -> RateLimiter:
+    global rate_limiter
+    store = SQLiteBucketStore(state_path) if state_path else MemoryBucketStore(max_keys)
+    rate_limiter = RateLimiter(store, rules)
+    metrics.register("rate_limiter", rate_limiter.stats)
+    return rate_limiter
+
+
+def stop_rate_limiter() -> None:
+    global rate_limiter
+    if rate_limiter is not None:
+        rate_limiter.store.close()
+        rate_limiter = None
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Dependency returning the running rate limiter, or None when rate limiting is disabled"""
+    return rate_limiter
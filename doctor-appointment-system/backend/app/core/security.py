@@ -1,30 +1,85 @@
+import hashlib
+import hmac
+import secrets
+import time
+import timeit
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from app.core import metrics
+from app.core.cache import LRUCache
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def bcrypt_options(rounds: Optional[int]) -> dict:
+    # needs_update flags hashes below the cost but never above it, so a cheaper host won't downgrade them
+    if rounds is None:
+        return {}
+    return {"bcrypt__rounds": rounds, "bcrypt__min_rounds": rounds, "bcrypt__max_rounds": bcrypt.max_rounds}
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", **bcrypt_options(settings.BCRYPT_ROUNDS))
+
+# Verified tokens keyed by their SHA-256 digest, each kept until its exp claim
+token_cache = LRUCache(settings.TOKEN_CACHE_MAX_ENTRIES)
+metrics.register("token_cache", token_cache.stats)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
+    # Pool workers are passed the calibrated cost, which their own settings may predate
+    if rounds is None:
+        return pwd_context.hash(password)
+    return pwd_context.handler().using(rounds=rounds).hash(password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int = 12, max_rounds: int = 16) -> int:
+    """Highest bcrypt cost whose hash time stays within ``target_seconds``, but at least ``min_rounds``"""
+    hasher = pwd_context.handler().using(rounds=min_rounds)
+    sample = min(timeit.repeat(lambda: hasher.hash("calibration"), number=1, repeat=3))
+    rounds = min_rounds
+    # Each extra round doubles the work
+    while rounds < max_rounds and sample * 2 ** (rounds + 1 - min_rounds) <= target_seconds:
+        rounds += 1
+    return rounds
+
+def configure_bcrypt_rounds(rounds: int) -> None:
+    settings.BCRYPT_ROUNDS = rounds
+    pwd_context.update(**bcrypt_options(rounds))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    issued_at = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = issued_at + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = issued_at + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": secrets.token_hex(16)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+    # Only the HMAC is stored, so a leaked table cannot be replayed
+    return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
 def decode_access_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        # The entry's TTL runs on the monotonic clock; exp is checked against the wall clock too
+        return dict(payload) if payload["exp"] > time.time() else None
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        # Only tokens that expire are cached, and never past their expiry
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(digest, dict(payload), ttl_seconds=remaining)
         return payload
     except JWTError:
         return None
@@ -0,0 +1,163 @@
+"""Bitmap slot engine.
+
+A doctor's weekly schedule is compiled once into one integer bitmap per weekday,
+where bit ``m`` is set when a slot starts ``m`` minutes after midnight. Booked
+appointments are subtracted as bit clears, and slots are only turned into
+``date``/``time`` values (or JSON text) at the serialization boundary.
+"""
+import base64
+from datetime import date, time, timedelta
+from functools import reduce
+from math import gcd
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+
+# Pre-rendered "HH:MM:SS" strings for every minute of the day
+_TIME_STRINGS = tuple(f"{m // 60:02d}:{m % 60:02d}:00" for m in range(MINUTES_PER_DAY))
+
+DayMask = Tuple[date, int]
+
+
+def minute_of(value: time) -> int:
+    """Minutes since midnight for a time of day"""
+    return value.hour * 60 + value.minute
+
+
+def time_of(minute: int) -> time:
+    """Time of day for a minute offset"""
+    return time(minute // 60, minute % 60)
+
+
+def iter_minutes(mask: int) -> Iterator[int]:
+    """Yield the minute offsets set in a day bitmap in ascending order"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class WeeklySlotMap:
+    """A doctor's weekly schedule compiled into per-weekday slot bitmaps"""
+
+    __slots__ = ("day_masks",)
+
+    def __init__(self, day_masks: Sequence[int]):
+        self.day_masks = tuple(day_masks)
+
+    @classmethod
+    def compile(cls, schedules: Iterable) -> "WeeklySlotMap":
+        """Compile schedule rows (day_of_week, start_time, end_time, slot_duration)"""
+        day_masks = [0] * 7
+        for schedule in schedules:
+            start = minute_of(schedule.start_time)
+            end = minute_of(schedule.end_time)
+            # A slot may start anywhere before the end time, seconds included
+            if schedule.end_time.second or schedule.end_time.microsecond:
+                end += 1
+            step = schedule.slot_duration or 30
+
+            mask = 0
+            for minute in range(start, end, step):
+                mask |= 1 << minute
+            day_masks[schedule.day_of_week] |= mask
+
+        return cls(day_masks)
+
+    def __bool__(self) -> bool:
+        return any(self.day_masks)
+
+    def mask_for(self, day: date) -> int:
+        return self.day_masks[day.weekday()]
+
+    def free_days(
+            self,
+            start_date: date,
+            end_date: date,
+            booked: Iterable[Tuple[date, time]] = ()
+    ) -> List[DayMask]:
+        """Free slot bitmaps for every working day in the range, booked slots cleared"""
+        cleared: Dict[date, int] = {}
+        for booked_date, booked_time in booked:
+            cleared[booked_date] = cleared.get(booked_date, 0) | (1 << minute_of(booked_time))
+
+        days = []
+        one_day = timedelta(days=1)
+        current_date = start_date
+        weekday = start_date.weekday()
+        while current_date <= end_date:
+            mask = self.day_masks[weekday] & ~cleared.get(current_date, 0)
+            if mask:
+                days.append((current_date, mask))
+            current_date += one_day
+            weekday = (weekday + 1) % 7
+
+        return days
+
+
+def iter_slots(days: Iterable[DayMask]) -> Iterator[Tuple[date, time]]:
+    """Materialize (date, time) pairs from per-day bitmaps"""
+    for day, mask in days:
+        for minute in iter_minutes(mask):
+            yield day, time_of(minute)
+
+
+def render_slots_json(doctor_id: int, days: Iterable[DayMask]) -> bytes:
+    """Render per-day bitmaps as the JSON body of ``List[AvailableSlot]``"""
+    suffix = f'","doctor_id":{int(doctor_id)}}}'
+    parts = []
+    for day, mask in days:
+        prefix = f'{{"date":"{day.isoformat()}","time":"'
+        parts.extend(prefix + _TIME_STRINGS[minute] + suffix for minute in iter_minutes(mask))
+    return ("[" + ",".join(parts) + "]").encode()
+
+
+def render_slots_ndjson(doctor_id: int, days: Iterable[DayMask]) -> Iterator[bytes]:
+    """Render per-day bitmaps as newline-delimited AvailableSlot objects, one chunk per day"""
+    suffix = f'","doctor_id":{int(doctor_id)}}}\n'
+    for day, mask in days:
+        prefix = f'{{"date":"{day.isoformat()}","time":"'
+        yield "".join(prefix + _TIME_STRINGS[minute] + suffix for minute in iter_minutes(mask)).encode()
+
+
+def encode_runs(mask: int) -> List[List[int]]:
+    """Encode a day bitmap as [start_minute, step, count] runs of evenly spaced slots"""
+    runs: List[List[int]] = []
+    for minute in iter_minutes(mask):
+        if runs:
+            run = runs[-1]
+            if run[2] == 1:
+                run[1] = minute - run[0]
+                run[2] = 2
+                continue
+            if minute - (run[0] + run[1] * (run[2] - 1)) == run[1]:
+                run[2] += 1
+                continue
+        runs.append([minute, 0, 1])
+    return runs
+
+
+def encode_bitmap(mask: int) -> Tuple[int, int, str]:
+    """Encode a day bitmap on its own slot grid as (start_minute, step, base64 little-endian bits).
+
+    Bit ``i`` is set when the slot at ``start + i * step`` is free; ``step`` is the
+    gcd of the free slots' offsets, i.e. the slot duration for a regular schedule.
+    """
+    minutes = list(iter_minutes(mask))
+    if not minutes:
+        return 0, 0, ""
+    start = minutes[0]
+    step = reduce(gcd, (minute - start for minute in minutes[1:]), 0) or 1
+    bits = 0
+    for minute in minutes:
+        bits |= 1 << ((minute - start) // step)
+    packed = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return start, step, base64.b64encode(packed).decode()
+
+
+def encode_day(day: date, mask: int, encoding: str) -> dict:
+    """Compact JSON-ready representation of one day ("runs" or "bitmap")"""
+    if encoding == "bitmap":
+        start, step, bitmap = encode_bitmap(mask)
+        return {"date": day.isoformat(), "start": start, "step": step, "bitmap": bitmap}
+    return {"date": day.isoformat(), "runs": encode_runs(mask)}
@@ -0,0 +1,58 @@
+from sqlalchemy import DateTime, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class weekday(FunctionElement):
+    """Day of week of a date expression, numbered like ``date.weekday()`` (0=Monday)"""
+    type = Integer()
+    name = "weekday"
+    inherit_cache = True
+
+
+@compiles(weekday, "sqlite")
+def _sqlite_weekday(element, compiler, **kw):
+    # strftime('%w') counts from Sunday=0
+    return "((CAST(strftime('%%w', %s) AS INTEGER) + 6) %% 7)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(weekday, "postgresql")
+def _postgresql_weekday(element, compiler, **kw):
+    return "(CAST(EXTRACT(ISODOW FROM %s) AS INTEGER) - 1)" % compiler.process(element.clauses, **kw)
+
+
+class minute_of_day(FunctionElement):
+    """Minutes since midnight of a time expression, matching ``slot_engine.minute_of``"""
+    type = Integer()
+    name = "minute_of_day"
+    inherit_cache = True
+
+
+@compiles(minute_of_day, "sqlite")
+def _sqlite_minute_of_day(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return "(CAST(strftime('%%H', %s) AS INTEGER) * 60 + CAST(strftime('%%M', %s) AS INTEGER))" % (value, value)
+
+
+@compiles(minute_of_day, "postgresql")
+def _postgresql_minute_of_day(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return "(CAST(EXTRACT(HOUR FROM %s) AS INTEGER) * 60 + CAST(EXTRACT(MINUTE FROM %s) AS INTEGER))" % (value, value)
+
+
+class utcnow(FunctionElement):
+    """Current UTC time as a naive timestamp, evaluated by the database"""
+    type = DateTime()
+    name = "utcnow"
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _postgresql_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
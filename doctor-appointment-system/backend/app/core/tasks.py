@@ -0,0 +1,41 @@
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Run a function every ``interval`` seconds on a daemon thread until stopped"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], object], run_immediately: bool = True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        if self.run_immediately:
+            self._run_once()
+        while not self._stop.wait(self.interval):
+            self._run_once()
+
+    def _run_once(self) -> None:
+        try:
+            self.func()
+        except Exception:
+            # Keep the schedule alive; the next tick retries
+            logger.exception("Periodic task %s failed", self.name)
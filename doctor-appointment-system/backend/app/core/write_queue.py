@@ -0,0 +1,163 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+WriteOperation = Callable[[Session], object]
+
+_STOP = object()
+
+
+class GroupCommitQueue:
+    """Single writer thread that commits queued write operations in batches.
+
+    Requests submit a callable taking a Session. The writer drains up to
+    ``max_batch_size`` operations, waiting at most ``max_delay`` seconds after the
+    first one, runs each inside its own SAVEPOINT and commits the whole batch once.
+    An operation that raises only rolls back its savepoint; its future gets the
+    exception while the rest of the batch still commits.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], max_batch_size: int = 64,
+                 max_delay: float = 0.005):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.largest_batch = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, operation: WriteOperation) -> Future:
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def run(self, operation: WriteOperation, timeout: Optional[float] = None):
+        """Submit an operation and wait for its individual result.
+
+        If the writer has not picked the operation up within ``timeout``, it is
+        cancelled so it never commits, and TimeoutError is raised. An operation the
+        writer has already started is waited for, and its real outcome is returned.
+        """
+        future = self.submit(operation)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                self.cancelled += 1
+                raise
+            return future.result()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "operations": self.operations,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "largest_batch": self.largest_batch,
+            "average_batch": self.operations / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self) -> None:
+        while True:
+            batch, stopping = self._collect()
+            if batch:
+                self._commit_batch(batch)
+            if stopping:
+                return
+
+    def _collect(self) -> Tuple[List[tuple], bool]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit_batch(self, batch: List[tuple]) -> None:
+        results = []
+        db = self.session_factory()
+        try:
+            for operation, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with db.begin_nested():
+                        result = operation(db)
+                    results.append((future, result, None))
+                except Exception as e:
+                    results.append((future, None, e))
+            db.commit()
+        except Exception as e:
+            # The batch transaction itself failed; every operation in it failed too
+            logger.exception("Write queue batch of %d operations failed", len(batch))
+            db.rollback()
+            results = [(future, None, e) for future, _, _ in results]
+        finally:
+            db.close()
+
+        self.batches += 1
+        self.operations += len(results)
+        self.largest_batch = max(self.largest_batch, len(results))
+        for future, result, error in results:
+            if error is not None:
+                self.failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue: Optional[GroupCommitQueue] = None
+
+
+def start_write_queue(session_factory: Callable[[], Session], max_batch_size: int,
+                      max_delay: float) -> GroupCommitQueue:
+    global write_queue
+    write_queue = GroupCommitQueue(session_factory, max_batch_size, max_delay)
+    write_queue.start()
+    metrics.register("write_queue", write_queue.stats)
+    return write_queue
+
+
+def stop_write_queue() -> None:
+    global write_queue
+    if write_queue is not None:
+        write_queue.stop()
+        write_queue = None
+
+
+def get_write_queue() -> Optional[GroupCommitQueue]:
+    """Dependency returning the running write queue, or None when writes commit inline"""
+    return write_queue
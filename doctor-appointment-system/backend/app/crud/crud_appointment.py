@@ -1,10 +1,45 @@
-from sqlalchemy.orm import Session
+import heapq
+import itertools
+import logging
+from operator import attrgetter, itemgetter
+from sqlalchemy import Row, Select, delete, func, insert, literal, select, tuple_
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
-from datetime import date, time
-from app.models.models import Appointment, AppointmentStatus, Schedule
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+from datetime import date, time, timedelta
+from app.core.config import settings
+from app.core.slot_engine import minute_of
+from app.core.sql import minute_of_day
+from app.crud.crud_availability import set_slot_state
+from app.crud.crud_user import USER_RESPONSE_FIELDS
+from app.models.models import Appointment, AppointmentStatus, ArchivedAppointment, Schedule, SlotState, User
 from app.schemas.schemas import AppointmentCreate, AppointmentUpdate
 
+logger = logging.getLogger(__name__)
+
+# Keyset position of an appointment in list order: (appointment_date, appointment_time, id)
+AppointmentCursor = Tuple[date, time, int]
+
+# Only appointments in a final state are moved to the archive
+ARCHIVED_STATUSES = (AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED)
+
+# Fields of AppointmentResponse besides the nested users, selected as plain columns by the row read paths
+APPOINTMENT_RESPONSE_FIELDS = (
+    "id", "doctor_id", "patient_id", "appointment_date", "appointment_time", "duration", "reason", "status",
+    "created_at", "updated_at",
+)
+
+# List order of ORM appointments and of response rows
+appointment_key = attrgetter("appointment_date", "appointment_time", "id")
+row_key = itemgetter("appointment_date", "appointment_time", "id")
+
+# Latest appointment_date stored in the archive; loaded at startup and advanced as rows are moved
+archived_through: Optional[date] = None
+
+
+class SlotDurationMismatch(ValueError):
+    """A booking asked for a duration other than the length of the slot it books"""
+
 
 def create_appointment(db: Session, appointment: AppointmentCreate, patient_id: int) -> Appointment:
     try:
@@ -13,10 +48,13 @@ def create_appointment(db: Session, appointment: AppointmentCreate, patient_id:
             patient_id=patient_id,
             appointment_date=appointment.appointment_date,
             appointment_time=appointment.appointment_time,
-            duration=appointment.duration,
             reason=appointment.reason
         )
+        if appointment.duration is not None:
+            db_appointment.duration = appointment.duration
         db.add(db_appointment)
+        set_slot_state(db, appointment.doctor_id, appointment.appointment_date,
+                       appointment.appointment_time, SlotState.BOOKED)
         db.commit()
         db.refresh(db_appointment)
         return db_appointment
@@ -25,40 +63,334 @@ def create_appointment(db: Session, appointment: AppointmentCreate, patient_id:
         raise ValueError("This time slot is already booked")
 
 
-def get_appointment(db: Session, appointment_id: int) -> Optional[Appointment]:
-    return db.query(Appointment).filter(Appointment.id == appointment_id).first()
+def insert_booking(db: Session, appointment: AppointmentCreate, patient_id: int) -> Appointment:
+    """Validate the slot and insert the appointment in one INSERT ... SELECT ... RETURNING.
+
+    The row is only inserted if an active schedule has a slot starting at this time
+    and no other non-cancelled appointment holds it, so there is no check-then-insert
+    window.
+    The duration is the slot's length, so the PostgreSQL overlap range spans exactly
+    the slot availability books. Does not commit; raises ValueError when the slot
+    cannot be booked, and SlotDurationMismatch when a requested duration is not the
+    slot's length.
+    """
+    in_schedule = (
+        Schedule.doctor_id == appointment.doctor_id,
+        Schedule.day_of_week == appointment.appointment_date.weekday(),
+        Schedule.is_active == True,
+        Schedule.start_time <= appointment.appointment_time,
+        Schedule.end_time > appointment.appointment_time,
+        # Only slot start times; a booking between them would overlap two slots
+        (minute_of(appointment.appointment_time) - minute_of_day(Schedule.start_time))
+        % Schedule.slot_duration == 0
+    )
+    slot_taken = select(Appointment.id).where(
+        Appointment.doctor_id == appointment.doctor_id,
+        Appointment.appointment_date == appointment.appointment_date,
+        Appointment.appointment_time == appointment.appointment_time,
+        Appointment.status != AppointmentStatus.CANCELLED
+    ).exists()
 
+    values = {
+        Appointment.doctor_id: appointment.doctor_id,
+        Appointment.patient_id: patient_id,
+        Appointment.appointment_date: appointment.appointment_date,
+        Appointment.appointment_time: appointment.appointment_time,
+        Appointment.reason: appointment.reason,
+        Appointment.status: AppointmentStatus.SCHEDULED,
+    }
+    row_source = select(
+        *[literal(value, column.type).label(column.key) for column, value in values.items()],
+        Schedule.slot_duration.label(Appointment.duration.key)
+    ).where(*in_schedule, ~slot_taken)
+    if appointment.duration is not None:
+        row_source = row_source.where(Schedule.slot_duration == appointment.duration)
+    row_source = row_source.limit(1)
+    statement = insert(Appointment) \
+        .from_select([column.key for column in values] + [Appointment.duration.key], row_source) \
+        .returning(Appointment)
 
-def get_appointments_by_patient(db: Session, patient_id: int) -> List[Appointment]:
-    return db.query(Appointment) \
-        .filter(Appointment.patient_id == patient_id) \
-        .order_by(Appointment.appointment_date, Appointment.appointment_time) \
-        .all()
+    try:
+        db_appointment = db.scalars(statement).first()
+    except IntegrityError:
+        # Lost a race to a concurrent booking for the same slot, or on PostgreSQL
+        # the exclusion constraint found an overlapping appointment
+        raise ValueError("This time slot is already booked")
+    if db_appointment is None:
+        if appointment.duration is not None:
+            slot_duration = db.scalar(select(Schedule.slot_duration).where(*in_schedule).limit(1))
+            if slot_duration is not None and slot_duration != appointment.duration:
+                raise SlotDurationMismatch(f"Appointments with this doctor last {slot_duration} minutes")
+        raise ValueError("This time slot is not available")
+
+    set_slot_state(db, appointment.doctor_id, appointment.appointment_date,
+                   appointment.appointment_time, SlotState.BOOKED)
+    return db_appointment
 
 
-def get_appointments_by_doctor(db: Session, doctor_id: int) -> List[Appointment]:
+def book_appointment(db: Session, appointment: AppointmentCreate, patient_id: int) -> Appointment:
+    try:
+        db_appointment = insert_booking(db, appointment, patient_id)
+        db.commit()
+        return db_appointment
+    except ValueError:
+        db.rollback()
+        raise
+
+
+def with_participants(query: Union[Query, Select], model=Appointment) -> Union[Query, Select]:
+    """Load the doctor and patient of every appointment with one batched IN query each.
+
+    Responses nest both users, so lazy loading would cost two queries per row.
+    Repeated users are loaded once.
+    """
+    return query.options(selectinload(model.doctor), selectinload(model.patient))
+
+
+def appointment_by_id(model, appointment_id: int) -> Select:
+    return select(model) \
+        .options(joinedload(model.doctor), joinedload(model.patient)) \
+        .filter(model.id == appointment_id)
+
+
+def get_appointment(db: Session, appointment_id: int) -> Optional[Appointment]:
     return db.query(Appointment) \
-        .filter(Appointment.doctor_id == doctor_id) \
-        .order_by(Appointment.appointment_date, Appointment.appointment_time) \
-        .all()
+        .options(joinedload(Appointment.doctor), joinedload(Appointment.patient)) \
+        .filter(Appointment.id == appointment_id) \
+        .first()
 
 
-def update_appointment(db: Session, appointment_id: int, appointment_update: AppointmentUpdate) -> Appointment:
+def find_appointment(db: Session, appointment_id: int) -> Optional[Union[Appointment, ArchivedAppointment]]:
+    """Look an appointment up in the live table, then in the archive. For reads only."""
+    return db.scalar(appointment_by_id(Appointment, appointment_id)) \
+        or db.scalar(appointment_by_id(ArchivedAppointment, appointment_id))
+
+
+def filter_appointments(
+        query: Union[Query, Select],
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        status: Optional[AppointmentStatus] = None,
+        after: Optional[AppointmentCursor] = None,
+        limit: Optional[int] = None,
+        model=Appointment
+) -> Union[Query, Select]:
+    """Apply list filters and keyset pagination in (date, time, id) order.
+
+    Rows after the cursor are a range on the (owner, date, time) indexes, so a
+    page costs a bounded index scan however long the history is.
+    """
+    if from_date:
+        query = query.filter(model.appointment_date >= from_date)
+    if to_date:
+        query = query.filter(model.appointment_date <= to_date)
+    if status:
+        query = query.filter(model.status == status)
+    if after:
+        query = query.filter(tuple_(model.appointment_date, model.appointment_time, model.id) > after)
+    query = query.order_by(model.appointment_date, model.appointment_time, model.id)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def archive_horizon(today: Optional[date] = None) -> date:
+    """Final appointments dated before this day are moved to the archive"""
+    return (today or date.today()) - timedelta(days=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS)
+
+
+def load_archived_through(db: Session) -> Optional[date]:
+    """Read the latest archived appointment date, which lists route on"""
+    global archived_through
+    archived_through = db.scalar(select(func.max(ArchivedAppointment.appointment_date)))
+    return archived_through
+
+
+def reaches_archive(from_date: Optional[date] = None, status: Optional[AppointmentStatus] = None,
+                    **filters) -> bool:
+    """True when a list with these filters can match archived appointments.
+
+    Routing follows what the archive holds, so rows moved under an earlier, shorter
+    horizon stay listed after APPOINTMENT_ARCHIVE_AFTER_DAYS is raised. Ranges
+    starting before the current horizon reach it as well, since another worker's
+    archive job may have moved rows this process has not counted yet.
+    """
+    if status is not None and status not in ARCHIVED_STATUSES:
+        return False
+    if from_date is None or from_date < archive_horizon():
+        return True
+    return archived_through is not None and from_date <= archived_through
+
+
+def list_models(**filters) -> list:
+    """The live table, plus the archive when the filters reach into it"""
+    return [Appointment, ArchivedAppointment] if reaches_archive(**filters) else [Appointment]
+
+
+def list_statements(owner: str, owner_id: int, **filters) -> List[Select]:
+    """ORM list selects loading appointments with their participants, one per table"""
+    return [
+        filter_appointments(
+            with_participants(select(model), model).filter(getattr(model, owner) == owner_id),
+            model=model, **filters
+        )
+        for model in list_models(**filters)
+    ]
+
+
+def row_statements(owner: str, owner_id: int, **filters) -> List[Select]:
+    """Core list selects of just the response columns, joined to both participants, one per table.
+
+    Rows come back as tuples rather than mapped objects, so there is no identity
+    map, change tracking or relationship loading to pay for per row.
+    """
+    doctor = User.__table__.alias("doctor")
+    patient = User.__table__.alias("patient")
+    statements = []
+    for model in list_models(**filters):
+        table = model.__table__
+        statement = select(
+            *[table.c[field] for field in APPOINTMENT_RESPONSE_FIELDS],
+            *[doctor.c[field].label(f"doctor_{field}") for field in USER_RESPONSE_FIELDS],
+            *[patient.c[field].label(f"patient_{field}") for field in USER_RESPONSE_FIELDS],
+        ).join_from(table, doctor, table.c.doctor_id == doctor.c.id) \
+            .join(patient, table.c.patient_id == patient.c.id) \
+            .where(table.c[owner] == owner_id)
+        statements.append(filter_appointments(statement, model=model, **filters))
+    return statements
+
+
+def appointment_rows(rows: Iterable[Row]) -> List[dict]:
+    """AppointmentResponse dicts built from the rows of a row_statements select.
+
+    Callers execute on the session's connection so the rows skip ORM result
+    processing. Columns are taken by position, and a user appearing on several
+    rows gets one shared dict, so a doctor's list builds the doctor once.
+    """
+    appointment_end = len(APPOINTMENT_RESPONSE_FIELDS)
+    doctor_end = appointment_end + len(USER_RESPONSE_FIELDS)
+    users = {}
+    items = []
+    for row in rows:
+        item = dict(zip(APPOINTMENT_RESPONSE_FIELDS, row[:appointment_end]))
+        for key, user_columns in (("doctor", row[appointment_end:doctor_end]), ("patient", row[doctor_end:])):
+            user = users.get(user_columns[0])
+            if user is None:
+                user = users[user_columns[0]] = dict(zip(USER_RESPONSE_FIELDS, user_columns))
+            item[key] = user
+        items.append(item)
+    return items
+
+
+def merge_pages(pages: Sequence[Sequence], limit: Optional[int] = None, key: Callable = appointment_key) -> list:
+    """Merge pages that are each in list order into one page of at most ``limit`` rows"""
+    if len(pages) == 1:
+        return list(pages[0])
+    return list(itertools.islice(heapq.merge(*pages, key=key), limit))
+
+
+def get_appointments_by_patient(db: Session, patient_id: int, **filters) -> List[Appointment]:
+    pages = [db.scalars(statement).all() for statement in list_statements("patient_id", patient_id, **filters)]
+    return merge_pages(pages, filters.get("limit"))
+
+
+def get_appointments_by_doctor(db: Session, doctor_id: int, **filters) -> List[Appointment]:
+    pages = [db.scalars(statement).all() for statement in list_statements("doctor_id", doctor_id, **filters)]
+    return merge_pages(pages, filters.get("limit"))
+
+
+def get_appointment_rows_by_patient(db: Session, patient_id: int, **filters) -> List[dict]:
+    """A patient's appointments as AppointmentResponse dicts, for the list endpoints"""
+    pages = [appointment_rows(db.connection().execute(statement))
+             for statement in row_statements("patient_id", patient_id, **filters)]
+    return merge_pages(pages, filters.get("limit"), key=row_key)
+
+
+def get_appointment_rows_by_doctor(db: Session, doctor_id: int, **filters) -> List[dict]:
+    """A doctor's appointments as AppointmentResponse dicts, for the list endpoints"""
+    pages = [appointment_rows(db.connection().execute(statement))
+             for statement in row_statements("doctor_id", doctor_id, **filters)]
+    return merge_pages(pages, filters.get("limit"), key=row_key)
+
+
+def archive_appointments(db: Session, before: Optional[date] = None,
+                         batch_size: int = settings.APPOINTMENT_ARCHIVE_BATCH_SIZE) -> int:
+    """Move completed and cancelled appointments dated before ``before`` to the archive.
+
+    Each batch is copied and deleted in its own transaction, so the write lock is
+    only held for ``batch_size`` rows at a time. Returns the number of rows moved.
+    """
+    global archived_through
+    before = before or archive_horizon()
+    columns = [column.key for column in Appointment.__table__.columns]
+    moved = 0
+    while True:
+        rows = db.execute(
+            select(Appointment.id, Appointment.appointment_date).where(
+                Appointment.status.in_(ARCHIVED_STATUSES),
+                Appointment.appointment_date < before
+            ).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        db.execute(insert(ArchivedAppointment).from_select(
+            columns, select(*[Appointment.__table__.c[key] for key in columns]).where(Appointment.id.in_(ids))
+        ))
+        db.execute(delete(Appointment).where(Appointment.id.in_(ids)))
+        db.commit()
+        latest = max(row.appointment_date for row in rows)
+        if archived_through is None or latest > archived_through:
+            archived_through = latest
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    if moved:
+        logger.info("Archived %d appointments dated before %s", moved, before)
+    return moved
+
+
+def apply_appointment_update(db: Session, appointment_id: int,
+                             appointment_update: AppointmentUpdate) -> Optional[Appointment]:
+    """Apply an update and keep slot availability in step. Does not commit."""
     appointment = get_appointment(db, appointment_id)
     if not appointment:
         return None
 
+    previous_slot = (appointment.appointment_date, appointment.appointment_time,
+                     appointment.status != AppointmentStatus.CANCELLED)
+
     update_data = appointment_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(appointment, field, value)
 
+    # Keep the materialized availability in step with rescheduling and cancellation
+    current_slot = (appointment.appointment_date, appointment.appointment_time,
+                    appointment.status != AppointmentStatus.CANCELLED)
+    if current_slot != previous_slot:
+        if previous_slot[2]:
+            set_slot_state(db, appointment.doctor_id, previous_slot[0], previous_slot[1], SlotState.FREE)
+        if current_slot[2]:
+            set_slot_state(db, appointment.doctor_id, current_slot[0], current_slot[1], SlotState.BOOKED)
+
     try:
+        db.flush()
+    except IntegrityError:
+        raise ValueError("This time slot is already booked")
+    return appointment
+
+
+def update_appointment(db: Session, appointment_id: int, appointment_update: AppointmentUpdate) -> Appointment:
+    try:
+        appointment = apply_appointment_update(db, appointment_id, appointment_update)
+        if not appointment:
+            return None
         db.commit()
         db.refresh(appointment)
         return appointment
-    except IntegrityError:
+    except ValueError:
         db.rollback()
-        raise ValueError("This time slot is already booked")
+        raise
 
 
 def delete_appointment(db: Session, appointment_id: int) -> bool:
@@ -66,6 +398,9 @@ def delete_appointment(db: Session, appointment_id: int) -> bool:
     if not appointment:
         return False
 
+    if appointment.status != AppointmentStatus.CANCELLED:
+        set_slot_state(db, appointment.doctor_id, appointment.appointment_date,
+                       appointment.appointment_time, SlotState.FREE)
     db.delete(appointment)
     db.commit()
     return True
@@ -0,0 +1,21 @@
+from typing import List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud.crud_appointment import appointment_by_id, appointment_rows, merge_pages, row_key, row_statements
+from app.models.models import Appointment, ArchivedAppointment
+
+
+async def find_appointment(db: AsyncSession, appointment_id: int) -> Optional[Union[Appointment, ArchivedAppointment]]:
+    return await db.scalar(appointment_by_id(Appointment, appointment_id)) \
+        or await db.scalar(appointment_by_id(ArchivedAppointment, appointment_id))
+
+
+async def get_appointment_rows_by_patient(db: AsyncSession, patient_id: int, **filters) -> List[dict]:
+    pages = [appointment_rows(await (await db.connection()).execute(statement))
+             for statement in row_statements("patient_id", patient_id, **filters)]
+    return merge_pages(pages, filters.get("limit"), key=row_key)
+
+
+async def get_appointment_rows_by_doctor(db: AsyncSession, doctor_id: int, **filters) -> List[dict]:
+    pages = [appointment_rows(await (await db.connection()).execute(statement))
+             for statement in row_statements("doctor_id", doctor_id, **filters)]
+    return merge_pages(pages, filters.get("limit"), key=row_key)
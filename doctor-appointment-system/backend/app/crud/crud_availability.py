@@ -0,0 +1,389 @@
+import heapq
+import threading
+from itertools import islice
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from datetime import date, datetime, time, timedelta
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.slot_engine import DayMask, WeeklySlotMap, iter_minutes, minute_of, time_of
+from app.models.models import (
+    Appointment, AppointmentStatus, AvailabilityHorizon, Schedule, SlotAvailability, SlotState, User, UserRole
+)
+
+# Per-day free slot bitmaps keyed by (doctor_id, date); 0 caches "no free slots"
+availability_cache = LRUCache(settings.AVAILABILITY_CACHE_MAX_ENTRIES, settings.AVAILABILITY_CACHE_TTL_SECONDS)
+metrics.register("availability_cache", availability_cache.stats)
+
+# Bumped on every invalidation so a load that raced a commit is not cached
+_availability_generations: Dict[int, int] = {}
+_generation_lock = threading.Lock()
+
+
+def availability_generation(doctor_id: int) -> int:
+    with _generation_lock:
+        return _availability_generations.get(doctor_id, 0)
+
+
+def _invalidate_cached_days(doctor_id: int, dates: Optional[Set[date]], weekdays: Optional[Set[int]]) -> None:
+    with _generation_lock:
+        _availability_generations[doctor_id] = _availability_generations.get(doctor_id, 0) + 1
+    if dates is not None:
+        for day in dates:
+            availability_cache.invalidate((doctor_id, day))
+    if weekdays is not None:
+        availability_cache.invalidate_where(lambda key: key[0] == doctor_id and key[1].weekday() in weekdays)
+
+
+def invalidate_availability(
+        db: Session,
+        doctor_id: int,
+        dates: Optional[Iterable[date]] = None,
+        weekdays: Optional[Iterable[int]] = None
+) -> None:
+    """Drop a doctor's cached days now and again once the session commits.
+
+    Both passes bump the doctor's generation, so a reader that loaded a
+    pre-commit snapshot before either of them skips caching it.
+    """
+    dates = set(dates) if dates is not None else None
+    weekdays = set(weekdays) if weekdays is not None else None
+    _invalidate_cached_days(doctor_id, dates, weekdays)
+    db.info.setdefault("availability_invalidations", []).append((doctor_id, dates, weekdays))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_invalidations(session: Session) -> None:
+    for doctor_id, dates, weekdays in session.info.pop("availability_invalidations", ()):
+        _invalidate_cached_days(doctor_id, dates, weekdays)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session: Session) -> None:
+    session.info.pop("availability_invalidations", None)
+
+
+def compile_doctor_schedule(db: Session, doctor_id: int) -> WeeklySlotMap:
+    """Compile a doctor's active schedules into weekly slot bitmaps"""
+    schedules = db.query(
+        Schedule.day_of_week, Schedule.start_time, Schedule.end_time, Schedule.slot_duration
+    ).filter(Schedule.doctor_id == doctor_id, Schedule.is_active == True).all()
+    return WeeklySlotMap.compile(schedules)
+
+
+def get_booked_slots(db: Session, doctor_id: int, start_date: date, end_date: date) -> list:
+    """Get the (date, time) pairs of a doctor's non-cancelled appointments"""
+    return db.query(Appointment.appointment_date, Appointment.appointment_time).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date >= start_date,
+        Appointment.appointment_date <= end_date,
+        Appointment.status != AppointmentStatus.CANCELLED
+    ).all()
+
+
+def compute_free_slot_masks(db: Session, doctor_id: int, start_date: date, end_date: date) -> List[DayMask]:
+    """Expand a doctor's schedule into per-day free slot bitmaps"""
+    slot_map = compile_doctor_schedule(db, doctor_id)
+    if not slot_map:
+        return []
+    return slot_map.free_days(start_date, end_date, get_booked_slots(db, doctor_id, start_date, end_date))
+
+
+def read_free_slot_masks(db: Session, doctor_id: int, start_date: date, end_date: date) -> List[DayMask]:
+    """Read per-day free slot bitmaps from the slot_availability table"""
+    rows = db.query(SlotAvailability.slot_date, SlotAvailability.slot_time).filter(
+        SlotAvailability.doctor_id == doctor_id,
+        SlotAvailability.state == SlotState.FREE,
+        SlotAvailability.slot_date >= start_date,
+        SlotAvailability.slot_date <= end_date
+    ).order_by(SlotAvailability.slot_date).all()
+
+    days = []
+    for slot_date, slot_time in rows:
+        bit = 1 << minute_of(slot_time)
+        if days and days[-1][0] == slot_date:
+            days[-1][1] |= bit
+        else:
+            days.append([slot_date, bit])
+    return [(slot_date, mask) for slot_date, mask in days]
+
+
+def load_free_slot_masks(db: Session, doctor_id: int, start_date: date, end_date: date) -> List[DayMask]:
+    """Load per-day free slot bitmaps, reading the materialized horizon where it covers the range"""
+    horizon = db.get(AvailabilityHorizon, doctor_id)
+    if horizon is None or end_date < horizon.materialized_from or start_date > horizon.materialized_through:
+        return compute_free_slot_masks(db, doctor_id, start_date, end_date)
+
+    one_day = timedelta(days=1)
+    days = []
+    if start_date < horizon.materialized_from:
+        days += compute_free_slot_masks(db, doctor_id, start_date, horizon.materialized_from - one_day)
+    days += read_free_slot_masks(
+        db, doctor_id, max(start_date, horizon.materialized_from), min(end_date, horizon.materialized_through)
+    )
+    if end_date > horizon.materialized_through:
+        days += compute_free_slot_masks(db, doctor_id, horizon.materialized_through + one_day, end_date)
+    return days
+
+
+def get_free_slot_masks(db: Session, doctor_id: int, start_date: date, end_date: date) -> List[DayMask]:
+    """Get per-day free slot bitmaps for a doctor, served from the availability cache where possible"""
+    one_day = timedelta(days=1)
+    cached: Dict[date, int] = {}
+    first_miss = last_miss = None
+    current_date = start_date
+    while current_date <= end_date:
+        mask = availability_cache.get((doctor_id, current_date))
+        if mask is None:
+            if first_miss is None:
+                first_miss = current_date
+            last_miss = current_date
+        else:
+            cached[current_date] = mask
+        current_date += one_day
+
+    # One load covers every missing day; days without free slots are cached as 0
+    if first_miss is not None:
+        generation = availability_generation(doctor_id)
+        loaded = dict(load_free_slot_masks(db, doctor_id, first_miss, last_miss))
+        # An invalidation during the load means the snapshot may predate a commit
+        cacheable = availability_generation(doctor_id) == generation
+        current_date = first_miss
+        while current_date <= last_miss:
+            if current_date not in cached:
+                cached[current_date] = loaded.get(current_date, 0)
+                if cacheable:
+                    availability_cache.set((doctor_id, current_date), cached[current_date])
+            current_date += one_day
+
+    return [(day, cached[day]) for day in sorted(cached) if cached[day]]
+
+
+def iter_free_slot_masks(
+        db: Session,
+        doctor_id: int,
+        start_date: date,
+        end_date: date,
+        chunk_days: int = 7
+) -> Iterator[DayMask]:
+    """Yield per-day free slot bitmaps, loading only a chunk of days at a time"""
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        yield from get_free_slot_masks(db, doctor_id, chunk_start, chunk_end)
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def materialize_days(
+        db: Session,
+        doctor_id: int,
+        start_date: date,
+        end_date: date,
+        weekdays: Optional[Set[int]] = None
+) -> int:
+    """Rewrite slot_availability rows for a date range, optionally only on some weekdays.
+
+    Does not commit; callers include it in their own transaction.
+    """
+    dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        if weekdays is None or current_date.weekday() in weekdays:
+            dates.append(current_date)
+        current_date += timedelta(days=1)
+    if not dates:
+        return 0
+
+    stale = db.query(SlotAvailability).filter(SlotAvailability.doctor_id == doctor_id)
+    if weekdays is None:
+        stale = stale.filter(SlotAvailability.slot_date >= start_date, SlotAvailability.slot_date <= end_date)
+    else:
+        stale = stale.filter(SlotAvailability.slot_date.in_(dates))
+    stale.delete(synchronize_session=False)
+
+    slot_map = compile_doctor_schedule(db, doctor_id)
+    booked = {}
+    for booked_date, booked_time in get_booked_slots(db, doctor_id, start_date, end_date):
+        booked[booked_date] = booked.get(booked_date, 0) | (1 << minute_of(booked_time))
+
+    rows = []
+    for slot_date in dates:
+        booked_mask = booked.get(slot_date, 0)
+        for minute in iter_minutes(slot_map.mask_for(slot_date)):
+            rows.append({
+                "doctor_id": doctor_id,
+                "slot_date": slot_date,
+                "slot_time": time_of(minute),
+                "state": SlotState.BOOKED if booked_mask >> minute & 1 else SlotState.FREE,
+            })
+
+    if rows:
+        db.execute(insert(SlotAvailability), rows)
+    return len(rows)
+
+
+def extend_doctor_horizon(db: Session, doctor_id: int, today: Optional[date] = None) -> int:
+    """Roll a doctor's horizon forward to today + AVAILABILITY_HORIZON_DAYS. Does not commit."""
+    today = today or date.today()
+    target = today + timedelta(days=settings.AVAILABILITY_HORIZON_DAYS)
+    horizon = db.get(AvailabilityHorizon, doctor_id)
+
+    if horizon is None or horizon.materialized_through < today:
+        if horizon is None:
+            horizon = AvailabilityHorizon(doctor_id=doctor_id)
+            db.add(horizon)
+        db.query(SlotAvailability).filter(SlotAvailability.doctor_id == doctor_id) \
+            .delete(synchronize_session=False)
+        horizon.materialized_from = today
+        horizon.materialized_through = target
+        return materialize_days(db, doctor_id, today, target)
+
+    # Drop days that have passed, then materialize the days that came into range
+    if horizon.materialized_from < today:
+        db.query(SlotAvailability).filter(
+            SlotAvailability.doctor_id == doctor_id,
+            SlotAvailability.slot_date < today
+        ).delete(synchronize_session=False)
+        horizon.materialized_from = today
+
+    written = 0
+    if horizon.materialized_through < target:
+        written = materialize_days(db, doctor_id, horizon.materialized_through + timedelta(days=1), target)
+        horizon.materialized_through = target
+    return written
+
+
+def refresh_schedule_availability(db: Session, doctor_id: int, weekdays: Iterable[int]) -> None:
+    """Bring slot_availability in line after a schedule change on the given weekdays. Does not commit."""
+    weekdays = set(weekdays)
+    invalidate_availability(db, doctor_id, weekdays=weekdays)
+    horizon = db.get(AvailabilityHorizon, doctor_id)
+    if horizon is None:
+        extend_doctor_horizon(db, doctor_id)
+        return
+    materialize_days(db, doctor_id, horizon.materialized_from, horizon.materialized_through, weekdays)
+
+
+def set_slot_state(db: Session, doctor_id: int, slot_date: date, slot_time: time, state: SlotState) -> None:
+    """Flip a single materialized slot between free and booked. Does not commit."""
+    invalidate_availability(db, doctor_id, dates=[slot_date])
+    db.query(SlotAvailability).filter(
+        SlotAvailability.doctor_id == doctor_id,
+        SlotAvailability.slot_date == slot_date,
+        SlotAvailability.slot_time == slot_time
+    ).update({SlotAvailability.state: state}, synchronize_session=False)
+
+
+def extend_availability_horizons(db: Session, today: Optional[date] = None) -> int:
+    """Rolling horizon job: extend every doctor's materialized availability by the days that came into range"""
+    doctor_ids = {doctor_id for doctor_id, in db.query(Schedule.doctor_id).filter(Schedule.is_active == True)}
+    doctor_ids.update(doctor_id for doctor_id, in db.query(AvailabilityHorizon.doctor_id))
+
+    written = 0
+    for doctor_id in sorted(doctor_ids):
+        written += extend_doctor_horizon(db, doctor_id, today)
+        db.commit()
+    return written
+
+
+class BookedSlotIndex:
+    """Booked-slot bitmaps per (doctor, date), loaded a chunk of days at a time as a search advances"""
+
+    def __init__(self, db: Session, doctor_ids: Sequence[int], start_date: date, chunk_days: int = 7):
+        self.db = db
+        self.doctor_ids = list(doctor_ids)
+        self.chunk_days = chunk_days
+        self.loaded_through = start_date - timedelta(days=1)
+        self.masks: Dict[Tuple[int, date], int] = {}
+
+    def mask(self, doctor_id: int, day: date) -> int:
+        while day > self.loaded_through:
+            self._load_next_chunk()
+        return self.masks.get((doctor_id, day), 0)
+
+    def _load_next_chunk(self) -> None:
+        start_date = self.loaded_through + timedelta(days=1)
+        end_date = self.loaded_through + timedelta(days=self.chunk_days)
+        rows = self.db.query(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time).filter(
+            Appointment.doctor_id.in_(self.doctor_ids),
+            Appointment.appointment_date >= start_date,
+            Appointment.appointment_date <= end_date,
+            Appointment.status != AppointmentStatus.CANCELLED
+        )
+        for doctor_id, booked_date, booked_time in rows:
+            key = (doctor_id, booked_date)
+            self.masks[key] = self.masks.get(key, 0) | (1 << minute_of(booked_time))
+        self.loaded_through = end_date
+
+
+def _iter_doctor_free_slots(
+        doctor_id: int,
+        slot_map: WeeklySlotMap,
+        booked: BookedSlotIndex,
+        start_date: date,
+        end_date: date,
+        first_minute: int
+) -> Iterator[Tuple[date, int, int]]:
+    """Lazily yield (date, minute, doctor_id) for one doctor's free slots in ascending order"""
+    current_date = start_date
+    while current_date <= end_date:
+        mask = slot_map.mask_for(current_date)
+        if mask:
+            if current_date == start_date:
+                mask &= ~((1 << first_minute) - 1)
+            mask &= ~booked.mask(doctor_id, current_date)
+            for minute in iter_minutes(mask):
+                yield current_date, minute, doctor_id
+        current_date += timedelta(days=1)
+
+
+def find_next_available_slots(
+        db: Session,
+        limit: int,
+        start_date: Optional[date] = None,
+        max_days: int = 30,
+        doctor_ids: Optional[Sequence[int]] = None,
+        now: Optional[datetime] = None
+) -> List[Tuple[date, time, int, str]]:
+    """Earliest free slots across active doctors as (date, time, doctor_id, doctor_name).
+
+    Each doctor's compiled schedule is walked lazily and the per-doctor streams are
+    merged with a heap, so only as many days are expanded as it takes to find
+    ``limit`` slots. Slots that already started today are skipped.
+    """
+    now = now or datetime.now()
+    start_date = max(start_date or now.date(), now.date())
+    end_date = start_date + timedelta(days=max_days - 1)
+    first_minute = minute_of(now.time()) + 1 if start_date == now.date() else 0
+
+    query = db.query(
+        Schedule.doctor_id, User.full_name,
+        Schedule.day_of_week, Schedule.start_time, Schedule.end_time, Schedule.slot_duration
+    ).join(User, User.id == Schedule.doctor_id).filter(
+        Schedule.is_active == True,
+        User.is_active == True,
+        User.role == UserRole.DOCTOR
+    )
+    if doctor_ids:
+        query = query.filter(Schedule.doctor_id.in_(doctor_ids))
+
+    schedules_by_doctor: Dict[int, list] = {}
+    doctor_names: Dict[int, str] = {}
+    for row in query:
+        schedules_by_doctor.setdefault(row.doctor_id, []).append(row)
+        doctor_names[row.doctor_id] = row.full_name
+    if not schedules_by_doctor:
+        return []
+
+    booked = BookedSlotIndex(db, list(schedules_by_doctor), start_date)
+    streams = [
+        _iter_doctor_free_slots(doctor_id, WeeklySlotMap.compile(schedules), booked,
+                                start_date, end_date, first_minute)
+        for doctor_id, schedules in schedules_by_doctor.items()
+    ]
+    return [
+        (slot_date, time_of(minute), doctor_id, doctor_names[doctor_id])
+        for slot_date, minute, doctor_id in islice(heapq.merge(*streams), limit)
+    ]
@@ -0,0 +1,71 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.security import generate_refresh_token, hash_refresh_token
+from app.models.models import RefreshToken, User
+
+
+def get_refresh_token(db: Session, token: str) -> Optional[RefreshToken]:
+    return db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """Store a new refresh token for the user and return the plain token; only its HMAC is kept"""
+    token = generate_refresh_token()
+    db.add(RefreshToken(
+        token_hash=hash_refresh_token(token),
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4().hex,
+        expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    db.commit()
+    return token
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, str]:
+    """Exchange a refresh token for a new one in the same family.
+
+    A token can be rotated once. Presenting it again means someone holds a copy, so
+    the whole family is revoked and the user has to log in again.
+    """
+    now = datetime.utcnow()
+    stored = get_refresh_token(db, token)
+    if stored is None or stored.expires_at <= now:
+        raise ValueError("Invalid refresh token")
+
+    # Claim the token atomically so two concurrent refreshes cannot both rotate it
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    ).rowcount
+    if not claimed:
+        revoke_refresh_token_family(db, stored.family_id)
+        raise ValueError("Refresh token reuse detected")
+
+    user = stored.user
+    if not user.is_active:
+        db.commit()
+        raise ValueError("Inactive user")
+    return user, issue_refresh_token(db, user.id, stored.family_id)
+
+
+def revoke_refresh_token_family(db: Session, family_id: str) -> int:
+    revoked = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return revoked
+
+
+def revoke_refresh_token(db: Session, token: str) -> int:
+    """Revoke the sign-in a refresh token belongs to, including all of its rotations"""
+    stored = get_refresh_token(db, token)
+    if stored is None:
+        return 0
+    return revoke_refresh_token_family(db, stored.family_id)
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from app.core import metrics
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.models.models import RevokedToken
+
+# Every unexpired revoked jti; a miss means the token is not revoked without asking the database
+revocation_filter = BloomFilter(settings.REVOCATION_FILTER_CAPACITY, settings.REVOCATION_FILTER_ERROR_RATE)
+metrics.register("revocation_filter", revocation_filter.stats)
+
+
+def get_revoked_token(db: Session, jti: str) -> Optional[RevokedToken]:
+    return db.get(RevokedToken, jti)
+
+
+def revoke_token(db: Session, jti: str, expires_at: datetime) -> RevokedToken:
+    # Added to the filter first: a stray positive only costs a lookup, a missing bit lets the token through
+    revocation_filter.add(jti)
+    revoked = get_revoked_token(db, jti)
+    if revoked is None:
+        revoked = RevokedToken(jti=jti, expires_at=expires_at)
+        db.add(revoked)
+        db.commit()
+    return revoked
+
+
+def load_revocation_filter(db: Session) -> int:
+    """Drop expired revocations and rebuild the filter from the rest"""
+    now = datetime.utcnow()
+    db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    db.commit()
+    revocation_filter.clear()
+    jtis = db.query(RevokedToken.jti).filter(RevokedToken.expires_at > now).all()
+    for (jti,) in jtis:
+        revocation_filter.add(jti)
+    return len(jtis)
@@ -0,0 +1,7 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import RevokedToken
+
+
+async def get_revoked_token(db: AsyncSession, jti: str) -> Optional[RevokedToken]:
+    return await db.get(RevokedToken, jti)
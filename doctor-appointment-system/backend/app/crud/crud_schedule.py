@@ -1,7 +1,11 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from datetime import date, datetime, timedelta, time
+from datetime import date, time
+from app.core.slot_engine import iter_slots
+from app.core.sql import weekday
+from app.crud.crud_availability import get_free_slot_masks, refresh_schedule_availability
 from app.models.models import Schedule, Appointment, AppointmentStatus
 from app.schemas.schemas import ScheduleCreate, ScheduleUpdate, AvailableSlot
 
@@ -16,6 +20,8 @@ def create_schedule(db: Session, schedule: ScheduleCreate, doctor_id: int) -> Sc
             slot_duration=schedule.slot_duration
         )
         db.add(db_schedule)
+        db.flush()
+        refresh_schedule_availability(db, doctor_id, {db_schedule.day_of_week})
         db.commit()
         db.refresh(db_schedule)
         return db_schedule
@@ -35,6 +41,29 @@ def get_schedules_by_doctor(db: Session, doctor_id: int) -> List[Schedule]:
         .all()
 
 
+def count_schedule_conflicts(db: Session, schedule: Schedule, new_start: Optional[time] = None,
+                             new_end: Optional[time] = None) -> int:
+    """Count future scheduled appointments in a schedule's hours that a change would strand.
+
+    Without new hours every appointment inside the schedule conflicts (deactivation
+    and deletion); with new hours only those falling outside them do. The weekday and
+    time filters run in SQL over ix_appointments_doctor_status_date.
+    """
+    query = db.query(func.count(Appointment.id)).filter(
+        Appointment.doctor_id == schedule.doctor_id,
+        Appointment.status == AppointmentStatus.SCHEDULED,
+        Appointment.appointment_date >= date.today(),
+        weekday(Appointment.appointment_date) == schedule.day_of_week,
+        Appointment.appointment_time >= schedule.start_time,
+        Appointment.appointment_time < schedule.end_time
+    )
+    if new_start is not None and new_end is not None:
+        query = query.filter(
+            (Appointment.appointment_time < new_start) | (Appointment.appointment_time >= new_end)
+        )
+    return query.scalar()
+
+
 def update_schedule(db: Session, schedule_id: int, schedule_update: ScheduleUpdate) -> Schedule:
     schedule = get_schedule(db, schedule_id)
     if not schedule:
@@ -46,52 +75,28 @@ def update_schedule(db: Session, schedule_id: int, schedule_update: ScheduleUpda
     # Special handling for deactivation
     if schedule_update.is_active == False:
         # Check if there are future appointments
-        today = date.today()
-        future_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == schedule.doctor_id,
-            Appointment.appointment_date >= today,
-            Appointment.status == AppointmentStatus.SCHEDULED
-        ).all()
-
-        conflicting_appointments = []
-        for apt in future_appointments:
-            if apt.appointment_date.weekday() == schedule.day_of_week:
-                if schedule.start_time <= apt.appointment_time < schedule.end_time:
-                    conflicting_appointments.append(apt)
-
-        if conflicting_appointments:
-            raise ValueError(
-                f"Cannot deactivate schedule: {len(conflicting_appointments)} appointments would be affected")
+        conflicts = count_schedule_conflicts(db, schedule)
+        if conflicts:
+            raise ValueError(f"Cannot deactivate schedule: {conflicts} appointments would be affected")
 
     # Check if changing time would conflict with appointments
     if 'start_time' in update_data or 'end_time' in update_data:
         new_start = update_data.get('start_time', schedule.start_time)
         new_end = update_data.get('end_time', schedule.end_time)
 
-        # Check future appointments
-        today = date.today()
-        future_appointments = db.query(Appointment).filter(
-            Appointment.doctor_id == schedule.doctor_id,
-            Appointment.appointment_date >= today,
-            Appointment.status == AppointmentStatus.SCHEDULED
-        ).all()
-
-        conflicting_appointments = []
-        for apt in future_appointments:
-            if apt.appointment_date.weekday() == schedule.day_of_week:
-                # Check if appointment would be outside new hours
-                if not (new_start <= apt.appointment_time < new_end):
-                    conflicting_appointments.append(apt)
-
-        if conflicting_appointments:
-            raise ValueError(
-                f"Cannot modify schedule: {len(conflicting_appointments)} appointments would be outside new hours")
+        conflicts = count_schedule_conflicts(db, schedule, new_start, new_end)
+        if conflicts:
+            raise ValueError(f"Cannot modify schedule: {conflicts} appointments would be outside new hours")
 
     # Apply updates
+    affected_days = {schedule.day_of_week}
     for field, value in update_data.items():
         setattr(schedule, field, value)
+    affected_days.add(schedule.day_of_week)
 
     try:
+        db.flush()
+        refresh_schedule_availability(db, schedule.doctor_id, affected_days)
         db.commit()
         db.refresh(schedule)
         return schedule
@@ -106,73 +111,21 @@ def delete_schedule(db: Session, schedule_id: int) -> bool:
         return False
 
     # Check if there are any appointments linked to this schedule
-    today = date.today()
-    future_appointments = db.query(Appointment).filter(
-        Appointment.doctor_id == schedule.doctor_id,
-        Appointment.appointment_date >= today,
-        Appointment.status == AppointmentStatus.SCHEDULED
-    ).all()
-
-    conflicting_appointments = []
-    for apt in future_appointments:
-        if apt.appointment_date.weekday() == schedule.day_of_week:
-            if schedule.start_time <= apt.appointment_time < schedule.end_time:
-                conflicting_appointments.append(apt)
-
-    if conflicting_appointments:
-        raise ValueError(f"Cannot delete schedule: {len(conflicting_appointments)} appointments would be affected")
+    conflicts = count_schedule_conflicts(db, schedule)
+    if conflicts:
+        raise ValueError(f"Cannot delete schedule: {conflicts} appointments would be affected")
 
     db.delete(schedule)
+    db.flush()
+    refresh_schedule_availability(db, schedule.doctor_id, {schedule.day_of_week})
     db.commit()
     return True
 
 
 def get_available_slots(db: Session, doctor_id: int, start_date: date, end_date: date) -> List[AvailableSlot]:
     """Get all available time slots for a doctor within a date range"""
-    available_slots = []
-
-    # Get doctor's schedules
-    schedules = get_schedules_by_doctor(db, doctor_id)
-    if not schedules:
-        return available_slots
-
-    # Get all booked appointments in the date range
-    booked_appointments = db.query(Appointment).filter(
-        Appointment.doctor_id == doctor_id,
-        Appointment.appointment_date >= start_date,
-        Appointment.appointment_date <= end_date,
-        Appointment.status != AppointmentStatus.CANCELLED
-    ).all()
-
-    # Create a set of booked slots for quick lookup
-    booked_slots = {(apt.appointment_date, apt.appointment_time) for apt in booked_appointments}
-
-    # Iterate through each day in the range
-    current_date = start_date
-    while current_date <= end_date:
-        day_of_week = current_date.weekday()
-
-        # Find schedules for this day of week
-        day_schedules = [s for s in schedules if s.day_of_week == day_of_week]
-
-        for schedule in day_schedules:
-            # Generate time slots for this schedule
-            current_time = schedule.start_time
-
-            while current_time < schedule.end_time:
-                # Check if this slot is not booked
-                if (current_date, current_time) not in booked_slots:
-                    available_slots.append(AvailableSlot(
-                        date=current_date,
-                        time=current_time,
-                        doctor_id=doctor_id
-                    ))
-
-                # Move to next slot
-                current_datetime = datetime.combine(current_date, current_time)
-                next_datetime = current_datetime + timedelta(minutes=schedule.slot_duration)
-                current_time = next_datetime.time()
-
-        current_date += timedelta(days=1)
-
-    return available_slots
\ No newline at end of file
+    days = get_free_slot_masks(db, doctor_id, start_date, end_date)
+    return [
+        AvailableSlot(date=slot_date, time=slot_time, doctor_id=doctor_id)
+        for slot_date, slot_time in iter_slots(days)
+    ]
@@ -1,10 +1,96 @@
-from sqlalchemy.orm import Session
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import Select, bindparam, event, select, update
+from sqlalchemy.orm import Session, object_session
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.config import settings
 from app.models.models import User, UserRole
 from app.schemas.schemas import UserCreate
 from app.core.security import get_password_hash
 
-def create_user(db: Session, user: UserCreate) -> User:
-    hashed_password = get_password_hash(user.password)
+
+class Principal(NamedTuple):
+    """Snapshot of the user behind an access token, as cached by get_current_user"""
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.username, user.role, user.is_active)
+
+
+# Authenticated principals keyed by (user_id, token iat)
+principal_cache = LRUCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+metrics.register("principal_cache", principal_cache.stats)
+
+
+def _invalidate_cached_principals(user_ids: Set[int]) -> None:
+    principal_cache.invalidate_where(lambda key: key[0] in user_ids)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target: User) -> None:
+    # Drop the snapshot now and again once the session commits, like availability_cache
+    _invalidate_cached_principals({target.id})
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("principal_invalidations", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_invalidations(session: Session) -> None:
+    user_ids = session.info.pop("principal_invalidations", None)
+    if user_ids:
+        _invalidate_cached_principals(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session: Session) -> None:
+    session.info.pop("principal_invalidations", None)
+
+
+# Password hashes upgraded on login, written in batches: user_id -> (old hash, new hash)
+pending_rehashes: Dict[int, Tuple[str, str]] = {}
+_rehash_lock = threading.Lock()
+rehash_stats = {"queued": 0, "written": 0}
+metrics.register("password_rehash", lambda: dict(rehash_stats, pending=len(pending_rehashes)))
+
+
+def queue_password_rehash(user_id: int, old_hash: str, new_hash: str) -> None:
+    with _rehash_lock:
+        pending_rehashes[user_id] = (old_hash, new_hash)
+        rehash_stats["queued"] += 1
+
+
+def flush_password_rehashes(db: Session) -> int:
+    """Write every queued rehash in one transaction, skipping users whose hash changed meanwhile"""
+    with _rehash_lock:
+        batch = list(pending_rehashes.items())
+        pending_rehashes.clear()
+    if not batch:
+        return 0
+    statement = (
+        update(User.__table__)
+        .where(User.id == bindparam("user_id"), User.hashed_password == bindparam("old_hash"))
+        .values(hashed_password=bindparam("new_hash"))
+    )
+    db.execute(statement, [
+        {"user_id": user_id, "old_hash": old_hash, "new_hash": new_hash}
+        for user_id, (old_hash, new_hash) in batch
+    ])
+    db.commit()
+    rehash_stats["written"] += len(batch)
+    return len(batch)
+
+
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> User:
+    # Callers that hash on the password pool pass the hash in
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -27,4 +113,17 @@ def get_users_by_role(db: Session, role: UserRole, skip: int = 0, limit: int = 1
     return db.query(User).filter(User.role == role).offset(skip).limit(limit).all()
 
 def get_all_doctors(db: Session):
-    return db.query(User).filter(User.role == UserRole.DOCTOR).all()
\ No newline at end of file
+    return db.query(User).filter(User.role == UserRole.DOCTOR).all()
+
+
+# Fields of UserResponse, selected as plain columns by the list read paths
+USER_RESPONSE_FIELDS = ("id", "username", "email", "full_name", "role", "is_active", "created_at")
+
+
+def doctor_rows_statement() -> Select:
+    return select(*[User.__table__.c[field] for field in USER_RESPONSE_FIELDS]).where(User.role == UserRole.DOCTOR)
+
+
+def get_doctor_rows(db: Session) -> List[dict]:
+    """Doctors as UserResponse dicts, read with a Core select instead of loading User objects"""
+    return [dict(row) for row in db.connection().execute(doctor_rows_statement()).mappings()]
@@ -0,0 +1,17 @@
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud.crud_user import doctor_rows_statement
+from app.models.models import User
+
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    return await db.scalar(select(User).filter(User.username == username))
+
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+    return await db.get(User, user_id)
+
+
+async def get_doctor_rows(db: AsyncSession) -> List[dict]:
+    return [dict(row) for row in (await (await db.connection()).execute(doctor_rows_statement())).mappings()]
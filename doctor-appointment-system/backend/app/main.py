@@ -1,21 +1,125 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from sqlalchemy.orm import sessionmaker
 
-from app.core.database import engine, Base
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import (
+    SYNC_DATABASE_URL, engine, async_engine, Base, SessionLocal, create_writer_engine, sqlite_pragmas
+)
+from app.core.tasks import PeriodicTask
+from app.core.password_pool import start_password_pool, stop_password_pool
+from app.core.rate_limit import BucketRule, start_rate_limiter, stop_rate_limiter
+from app.core.wal_checkpoint import WalCheckpointer
+from app.core.write_queue import start_write_queue, stop_write_queue
+from app.crud.crud_appointment import archive_appointments, load_archived_through
+from app.crud.crud_availability import extend_availability_horizons
+from app.core.security import calibrate_bcrypt_rounds, configure_bcrypt_rounds
+from app.crud.crud_revoked_token import load_revocation_filter
+from app.crud.crud_user import flush_password_rehashes
+from app.migrations.runner import run_migrations
 from app.api.v1.auth import router as auth_router
 from app.api.v1.users import router as users_router
 from app.api.v1.appointments import router as appointments_router
 from app.api.v1.schedules import router as schedules_router
 
+def refresh_availability_horizons():
+    db = SessionLocal()
+    try:
+        extend_availability_horizons(db)
+    finally:
+        db.close()
+
+
+def archive_past_appointments():
+    db = SessionLocal()
+    try:
+        archive_appointments(db)
+    finally:
+        db.close()
+
+
+def write_password_rehashes():
+    db = SessionLocal()
+    try:
+        flush_password_rehashes(db)
+    finally:
+        db.close()
+
+
 # Create tables on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     Base.metadata.create_all(bind=engine)
+    # create_all only adds missing tables; migrations bring existing ones up to date
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        load_revocation_filter(db)
+        load_archived_through(db)
+    finally:
+        db.close()
+
+    if settings.BCRYPT_ROUNDS is None:
+        # Calibrated once per process; pool workers are handed the result with each hash
+        configure_bcrypt_rounds(calibrate_bcrypt_rounds(settings.BCRYPT_TARGET_MS / 1000, settings.BCRYPT_MIN_ROUNDS))
+
+    background_tasks = [PeriodicTask(
+        "password-rehash", settings.PASSWORD_REHASH_FLUSH_INTERVAL_SECONDS, write_password_rehashes,
+        run_immediately=False
+    )]
+    if settings.AVAILABILITY_REFRESH_INTERVAL_SECONDS > 0:
+        background_tasks.append(PeriodicTask(
+            "availability-horizon", settings.AVAILABILITY_REFRESH_INTERVAL_SECONDS, refresh_availability_horizons
+        ))
+    if settings.APPOINTMENT_ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(PeriodicTask(
+            "appointment-archive", settings.APPOINTMENT_ARCHIVE_INTERVAL_SECONDS, archive_past_appointments
+        ))
+    if ("sqlite" in SYNC_DATABASE_URL and sqlite_pragmas().get("journal_mode") == "WAL"
+            and settings.SQLITE_CHECKPOINT_INTERVAL_SECONDS > 0):
+        checkpointer = WalCheckpointer(engine, settings.SQLITE_CHECKPOINT_TRUNCATE_PAGES)
+        metrics.register("wal_checkpoint", checkpointer.stats)
+        background_tasks.append(PeriodicTask(
+            "wal-checkpoint", settings.SQLITE_CHECKPOINT_INTERVAL_SECONDS, checkpointer.run, run_immediately=False
+        ))
+    for task in background_tasks:
+        task.start()
+
+    writer_engine = None
+    if settings.WRITE_QUEUE_ENABLED:
+        writer_engine = create_writer_engine()
+        start_write_queue(
+            sessionmaker(bind=writer_engine, autoflush=False),
+            settings.WRITE_QUEUE_MAX_BATCH,
+            settings.WRITE_QUEUE_MAX_DELAY_MS / 1000
+        )
+
+    if settings.PASSWORD_POOL_WORKERS > 0:
+        start_password_pool(settings.PASSWORD_POOL_WORKERS, settings.PASSWORD_POOL_MAX_PENDING)
+
+    if settings.RATE_LIMIT_ENABLED:
+        start_rate_limiter({
+            "ip": BucketRule(settings.RATE_LIMIT_IP_BURST, settings.RATE_LIMIT_IP_PER_MINUTE / 60),
+            "username": BucketRule(settings.RATE_LIMIT_USERNAME_BURST, settings.RATE_LIMIT_USERNAME_PER_MINUTE / 60),
+        }, settings.RATE_LIMIT_STATE_PATH, settings.RATE_LIMIT_MAX_KEYS)
+
     yield
+
     # Shutdown
-    pass
+    stop_rate_limiter()
+    stop_password_pool()
+    for task in background_tasks:
+        task.stop()
+    write_password_rehashes()
+    if writer_engine is not None:
+        stop_write_queue()
+        writer_engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 app = FastAPI(
     title="Doctor Appointment System API",
@@ -30,6 +134,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -44,4 +149,8 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.collect()
\ No newline at end of file
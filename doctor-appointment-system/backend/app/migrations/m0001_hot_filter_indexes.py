@@ -0,0 +1,12 @@
+"""Composite and partial indexes for the hot appointment, schedule and user filters"""
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import create_indexes
+
+version = 1
+
+
+def upgrade(connection: Connection) -> None:
+    create_indexes(connection, "appointments", "ix_appointments_doctor_status_date", "ix_appointments_patient_date")
+    create_indexes(connection, "schedules", "ix_schedules_doctor_day_active")
+    create_indexes(connection, "users", "ix_users_role")
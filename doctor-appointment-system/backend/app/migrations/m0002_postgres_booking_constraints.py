@@ -0,0 +1,39 @@
+"""Booking exclusion constraint and server-side timestamp defaults on PostgreSQL"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint
+
+from app.core.database import Base
+
+version = 2
+
+# Timestamp columns whose default moved from the application to the database
+SERVER_DEFAULT_COLUMNS = [
+    ("users", "created_at"),
+    ("schedules", "created_at"),
+    ("appointments", "created_at"),
+    ("appointments", "updated_at"),
+    ("refresh_tokens", "created_at"),
+    ("revoked_tokens", "revoked_at"),
+]
+
+
+def upgrade(connection: Connection) -> None:
+    # SQLite tables keep their old DDL; the ORM still sends the timestamp in each INSERT
+    if connection.dialect.name != "postgresql":
+        return
+
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    appointments = Base.metadata.tables["appointments"]
+    exists = connection.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = 'ex_appointments_doctor_overlap'")
+    ).first()
+    if not exists:
+        # Fails if existing active appointments already overlap; those have to be resolved first
+        constraint = next(c for c in appointments.constraints if c.name == "ex_appointments_doctor_overlap")
+        connection.execute(AddConstraint(constraint))
+
+    for table_name, column_name in SERVER_DEFAULT_COLUMNS:
+        column = Base.metadata.tables[table_name].c[column_name]
+        default = column.server_default.arg.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET DEFAULT {default}"))
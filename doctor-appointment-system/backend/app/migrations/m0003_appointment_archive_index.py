@@ -0,0 +1,10 @@
+"""Status and date index used to pick appointments for the archive"""
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import create_indexes
+
+version = 3
+
+
+def upgrade(connection: Connection) -> None:
+    create_indexes(connection, "appointments", "ix_appointments_status_date")
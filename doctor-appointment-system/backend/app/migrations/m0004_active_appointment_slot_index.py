@@ -0,0 +1,21 @@
+"""Unique active-appointment slot index that lets cancelled slots be booked again"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import create_indexes, rebuild_sqlite_table
+
+version = 4
+
+OLD_CONSTRAINT = "unique_doctor_appointment_slot"
+
+
+def upgrade(connection: Connection) -> None:
+    constraints = {constraint["name"] for constraint in inspect(connection).get_unique_constraints("appointments")}
+    if OLD_CONSTRAINT in constraints:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text(f"ALTER TABLE appointments DROP CONSTRAINT {OLD_CONSTRAINT}"))
+        else:
+            # SQLite cannot drop a table constraint, so the table is rebuilt from the model,
+            # which also makes its ids AUTOINCREMENT
+            rebuild_sqlite_table(connection, "appointments")
+    create_indexes(connection, "appointments", "unique_doctor_active_appointment_slot")
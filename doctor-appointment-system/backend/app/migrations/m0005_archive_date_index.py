@@ -0,0 +1,10 @@
+"""Archive date index read to route appointment lists"""
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import create_indexes
+
+version = 5
+
+
+def upgrade(connection: Connection) -> None:
+    create_indexes(connection, "appointments_archive", "ix_appointments_archive_date")
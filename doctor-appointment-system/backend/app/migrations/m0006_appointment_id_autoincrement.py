@@ -0,0 +1,29 @@
+"""AUTOINCREMENT appointment ids on SQLite, so ids kept by the archive are never handed out again"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import rebuild_sqlite_table
+
+version = 6
+
+
+def upgrade(connection: Connection) -> None:
+    # PostgreSQL sequences never go back, so only SQLite rowids need this
+    if connection.dialect.name != "sqlite":
+        return
+    table_sql = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'appointments'")
+    ).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        rebuild_sqlite_table(connection, "appointments")
+    # Start after every id handed out so far, including ids whose rows were already archived
+    connection.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'appointments', 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'appointments')"
+    ))
+    connection.execute(text(
+        "UPDATE sqlite_sequence SET seq = max(seq, "
+        "(SELECT coalesce(max(id), 0) FROM appointments), "
+        "(SELECT coalesce(max(id), 0) FROM appointments_archive)) "
+        "WHERE name = 'appointments'"
+    ))
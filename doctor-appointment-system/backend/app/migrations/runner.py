@@ -0,0 +1,76 @@
+import importlib
+import logging
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+from app.core.database import Base
+from app.models import models  # noqa: F401  (registers the model tables on Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+# Migration modules in order; each defines ``version`` and ``upgrade(connection)``
+MIGRATIONS = [
+    "app.migrations.m0001_hot_filter_indexes",
+    "app.migrations.m0002_postgres_booking_constraints",
+    "app.migrations.m0003_appointment_archive_index",
+    "app.migrations.m0004_active_appointment_slot_index",
+    "app.migrations.m0005_archive_date_index",
+    "app.migrations.m0006_appointment_id_autoincrement",
+]
+
+schema_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def create_indexes(connection: Connection, table_name: str, *index_names: str) -> None:
+    """Create indexes declared on a model table if the database does not have them yet"""
+    indexes = {index.name: index for index in Base.metadata.tables[table_name].indexes}
+    for name in index_names:
+        connection.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+def rebuild_sqlite_table(connection: Connection, table_name: str) -> None:
+    """Recreate a SQLite table from its model, keeping its rows; SQLite cannot alter constraints in place"""
+    table = Base.metadata.tables[table_name]
+    for index in table.indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    connection.execute(text(f"ALTER TABLE {table_name} RENAME TO {table_name}_old"))
+    table.create(connection)
+    columns = ", ".join(column.name for column in table.columns)
+    connection.execute(text(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {table_name}_old"))
+    connection.execute(text(f"DROP TABLE {table_name}_old"))
+
+
+def get_schema_version(connection: Connection) -> int:
+    schema_metadata.create_all(connection)
+    return connection.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())) \
+        .scalar() or 0
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Apply pending migrations, each in its own transaction, and return the versions applied"""
+    applied = []
+    for module_name in MIGRATIONS:
+        migration = importlib.import_module(module_name)
+        with engine.begin() as connection:
+            if migration.version <= get_schema_version(connection):
+                continue
+            logger.info("Applying schema migration %s", module_name)
+            migration.upgrade(connection)
+            connection.execute(schema_version.insert().values(
+                version=migration.version,
+                description=(migration.__doc__ or module_name).strip(),
+                applied_at=datetime.utcnow()
+            ))
+        applied.append(migration.version)
+    return applied
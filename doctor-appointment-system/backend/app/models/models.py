@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, Time, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, Time, Enum, UniqueConstraint, Index
+from sqlalchemy import DDL, Interval, event, func, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from app.core.database import Base
+from app.core.sql import utcnow
 import enum
-from datetime import datetime
 
 
 class UserRole(str, enum.Enum):
@@ -16,6 +18,11 @@ class AppointmentStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+class SlotState(str, enum.Enum):
+    FREE = "free"
+    BOOKED = "booked"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -26,13 +33,18 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(Enum(UserRole), nullable=False)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
     # Relationships
     doctor_schedules = relationship("Schedule", back_populates="doctor", foreign_keys="Schedule.doctor_id")
     doctor_appointments = relationship("Appointment", back_populates="doctor", foreign_keys="Appointment.doctor_id")
     patient_appointments = relationship("Appointment", back_populates="patient", foreign_keys="Appointment.patient_id")
 
+    # Doctor listings filter by role
+    __table_args__ = (
+        Index('ix_users_role', 'role'),
+    )
+
 
 class Schedule(Base):
     __tablename__ = "schedules"
@@ -44,14 +56,16 @@ class Schedule(Base):
     end_time = Column(Time, nullable=False)
     slot_duration = Column(Integer, default=30)  # in minutes
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
 
     # Relationships
     doctor = relationship("User", back_populates="doctor_schedules", foreign_keys=[doctor_id])
 
-    # Unique constraint to prevent duplicate schedules
+    # Unique constraint to prevent duplicate schedules; active-schedule lookups use the partial index
     __table_args__ = (
         UniqueConstraint('doctor_id', 'day_of_week', 'start_time', 'end_time', name='unique_doctor_schedule'),
+        Index('ix_schedules_doctor_day_active', 'doctor_id', 'day_of_week', 'start_time',
+              sqlite_where=is_active == True, postgresql_where=is_active == True),
     )
 
 
@@ -66,14 +80,132 @@ class Appointment(Base):
     duration = Column(Integer, default=30)  # in minutes
     reason = Column(String, nullable=False)
     status = Column(Enum(AppointmentStatus), default=AppointmentStatus.SCHEDULED)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow())
 
     # Relationships
     doctor = relationship("User", back_populates="doctor_appointments", foreign_keys=[doctor_id])
     patient = relationship("User", back_populates="patient_appointments", foreign_keys=[patient_id])
 
-    # Unique constraint to prevent double booking
+    # Partial unique index to prevent double booking; cancelled appointments are left out so
+    # their slot can be booked again. Schedule conflict counts scan the status index.
+    # On PostgreSQL the exclusion constraint also rejects any overlap of two active
+    # appointments' [start, start + duration) ranges, whatever their start times. Bookings
+    # store their schedule's slot_duration, so the ranges match the slots availability shows.
+    __table_args__ = (
+        Index('unique_doctor_active_appointment_slot', 'doctor_id', 'appointment_date', 'appointment_time',
+              unique=True, sqlite_where=status != AppointmentStatus.CANCELLED,
+              postgresql_where=status != AppointmentStatus.CANCELLED),
+        Index('ix_appointments_doctor_status_date', 'doctor_id', 'status', 'appointment_date', 'appointment_time'),
+        Index('ix_appointments_patient_date', 'patient_id', 'appointment_date', 'appointment_time'),
+        Index('ix_appointments_status_date', 'status', 'appointment_date'),
+        ExcludeConstraint(
+            (doctor_id, '='),
+            (func.tsrange(
+                appointment_date + appointment_time,
+                appointment_date + appointment_time
+                + func.coalesce(duration, 30) * literal_column("INTERVAL '1 minute'", Interval),
+                '[)'
+            ), '&&'),
+            name='ex_appointments_doctor_overlap',
+            using='gist',
+            where=status != AppointmentStatus.CANCELLED,
+        ).ddl_if(dialect='postgresql'),
+        # Archived rows keep their ids, so SQLite must never hand out a deleted id again
+        {'sqlite_autoincrement': True},
+    )
+
+
+# The exclusion constraint compares doctor_id with = inside a GiST index
+event.listen(
+    Appointment.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql")
+)
+
+
+class ArchivedAppointment(Base):
+    """Completed and cancelled appointments moved out of ``appointments`` once past the archive horizon"""
+    __tablename__ = "appointments_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Kept from appointments
+    doctor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    appointment_date = Column(Date, nullable=False)
+    appointment_time = Column(Time, nullable=False)
+    duration = Column(Integer, default=30)  # in minutes
+    reason = Column(String, nullable=False)
+    status = Column(Enum(AppointmentStatus), nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=utcnow(), server_default=utcnow())
+
+    doctor = relationship("User", foreign_keys=[doctor_id])
+    patient = relationship("User", foreign_keys=[patient_id])
+
+    # Archived history is only read through the same (owner, date, time) lists as live appointments
+    __table_args__ = (
+        Index('ix_appointments_archive_doctor_date', 'doctor_id', 'appointment_date', 'appointment_time'),
+        Index('ix_appointments_archive_patient_date', 'patient_id', 'appointment_date', 'appointment_time'),
+        # Latest archived date, which list routing reads at startup
+        Index('ix_appointments_archive_date', 'appointment_date'),
+    )
+
+
+class SlotAvailability(Base):
+    """Read model of every schedule slot inside a doctor's materialized horizon"""
+    __tablename__ = "slot_availability"
+
+    doctor_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    slot_date = Column(Date, primary_key=True)
+    slot_time = Column(Time, primary_key=True)
+    state = Column(Enum(SlotState), nullable=False, default=SlotState.FREE)
+
+    # Free-slot reads are a range scan on (doctor_id, state, slot_date)
+    __table_args__ = (
+        Index('ix_slot_availability_doctor_state_date', 'doctor_id', 'state', 'slot_date', 'slot_time'),
+    )
+
+
+class AvailabilityHorizon(Base):
+    """Date range for which a doctor's slot_availability rows are maintained"""
+    __tablename__ = "availability_horizons"
+
+    doctor_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    materialized_from = Column(Date, nullable=False)
+    materialized_through = Column(Date, nullable=False)
+
+
+class RefreshToken(Base):
+    """Server-side record of an issued refresh token, stored as an HMAC of the token"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_hash = Column(String(64), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    family_id = Column(String(32), nullable=False)  # Shared by every rotation of one sign-in
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow())
+
+    user = relationship("User")
+
+    # Refresh looks tokens up by hash; reuse detection and logout revoke by family or user
     __table_args__ = (
-        UniqueConstraint('doctor_id', 'appointment_date', 'appointment_time', name='unique_doctor_appointment_slot'),
-    )
\ No newline at end of file
+        Index('ix_refresh_tokens_token_hash', 'token_hash', unique=True),
+        Index('ix_refresh_tokens_family', 'family_id'),
+        Index('ix_refresh_tokens_user', 'user_id'),
+    )
+
+
+class RevokedToken(Base):
+    """Access tokens revoked before their expiry, by jti claim"""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, default=utcnow(), server_default=utcnow())
+
+    # Startup reloads the unexpired rows into the revocation filter
+    __table_args__ = (
+        Index('ix_revoked_tokens_expires_at', 'expires_at'),
+    )
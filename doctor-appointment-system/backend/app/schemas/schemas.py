@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, WithJsonSchema, validator
 from datetime import date, time, datetime
-from typing import Optional, List
+from typing import Annotated, Optional, List
+import enum
 from app.models.models import UserRole, AppointmentStatus
 
 
@@ -87,6 +88,13 @@ class AppointmentBase(BaseModel):
     reason: str
     duration: int = 30
 
+
+class AppointmentCreate(AppointmentBase):
+    doctor_id: int
+    # Bookings last one schedule slot; a duration other than the slot length is refused
+    duration: Optional[int] = None
+
+    # Only new bookings; responses include past and archived appointments
     @validator('appointment_date')
     def validate_future_date(cls, v):
         if v < date.today():
@@ -94,10 +102,6 @@ class AppointmentBase(BaseModel):
         return v
 
 
-class AppointmentCreate(AppointmentBase):
-    doctor_id: int
-
-
 class AppointmentUpdate(BaseModel):
     appointment_date: Optional[date] = None
     appointment_time: Optional[time] = None
@@ -119,8 +123,49 @@ class AppointmentResponse(AppointmentBase):
         from_attributes = True
 
 
+# List schemas for rows read straight from the database. Stored addresses were
+# checked on registration, and re-validating them dominated list serialization.
+StoredEmail = Annotated[str, WithJsonSchema({"type": "string", "format": "email"})]
+
+
+class UserRowResponse(UserResponse):
+    email: StoredEmail
+
+
+class AppointmentRowResponse(AppointmentResponse):
+    doctor: Optional[UserRowResponse] = None
+    patient: Optional[UserRowResponse] = None
+
+
 # Available slot schema
 class AvailableSlot(BaseModel):
     date: date
     time: time
-    doctor_id: int
\ No newline at end of file
+    doctor_id: int
+
+
+class NextAvailableSlot(AvailableSlot):
+    doctor_name: str
+
+
+# Compact available slot encodings
+class SlotFormat(str, enum.Enum):
+    SLOTS = "slots"
+    RUNS = "runs"
+    BITMAP = "bitmap"
+
+
+class CompactSlotDay(BaseModel):
+    date: date
+    # "runs": [start_minute, step, count] triples
+    runs: Optional[List[List[int]]] = None
+    # "bitmap": bit i of the base64 little-endian bitmap marks start + i * step as free
+    start: Optional[int] = None
+    step: Optional[int] = None
+    bitmap: Optional[str] = None
+
+
+class CompactAvailability(BaseModel):
+    doctor_id: int
+    format: SlotFormat
+    days: List[CompactSlotDay]
\ No newline at end of file
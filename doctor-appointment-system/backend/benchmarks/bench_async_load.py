@@ -0,0 +1,114 @@
+"""Load benchmark of the appointment list endpoint on the sync and async database paths.
+
+Drives ``GET /api/v1/appointments/my`` in-process through httpx's ASGI transport
+with 200 concurrent clients. The sync path runs the CRUD in Starlette's threadpool
+on the sync engine; the async path awaits an aiosqlite ``AsyncSession`` on the
+event loop. Both read the same SQLite file.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_async_load
+"""
+import asyncio
+import os
+import tempfile
+import time as timer
+from datetime import date, time, timedelta
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, create_async_database_engine, get_async_db, get_db, get_read_db
+from app.core.security import create_access_token
+from app.main import app
+from app.models.models import Appointment, User, UserRole
+
+CLIENTS = 200
+REQUESTS_PER_CLIENT = 10
+APPOINTMENTS = 20
+# A connection per client: a sync session holds its connection until the request's
+# teardown, which itself needs a threadpool worker, so a smaller pool can deadlock
+POOL_OPTIONS = {"pool_size": CLIENTS, "max_overflow": 0}
+
+
+def seed(db):
+    """A patient with a page of appointments spread over the coming weeks"""
+    doctor = User(username="bench_doctor", email="doctor@example.com", full_name="Dr. Bench",
+                  hashed_password="x", role=UserRole.DOCTOR)
+    patient = User(username="bench_patient", email="patient@example.com", full_name="Patient Bench",
+                   hashed_password="x", role=UserRole.PATIENT)
+    db.add_all([doctor, patient])
+    db.flush()
+    for i in range(APPOINTMENTS):
+        db.add(Appointment(doctor_id=doctor.id, patient_id=patient.id,
+                           appointment_date=date.today() + timedelta(days=i + 1),
+                           appointment_time=time(9 + i % 8, 0), reason="bench"))
+    db.commit()
+    return create_access_token(data={"sub": patient.username, "user_id": patient.id, "role": patient.role})
+
+
+async def drive(token: str) -> float:
+    """Requests per second for CLIENTS concurrent clients each sending REQUESTS_PER_CLIENT requests"""
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits,
+                                 cookies={"access_token": token}) as client:
+        async def run_client():
+            for _ in range(REQUESTS_PER_CLIENT):
+                response = await client.get("/api/v1/appointments/my")
+                assert response.status_code == 200 and len(response.json()) == APPOINTMENTS
+
+        await run_client()  # warm up
+        started = timer.perf_counter()
+        await asyncio.gather(*(run_client() for _ in range(CLIENTS)))
+        elapsed = timer.perf_counter() - started
+    return CLIENTS * REQUESTS_PER_CLIENT / elapsed
+
+
+def main():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, **POOL_OPTIONS)
+    Base.metadata.create_all(bind=engine)
+    SyncSession = sessionmaker(autoflush=False, bind=engine)
+    with SyncSession() as db:
+        token = seed(db)
+
+    async_engine = create_async_database_engine(f"sqlite+aiosqlite:///{path}", **POOL_OPTIONS)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def override_get_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def no_async_db():
+        yield None
+
+    async def override_get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        print(f"{CLIENTS} concurrent clients x {REQUESTS_PER_CLIENT} requests, {APPOINTMENTS} appointments each")
+        baseline = None
+        for name, async_db in [("sync threadpool", no_async_db), ("async aiosqlite", override_get_async_db)]:
+            app.dependency_overrides[get_async_db] = async_db
+            rate = asyncio.run(drive(token))
+            baseline = baseline or rate
+            print(f"{name:<16} {rate:8.0f} req/s  {rate / baseline:5.2f}x")
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark available-slot generation over a 30-day range.
+
+Compares the original per-slot implementation of ``get_available_slots`` with the
+bitmap slot engine, both as ``AvailableSlot`` objects and as the JSON body the
+``/available-slots`` endpoint sends.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_available_slots
+"""
+import random
+import timeit
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.core.slot_engine import render_slots_json
+from app.crud.crud_schedule import get_available_slots, get_free_slot_masks, get_schedules_by_doctor
+from app.models.models import Appointment, AppointmentStatus, Schedule, User, UserRole
+from app.schemas.schemas import AvailableSlot
+
+RANGE_DAYS = 30
+REPEAT = 5
+NUMBER = 20
+
+
+def legacy_get_available_slots(db, doctor_id, start_date, end_date):
+    """The per-day, per-slot implementation the slot engine replaced"""
+    available_slots = []
+    schedules = get_schedules_by_doctor(db, doctor_id)
+    if not schedules:
+        return available_slots
+
+    booked_appointments = db.query(Appointment).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date >= start_date,
+        Appointment.appointment_date <= end_date,
+        Appointment.status != AppointmentStatus.CANCELLED
+    ).all()
+    booked_slots = {(apt.appointment_date, apt.appointment_time) for apt in booked_appointments}
+
+    current_date = start_date
+    while current_date <= end_date:
+        day_of_week = current_date.weekday()
+        day_schedules = [s for s in schedules if s.day_of_week == day_of_week]
+        for schedule in day_schedules:
+            current_time = schedule.start_time
+            while current_time < schedule.end_time:
+                if (current_date, current_time) not in booked_slots:
+                    available_slots.append(AvailableSlot(date=current_date, time=current_time, doctor_id=doctor_id))
+                current_datetime = datetime.combine(current_date, current_time)
+                current_time = (current_datetime + timedelta(minutes=schedule.slot_duration)).time()
+        current_date += timedelta(days=1)
+
+    return available_slots
+
+
+def seed(db):
+    """A doctor with split shifts six days a week and ~30% of slots booked"""
+    doctor = User(username="bench_doctor", email="doctor@bench.local", full_name="Dr. Bench",
+                  hashed_password="x", role=UserRole.DOCTOR)
+    patient = User(username="bench_patient", email="patient@bench.local", full_name="Patient Bench",
+                   hashed_password="x", role=UserRole.PATIENT)
+    db.add_all([doctor, patient])
+    db.flush()
+
+    for day_of_week in range(6):
+        db.add(Schedule(doctor_id=doctor.id, day_of_week=day_of_week,
+                        start_time=time(8, 0), end_time=time(12, 0), slot_duration=15))
+        db.add(Schedule(doctor_id=doctor.id, day_of_week=day_of_week,
+                        start_time=time(13, 0), end_time=time(19, 0), slot_duration=15))
+
+    rng = random.Random(42)
+    start_date = date.today() + timedelta(days=1)
+    for offset in range(RANGE_DAYS + 1):
+        day = start_date + timedelta(days=offset)
+        if day.weekday() == 6:
+            continue
+        for minute in list(range(8 * 60, 12 * 60, 15)) + list(range(13 * 60, 19 * 60, 15)):
+            if rng.random() < 0.3:
+                db.add(Appointment(doctor_id=doctor.id, patient_id=patient.id, appointment_date=day,
+                                   appointment_time=time(minute // 60, minute % 60), reason="bench"))
+    db.commit()
+    return doctor.id, start_date, start_date + timedelta(days=RANGE_DAYS)
+
+
+def main():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    doctor_id, start_date, end_date = seed(db)
+
+    legacy = legacy_get_available_slots(db, doctor_id, start_date, end_date)
+    engine_slots = get_available_slots(db, doctor_id, start_date, end_date)
+    assert [(s.date, s.time) for s in legacy] == [(s.date, s.time) for s in engine_slots]
+
+    cases = {
+        "legacy objects": lambda: legacy_get_available_slots(db, doctor_id, start_date, end_date),
+        "engine objects": lambda: get_available_slots(db, doctor_id, start_date, end_date),
+        "engine json": lambda: render_slots_json(
+            doctor_id, get_free_slot_masks(db, doctor_id, start_date, end_date)),
+    }
+
+    print(f"{len(legacy)} free slots over {RANGE_DAYS + 1} days")
+    baseline = None
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, repeat=REPEAT, number=NUMBER)) / NUMBER
+        baseline = baseline or best
+        print(f"{name:<16} {best * 1000:8.2f} ms/request  {baseline / best:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark serializing an appointment list from ORM objects and from Core rows.
+
+Reads one doctor's 10k appointments the way the list endpoints do and turns them
+into JSON through the response model, as FastAPI does. The ORM path loads
+Appointment and User objects and validates them ``from_attributes`` through
+``List[AppointmentResponse]``. The Core path selects only the response columns,
+joined to both participants, and validates plain dicts through
+``List[AppointmentRowResponse]``, as the list endpoints do.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_list_projection
+"""
+import time as timer
+from datetime import date, time, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.crud.crud_appointment import get_appointment_rows_by_doctor, get_appointments_by_doctor
+from app.models.models import Appointment, User, UserRole
+from app.schemas.schemas import AppointmentResponse, AppointmentRowResponse
+
+APPOINTMENTS = 10000
+PATIENTS = 200
+REPEAT = 5
+
+def seed(Session) -> int:
+    with Session() as db:
+        doctor = User(username="bench_doctor", email="doctor@example.com", full_name="Dr. Bench",
+                      hashed_password="x", role=UserRole.DOCTOR)
+        patients = [User(username=f"bench_patient_{i}", email=f"patient{i}@example.com",
+                         full_name=f"Patient {i}", hashed_password="x", role=UserRole.PATIENT)
+                    for i in range(PATIENTS)]
+        db.add_all([doctor, *patients])
+        db.flush()
+        db.add_all([
+            Appointment(doctor_id=doctor.id, patient_id=patients[i % PATIENTS].id,
+                        appointment_date=date.today() + timedelta(days=1 + i // 16),
+                        appointment_time=time(8 + (i % 16) // 2, 30 * (i % 2)), reason="bench")
+            for i in range(APPOINTMENTS)
+        ])
+        db.commit()
+        return doctor.id
+
+
+def serialize(Session, read, responses: TypeAdapter, doctor_id: int) -> float:
+    """Seconds to read and serialize the list, best of REPEAT runs on fresh sessions"""
+    best = None
+    for _ in range(REPEAT):
+        with Session() as db:
+            started = timer.perf_counter()
+            items = read(db, doctor_id)
+            body = responses.dump_json(responses.validate_python(items, from_attributes=True))
+            elapsed = timer.perf_counter() - started
+        assert len(items) == APPOINTMENTS and body
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    doctor_id = seed(Session)
+
+    print(f"{APPOINTMENTS} appointments, {PATIENTS} patients")
+    baseline = None
+    for name, read, schema in [
+        ("ORM objects", get_appointments_by_doctor, AppointmentResponse),
+        ("Core rows", get_appointment_rows_by_doctor, AppointmentRowResponse),
+    ]:
+        best = serialize(Session, read, TypeAdapter(List[schema]), doctor_id)
+        baseline = baseline or best
+        print(f"{name:<12} {best * 1000:8.1f} ms  {APPOINTMENTS / best:9.0f} rows/s  {baseline / best:5.2f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark mixed read/write throughput under each SQLite PRAGMA profile.
+
+Eight threads share one database file, as the backend's request threads do. Each
+operation is a doctor's appointment list read, or, one time in five, a booking
+insert committed on its own. Under the rollback journal, readers and the writer
+block each other. Under WAL, readers keep going while a commit is in progress.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_sqlite_profiles
+"""
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time as timer
+from datetime import date, time, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import SQLITE_PROFILES, Base, sqlite_pragma_listener, sqlite_pragmas
+from app.crud.crud_appointment import get_appointments_by_doctor
+from app.models.models import Appointment, User, UserRole
+
+THREADS = 8
+DURATION_SECONDS = 3
+WRITE_RATIO = 0.2
+SEED_APPOINTMENTS = 2000
+
+
+def seed(Session):
+    with Session() as db:
+        doctor = User(username="bench_doctor", email="doctor@example.com", full_name="Dr. Bench",
+                      hashed_password="x", role=UserRole.DOCTOR)
+        patient = User(username="bench_patient", email="patient@example.com", full_name="Patient Bench",
+                       hashed_password="x", role=UserRole.PATIENT)
+        db.add_all([doctor, patient])
+        db.flush()
+        db.add_all([
+            Appointment(doctor_id=doctor.id, patient_id=patient.id,
+                        appointment_date=date.today() + timedelta(days=1 + i // 16),
+                        appointment_time=time(8 + (i % 16) // 2, 30 * (i % 2)), reason="bench")
+            for i in range(SEED_APPOINTMENTS)
+        ])
+        db.commit()
+        return doctor.id, patient.id
+
+
+def run_profile(profile: str) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                           pool_size=THREADS, max_overflow=0)
+    event.listen(engine, "connect", sqlite_pragma_listener(sqlite_pragmas(profile)))
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    doctor_id, patient_id = seed(Session)
+
+    # New bookings go after the seeded ones, one unique slot each
+    slots = itertools.count(SEED_APPOINTMENTS)
+    counts = {"reads": 0, "writes": 0, "busy": 0}
+    lock = threading.Lock()
+    deadline = timer.perf_counter() + DURATION_SECONDS
+
+    def worker(seed_value: int):
+        rng = random.Random(seed_value)
+        local = {"reads": 0, "writes": 0, "busy": 0}
+        with Session() as db:
+            while timer.perf_counter() < deadline:
+                try:
+                    if rng.random() < WRITE_RATIO:
+                        slot = next(slots)
+                        db.add(Appointment(doctor_id=doctor_id, patient_id=patient_id,
+                                           appointment_date=date.today() + timedelta(days=1 + slot // 16),
+                                           appointment_time=time(8 + (slot % 16) // 2, 30 * (slot % 2)),
+                                           reason="bench"))
+                        db.commit()
+                        local["writes"] += 1
+                    else:
+                        get_appointments_by_doctor(db, doctor_id, limit=50)
+                        db.rollback()  # end the read transaction like a request would
+                        local["reads"] += 1
+                except OperationalError:
+                    # "database is locked" once the busy timeout runs out
+                    db.rollback()
+                    local["busy"] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+    return counts
+
+
+def main():
+    print(f"{THREADS} threads for {DURATION_SECONDS}s, {WRITE_RATIO:.0%} writes")
+    baseline = None
+    for profile in SQLITE_PROFILES:
+        counts = run_profile(profile)
+        rate = (counts["reads"] + counts["writes"]) / DURATION_SECONDS
+        baseline = baseline or rate
+        print(f"{profile:<8} {rate:8.0f} ops/s  reads {counts['reads']:6d}  writes {counts['writes']:5d}  "
+              f"locked {counts['busy']:4d}  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,20 @@ import tempfile
 import os
 from typing import Generator
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 
+# Cheap bcrypt for test fixtures and logins; calibration is tested on its own
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 from app.main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_read_db
 from app.core.security import get_password_hash
+from app.crud import crud_appointment
+from app.crud.crud_availability import availability_cache
+from app.crud.crud_revoked_token import revocation_filter
+from app.crud.crud_user import pending_rehashes, principal_cache
 from app.models.models import User, UserRole, Schedule, Appointment, AppointmentStatus
 from datetime import date, time, datetime, timedelta
 
@@ -33,6 +40,13 @@ def test_db():
     # Create tables
     Base.metadata.create_all(bind=engine)
 
+    # Cached availability must not leak between test databases
+    availability_cache.clear()
+    principal_cache.clear()
+    revocation_filter.clear()
+    pending_rehashes.clear()
+    crud_appointment.archived_through = None
+
     # Create session
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -57,7 +71,9 @@ def client(test_db):
         finally:
             pass  # Don't close here as it's managed by test_db fixture
 
+    # Reads and writes share the test session
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     with TestClient(app) as test_client:
         yield test_client
@@ -65,6 +81,31 @@ def client(test_db):
     app.dependency_overrides.clear()
 
 
+class QueryCounter:
+    """Counts the SQL statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+@pytest.fixture
+def query_counter(test_db) -> QueryCounter:
+    """Count queries per request: ``with query_counter: client.get(...)``"""
+    return QueryCounter(test_db.get_bind())
+
+
 @pytest.fixture
 def test_doctor(test_db) -> User:
     """Create a test doctor"""
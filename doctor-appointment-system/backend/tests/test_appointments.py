@@ -1,7 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
 from datetime import date, time, timedelta
-from app.models.models import AppointmentStatus
+from app.core.config import settings
+from app.crud import crud_appointment
+from app.crud.crud_appointment import (
+    archive_appointments, archive_horizon, delete_appointment, get_appointment_rows_by_doctor, get_appointment_rows_by_patient,
+    get_appointments_by_doctor, get_appointments_by_patient, load_archived_through
+)
+from app.schemas.schemas import AppointmentResponse, AppointmentRowResponse
+from app.models.models import Appointment, AppointmentStatus, ArchivedAppointment, User, UserRole
 from freezegun import freeze_time
 
 
@@ -36,6 +43,26 @@ class TestAppointments:
         assert data["reason"] == "General checkup"
         assert data["status"] == "scheduled"
 
+    def test_booking_duration_must_match_slot(self, client: TestClient, patient_headers, test_doctor,
+                                              test_schedule):
+        """Test a duration other than the slot length is refused and an omitted one takes the slot length"""
+        today = date.today()
+        next_tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+        booking = {
+            "doctor_id": test_doctor.id,
+            "appointment_date": str(next_tuesday),
+            "appointment_time": "10:00:00",
+            "reason": "Long visit"
+        }
+
+        response = client.post("/api/v1/appointments/", json=dict(booking, duration=90), headers=patient_headers)
+        assert response.status_code == 422
+        assert "30 minutes" in response.json()["detail"]
+
+        response = client.post("/api/v1/appointments/", json=booking, headers=patient_headers)
+        assert response.status_code == 200
+        assert response.json()["duration"] == test_schedule.slot_duration
+
     def test_create_appointment_as_doctor_fails(self, client: TestClient, doctor_headers, test_doctor):
         """Test doctor cannot create appointments"""
         response = client.post(
@@ -109,6 +136,25 @@ class TestAppointments:
         assert response.status_code == 400
         assert "This time slot is not available" in response.json()["detail"]
 
+    def test_create_appointment_between_slots(self, client: TestClient, patient_headers, test_doctor,
+                                              test_schedule):
+        """Test a time inside the schedule's hours but between slot start times is refused"""
+        today = date.today()
+        next_tuesday = today + timedelta(days=(1 - today.weekday()) % 7 or 7)
+
+        response = client.post(
+            "/api/v1/appointments/",
+            json={
+                "doctor_id": test_doctor.id,
+                "appointment_date": str(next_tuesday),
+                "appointment_time": "10:15:00",
+                "reason": "General checkup"
+            },
+            headers=patient_headers
+        )
+        assert response.status_code == 400
+        assert "This time slot is not available" in response.json()["detail"]
+
     def test_double_booking_prevention(self, client: TestClient, patient_headers, test_appointment, test_patient):
         """Test that double booking is prevented"""
         # Try to book the same slot
@@ -239,6 +285,24 @@ class TestAppointments:
         assert response.status_code == 200
         assert response.json()["status"] == "cancelled"
 
+    def test_rebook_cancelled_slot(self, client: TestClient, patient_headers, test_appointment):
+        """Test a cancelled appointment's slot can be booked again, but only once"""
+        response = client.delete(f"/api/v1/appointments/{test_appointment.id}", headers=patient_headers)
+        assert response.status_code == 200
+
+        booking = {
+            "doctor_id": test_appointment.doctor_id,
+            "appointment_date": str(test_appointment.appointment_date),
+            "appointment_time": str(test_appointment.appointment_time),
+            "reason": "Rebooked appointment"
+        }
+        response = client.post("/api/v1/appointments/", json=booking, headers=patient_headers)
+        assert response.status_code == 200
+        assert response.json()["id"] != test_appointment.id
+
+        response = client.post("/api/v1/appointments/", json=booking, headers=patient_headers)
+        assert response.status_code == 400
+
     def test_get_doctor_appointments_with_filter(self, client: TestClient, doctor_headers, test_appointment):
         """Test getting doctor appointments with date filter"""
         response = client.get(
@@ -249,4 +313,257 @@ class TestAppointments:
         assert response.status_code == 200
         data = response.json()
         assert len(data) == 1
-        assert data[0]["id"] == test_appointment.id
\ No newline at end of file
+        assert data[0]["id"] == test_appointment.id
+
+
+def add_appointments(db, doctor_id: int, first_slot: int, count: int) -> None:
+    """Book ``count`` Tuesday slots for the doctor, each with a different patient"""
+    tuesday = date.today() + timedelta(days=(1 - date.today().weekday()) % 7 or 7)
+    for i in range(first_slot, first_slot + count):
+        patient = User(username=f"listed_{i}", email=f"listed{i}@example.com", full_name=f"Listed {i}",
+                       hashed_password="x", role=UserRole.PATIENT)
+        db.add(patient)
+        db.flush()
+        db.add(Appointment(doctor_id=doctor_id, patient_id=patient.id,
+                           appointment_date=tuesday + timedelta(days=7 * (i // 8)),
+                           appointment_time=time(9 + i % 8, 0), reason="Listing"))
+    db.commit()
+
+
+class TestAppointmentQueryCounts:
+    """Test appointment list endpoints issue a constant number of queries"""
+
+    def test_doctor_list_does_not_grow_with_results(self, client: TestClient, test_db, test_doctor,
+                                                    doctor_headers, query_counter):
+        """Test nested doctor/patient users are batch loaded rather than loaded per row"""
+        doctor_id = test_doctor.id
+        url = f"/api/v1/appointments/doctor/{doctor_id}"
+        client.get(url, headers=doctor_headers)  # cache the principal so both counts skip the user lookup
+
+        add_appointments(test_db, doctor_id, 0, 2)
+        test_db.expunge_all()
+        with query_counter:
+            response = client.get(url, headers=doctor_headers)
+        assert len(response.json()) == 2
+        few_rows = query_counter.count
+
+        add_appointments(test_db, doctor_id, 2, 20)
+        test_db.expunge_all()
+        with query_counter:
+            response = client.get(url, headers=doctor_headers)
+        data = response.json()
+        assert len(data) == 22
+        assert query_counter.count == few_rows
+        assert {item["patient"]["username"] for item in data} == {f"listed_{i}" for i in range(22)}
+        assert all(item["doctor"]["id"] == doctor_id for item in data)
+
+    def test_my_appointments_query_count(self, client: TestClient, test_db, test_doctor, test_patient,
+                                         patient_headers, query_counter):
+        """Test a patient's own list reads the participants in the same select as the appointments"""
+        test_db.add_all([
+            Appointment(doctor_id=test_doctor.id, patient_id=test_patient.id,
+                        appointment_date=date.today() + timedelta(days=day), appointment_time=time(10, 0),
+                        reason="Mine")
+            for day in range(1, 11)
+        ])
+        test_db.commit()
+        test_db.expunge_all()
+
+        with query_counter:
+            response = client.get("/api/v1/appointments/my", headers=patient_headers)
+        assert len(response.json()) == 10
+        # user lookup, then one select joining both participants for the live table and
+        # one for the archive, which the open-ended range reaches
+        assert query_counter.count == 3
+
+
+class TestAppointmentPagination:
+    """Test keyset pagination and server-side filters on appointment lists"""
+
+    def test_walk_pages_with_cursor(self, client: TestClient, test_db, test_doctor, doctor_headers):
+        """Test following X-Next-Cursor returns every appointment once in order"""
+        add_appointments(test_db, test_doctor.id, 0, 22)
+
+        seen, params = [], {"limit": 5}
+        while True:
+            response = client.get("/api/v1/appointments/my", params=params, headers=doctor_headers)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= 5
+            seen += page
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+        assert len(seen) == 22
+        assert len({item["id"] for item in seen}) == 22
+        keys = [(item["appointment_date"], item["appointment_time"], item["id"]) for item in seen]
+        assert keys == sorted(keys)
+
+    def test_filters_run_in_sql(self, client: TestClient, test_db, test_doctor, doctor_headers):
+        """Test date range and status filters on the doctor listing"""
+        add_appointments(test_db, test_doctor.id, 0, 16)  # two Tuesdays of eight
+        first = test_db.query(Appointment).order_by(Appointment.appointment_date, Appointment.id).first()
+        first.status = AppointmentStatus.CANCELLED
+        test_db.commit()
+        tuesday = first.appointment_date
+        url = f"/api/v1/appointments/doctor/{test_doctor.id}"
+
+        response = client.get(url, params={"from_date": str(tuesday + timedelta(days=1))}, headers=doctor_headers)
+        assert len(response.json()) == 8
+
+        response = client.get(url, params={"to_date": str(tuesday), "status": "scheduled"}, headers=doctor_headers)
+        data = response.json()
+        assert len(data) == 7
+        assert all(item["status"] == "scheduled" and item["appointment_date"] == str(tuesday) for item in data)
+
+        response = client.get(url, params={"appointment_date": str(tuesday), "status": "cancelled"},
+                              headers=doctor_headers)
+        assert [item["id"] for item in response.json()] == [first.id]
+
+    def test_invalid_cursor(self, client: TestClient, doctor_headers):
+        """Test a malformed cursor is rejected"""
+        response = client.get("/api/v1/appointments/my", params={"cursor": "not-a-cursor"}, headers=doctor_headers)
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+
+
+def add_history(db, doctor_id: int, patient_id: int, statuses, days_ago: int = 200) -> None:
+    """Add one appointment per status on consecutive days ending ``days_ago`` days back"""
+    db.add_all([
+        Appointment(doctor_id=doctor_id, patient_id=patient_id,
+                    appointment_date=date.today() - timedelta(days=days_ago + i), appointment_time=time(9, 0),
+                    reason="History", status=status)
+        for i, status in enumerate(statuses)
+    ])
+    db.commit()
+
+
+class TestAppointmentArchive:
+    """Test moving past appointments to the archive and reading them back through the lists"""
+
+    def test_archive_moves_old_final_appointments(self, test_db, test_doctor, test_patient, test_appointment):
+        """Test only completed and cancelled appointments past the horizon are moved"""
+        add_history(test_db, test_doctor.id, test_patient.id,
+                    [AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED, AppointmentStatus.SCHEDULED])
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.COMPLETED], days_ago=10)
+
+        assert archive_appointments(test_db) == 2
+
+        archived = test_db.query(ArchivedAppointment).all()
+        assert {a.status for a in archived} == {AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED}
+        assert all(a.appointment_date < archive_horizon() and a.archived_at is not None for a in archived)
+        assert test_db.query(Appointment).count() == 3
+        assert archive_appointments(test_db) == 0
+
+    def test_archive_in_batches(self, test_db, test_doctor, test_patient, test_appointment):
+        """Test every eligible row is moved when there are more than one batch"""
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.COMPLETED] * 5)
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.SCHEDULED], days_ago=10)
+
+        assert archive_appointments(test_db, batch_size=2) == 5
+        assert test_db.query(ArchivedAppointment).count() == 5
+
+    def test_archived_ids_are_not_reused(self, test_db, test_doctor, test_patient, test_appointment):
+        """Test a new appointment never takes the id of an archived one, even the highest"""
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.CANCELLED])
+        assert archive_appointments(test_db) == 1
+        archived_id = test_db.query(ArchivedAppointment.id).scalar()
+        assert delete_appointment(test_db, test_appointment.id)
+        assert test_db.query(Appointment).count() == 0
+
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.SCHEDULED], days_ago=10)
+        assert test_db.query(Appointment.id).scalar() > archived_id
+
+    def test_lists_merge_archive(self, client: TestClient, test_db, test_doctor, test_patient, test_appointment,
+                                 patient_headers):
+        """Test paging through a list returns live and archived appointments in one order"""
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.COMPLETED] * 3)
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.SCHEDULED], days_ago=150)
+        archive_appointments(test_db)
+
+        seen, params = [], {"limit": 2}
+        while True:
+            response = client.get("/api/v1/appointments/my", params=params, headers=patient_headers)
+            seen += response.json()
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+        assert len(seen) == 5
+        keys = [(item["appointment_date"], item["appointment_time"], item["id"]) for item in seen]
+        assert keys == sorted(keys)
+        assert all(item["doctor"]["id"] == test_doctor.id for item in seen)
+
+    def test_routing_follows_archived_dates(self, test_db, test_doctor, test_patient, test_appointment,
+                                            monkeypatch):
+        """Test rows archived under a shorter horizon stay listed after the setting is raised"""
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.COMPLETED] * 2)
+        archive_appointments(test_db)
+        latest = date.today() - timedelta(days=200)
+        assert crud_appointment.archived_through == latest
+
+        monkeypatch.setattr(settings, "APPOINTMENT_ARCHIVE_AFTER_DAYS", 365)
+        listed = get_appointments_by_patient(test_db, test_patient.id, from_date=latest - timedelta(days=5))
+        assert sum(a.appointment_date <= latest for a in listed) == 2
+        assert get_appointments_by_patient(test_db, test_patient.id, from_date=latest + timedelta(days=1)) == \
+            [test_appointment]
+
+        crud_appointment.archived_through = None
+        assert load_archived_through(test_db) == latest
+
+    def test_recent_range_skips_archive(self, client: TestClient, test_doctor, doctor_headers, query_counter):
+        """Test a range starting after the horizon does not query the archive"""
+        url = f"/api/v1/appointments/doctor/{test_doctor.id}"
+        client.get(url, headers=doctor_headers)  # cache the principal
+
+        with query_counter:
+            client.get(url, params={"from_date": str(archive_horizon() - timedelta(days=1))}, headers=doctor_headers)
+        reaching = query_counter.count
+
+        query_counter.count = 0
+        with query_counter:
+            client.get(url, params={"from_date": str(archive_horizon())}, headers=doctor_headers)
+        assert query_counter.count == reaching - 1
+
+        query_counter.count = 0
+        with query_counter:
+            client.get(url, params={"status": "scheduled"}, headers=doctor_headers)
+        assert query_counter.count == reaching - 1
+
+    def test_archived_appointment_by_id(self, client: TestClient, test_db, test_doctor, test_patient,
+                                        test_appointment, patient_headers):
+        """Test an archived appointment is still readable by id"""
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.CANCELLED])
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.SCHEDULED], days_ago=10)
+        archive_appointments(test_db)
+        archived_id = test_db.query(ArchivedAppointment.id).scalar()
+
+        response = client.get(f"/api/v1/appointments/{archived_id}", headers=patient_headers)
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+
+
+class TestAppointmentRows:
+    """Test the Core projection read paths against the ORM lists they replace"""
+
+    def test_rows_match_orm_responses(self, test_db, test_doctor, test_patient):
+        """Test row dicts serialize through AppointmentRowResponse exactly like AppointmentResponse from ORM objects"""
+        add_appointments(test_db, test_doctor.id, 0, 5)
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.COMPLETED] * 2)
+        add_history(test_db, test_doctor.id, test_patient.id, [AppointmentStatus.SCHEDULED], days_ago=10)
+        archive_appointments(test_db)
+
+        def dump(items, schema=AppointmentRowResponse):
+            return [schema.model_validate(item).model_dump() for item in items]
+
+        for orm_read, row_read, owner_id in [
+            (get_appointments_by_doctor, get_appointment_rows_by_doctor, test_doctor.id),
+            (get_appointments_by_patient, get_appointment_rows_by_patient, test_patient.id),
+        ]:
+            expected = dump(orm_read(test_db, owner_id), AppointmentResponse)
+            assert expected
+            assert dump(row_read(test_db, owner_id)) == expected
+            assert dump(row_read(test_db, owner_id, limit=3)) == expected[:3]
@@ -0,0 +1,86 @@
+import pytest
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.database import create_async_database_engine, get_async_db, is_async_url, to_sync_url
+from app.main import app
+
+
+@pytest.fixture
+def async_reads(test_db):
+    """Serve reads from an aiosqlite session on the test database; yields the executed statements"""
+    url = test_db.get_bind().url.set(drivername="sqlite+aiosqlite").render_as_string()
+    async_engine = create_async_database_engine(url)
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield statements
+    app.dependency_overrides.pop(get_async_db, None)
+    async_engine.sync_engine.dispose()
+
+
+class TestAsyncDatabase:
+    """Test the async read path selected by an async DATABASE_URL"""
+
+    def test_async_url_detection(self):
+        """Test async driver URLs map back to their sync driver"""
+        assert is_async_url("sqlite+aiosqlite:///./appointments.db")
+        assert not is_async_url("sqlite:///./appointments.db")
+        assert to_sync_url("sqlite+aiosqlite:///./appointments.db") == "sqlite:///./appointments.db"
+        assert to_sync_url("postgresql+asyncpg://app:secret@db/appointments") == \
+            "postgresql://app:secret@db/appointments"
+
+    def test_appointment_reads_use_async_session(self, client: TestClient, async_reads, test_appointment,
+                                                 patient_headers):
+        """Test authentication and appointment reads run on the AsyncSession"""
+        response = client.get("/api/v1/appointments/my", headers=patient_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["id"] for item in data] == [test_appointment.id]
+        assert data[0]["doctor"]["username"] == "dr_test"
+
+        response = client.get(f"/api/v1/appointments/{test_appointment.id}", headers=patient_headers)
+        assert response.status_code == 200
+        assert response.json()["patient"]["username"] == "patient_test"
+
+        assert any("FROM appointments" in statement for statement in async_reads)
+        assert any("WHERE users.username" in statement for statement in async_reads)
+
+    def test_user_reads_use_async_session(self, client: TestClient, async_reads, test_doctor, test_patient):
+        """Test the doctor list and user lookup on the async path"""
+        response = client.get("/api/v1/users/doctors")
+        assert [user["id"] for user in response.json()] == [test_doctor.id]
+
+        response = client.get(f"/api/v1/users/{test_patient.id}")
+        assert response.json()["username"] == "patient_test"
+
+        response = client.get("/api/v1/users/999")
+        assert response.status_code == 404
+        assert len(async_reads) == 3
+
+    def test_writes_visible_to_async_reads(self, client: TestClient, async_reads, test_schedule, patient_headers):
+        """Test a booking committed on the sync engine is read back on the async path"""
+        tuesday = date.today() + timedelta(days=(1 - date.today().weekday()) % 7 or 7)
+        response = client.post(
+            "/api/v1/appointments/",
+            json={
+                "doctor_id": test_schedule.doctor_id,
+                "appointment_date": str(tuesday),
+                "appointment_time": "11:00:00",
+                "reason": "Async"
+            },
+            headers=patient_headers
+        )
+        assert response.status_code == 200
+
+        response = client.get("/api/v1/appointments/my", params={"from_date": str(tuesday)}, headers=patient_headers)
+        assert [item["reason"] for item in response.json()] == ["Async"]
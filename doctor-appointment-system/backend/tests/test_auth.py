@@ -1,6 +1,18 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
 import pytest
 from fastapi.testclient import TestClient
-from app.models.models import UserRole
+from app.core.config import settings
+from app.core.password_pool import PasswordPool, PoolSaturated, get_password_pool
+from app.core.rate_limit import BucketRule, MemoryBucketStore, RateLimiter, get_rate_limiter
+from app.core.security import (
+    configure_bcrypt_rounds, create_access_token, get_password_hash, hash_refresh_token, verify_password
+)
+from app.crud.crud_user import flush_password_rehashes, pending_rehashes, queue_password_rehash
+from app.crud.crud_revoked_token import load_revocation_filter, revocation_filter, revoke_token
+from app.main import app
+from app.models.models import RefreshToken, RevokedToken, User, UserRole
 
 
 class TestAuthentication:
@@ -158,4 +170,335 @@ class TestAuthentication:
         )
         # Login should fail for inactive users
         assert response.status_code == 401
-        assert "Inactive user" in response.json()["detail"]
\ No newline at end of file
+        assert "Inactive user" in response.json()["detail"]
+
+
+class TestPrincipalCache:
+    """Test the authenticated-principal cache behind get_current_user"""
+
+    def test_repeat_requests_skip_user_lookup(self, client: TestClient, patient_headers, query_counter):
+        """Test a second request with the same token is served from the cache"""
+        with query_counter:
+            client.get("/api/v1/appointments/my", headers=patient_headers)
+        first_queries = query_counter.count
+        before = client.get("/metrics").json()["principal_cache"]
+
+        query_counter.count = 0
+        with query_counter:
+            response = client.get("/api/v1/appointments/my", headers=patient_headers)
+        after = client.get("/metrics").json()["principal_cache"]
+
+        assert response.status_code == 200
+        assert query_counter.count == first_queries - 1
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"]
+        assert 0 < after["hit_rate"] <= 1
+
+    def test_user_update_invalidates_principal(self, client: TestClient, test_db, test_patient,
+                                               patient_headers):
+        """Test deactivating a user takes effect on their cached token immediately"""
+        assert client.get("/api/v1/appointments/my", headers=patient_headers).status_code == 200
+
+        test_patient.is_active = False
+        test_db.commit()
+
+        response = client.get("/api/v1/appointments/my", headers=patient_headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Inactive user"
+
+    def test_token_without_user_id_falls_back_to_username(self, client: TestClient, test_patient):
+        """Test tokens issued without a user_id claim still authenticate"""
+        token = create_access_token(data={"sub": test_patient.username, "role": test_patient.role})
+        response = client.get("/api/v1/appointments/my", headers={"Cookie": f"access_token={token}"})
+        assert response.status_code == 200
+
+    def test_token_for_other_username_rejected(self, client: TestClient, test_patient, test_doctor):
+        """Test a user_id claim must belong to the token's subject"""
+        token = create_access_token(data={"sub": test_doctor.username, "user_id": test_patient.id,
+                                          "role": test_doctor.role})
+        response = client.get("/api/v1/appointments/my", headers={"Cookie": f"access_token={token}"})
+        assert response.status_code == 401
+
+
+def login_refresh_token(client: TestClient, username: str) -> str:
+    response = client.post("/api/v1/auth/login", json={"username": username, "password": "password123"})
+    assert response.status_code == 200
+    return response.json()["refresh_token"]
+
+
+def refresh_with(client: TestClient, refresh_token: str):
+    return client.post("/api/v1/auth/refresh", headers={"Cookie": f"refresh_token={refresh_token}"})
+
+
+class TestRefreshTokens:
+    """Test rotating refresh tokens and session renewal"""
+
+    def test_login_issues_refresh_cookie(self, client: TestClient, test_db, test_patient):
+        """Test login sets both cookies and stores only the refresh token's HMAC"""
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"username": test_patient.username, "password": "password123"}
+        )
+        assert response.status_code == 200
+        refresh_token = response.json()["refresh_token"]
+        assert response.cookies.get("refresh_token") == refresh_token
+
+        set_cookies = response.headers.get_list("set-cookie")
+        access_cookie = next(c for c in set_cookies if c.startswith("access_token="))
+        refresh_cookie = next(c for c in set_cookies if c.startswith("refresh_token="))
+        assert f"Max-Age={settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60}" in access_cookie
+        assert f"Max-Age={settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60}" in refresh_cookie
+        assert "Path=/api/v1/auth" in refresh_cookie
+
+        stored = test_db.query(RefreshToken).one()
+        assert stored.user_id == test_patient.id
+        assert stored.token_hash == hash_refresh_token(refresh_token) != refresh_token
+
+    def test_refresh_rotates_without_password_check(self, client: TestClient, test_patient):
+        """Test refresh issues a new token pair without running bcrypt"""
+        refresh_token = login_refresh_token(client, test_patient.username)
+        before = client.get("/metrics").json()["password_pool"]["completed"]
+
+        response = refresh_with(client, refresh_token)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["refresh_token"] != refresh_token
+        assert data["user"]["username"] == test_patient.username
+        assert client.get("/metrics").json()["password_pool"]["completed"] == before
+        me = client.get("/api/v1/auth/me", headers={"Cookie": f"access_token={data['access_token']}"})
+        assert me.status_code == 200
+
+    def test_reused_refresh_token_revokes_family(self, client: TestClient, test_patient):
+        """Test replaying a rotated token revokes every token of that sign-in"""
+        first = login_refresh_token(client, test_patient.username)
+        second = refresh_with(client, first).json()["refresh_token"]
+
+        replayed = refresh_with(client, first)
+        assert replayed.status_code == 401
+        assert replayed.json()["detail"] == "Refresh token reuse detected"
+        assert refresh_with(client, second).status_code == 401
+
+    def test_logout_revokes_refresh_token(self, client: TestClient, test_patient):
+        """Test a logged out session cannot be renewed"""
+        refresh_token = login_refresh_token(client, test_patient.username)
+
+        response = client.post("/api/v1/auth/logout", headers={"Cookie": f"refresh_token={refresh_token}"})
+        assert response.status_code == 200
+
+        assert refresh_with(client, refresh_token).status_code == 401
+
+    def test_inactive_user_cannot_refresh(self, client: TestClient, test_db, test_patient):
+        """Test deactivated users are refused new access tokens"""
+        refresh_token = login_refresh_token(client, test_patient.username)
+        test_patient.is_active = False
+        test_db.commit()
+
+        response = refresh_with(client, refresh_token)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Inactive user"
+
+    def test_refresh_without_cookie(self, client: TestClient):
+        """Test refresh requires a refresh token"""
+        response = client.post("/api/v1/auth/refresh")
+        assert response.status_code == 401
+        assert refresh_with(client, "not-a-real-token").status_code == 401
+
+
+class TestTokenRevocation:
+    """Test access token revocation through the Bloom filter and revoked_tokens table"""
+
+    def test_logout_revokes_access_token(self, client: TestClient, patient_token, patient_headers):
+        """Test an access token stops working after logout even though it has not expired"""
+        assert client.get("/api/v1/appointments/my", headers=patient_headers).status_code == 200
+
+        client.post("/api/v1/auth/logout", headers=patient_headers)
+
+        for url in ["/api/v1/appointments/my", "/api/v1/auth/me"]:
+            response = client.get(url, headers=patient_headers)
+            assert response.status_code == 401
+            assert response.json()["detail"] == "Token has been revoked"
+
+    def test_unrevoked_tokens_skip_database(self, client: TestClient, test_db, patient_headers,
+                                            query_counter):
+        """Test a filter miss authenticates without a revocation query"""
+        revoke_token(test_db, "0" * 32, datetime.utcnow() + timedelta(minutes=5))
+        # Upcoming appointments only, so the list does not reach into the archive
+        url = f"/api/v1/appointments/my?from_date={date.today()}"
+        client.get(url, headers=patient_headers)
+        before = revocation_filter.stats()
+
+        with query_counter:
+            response = client.get(url, headers=patient_headers)
+
+        assert response.status_code == 200
+        assert revocation_filter.lookups == before["lookups"] + 1
+        assert revocation_filter.positives == before["positives"]
+        assert query_counter.count == 1  # the appointment list; the principal is cached
+
+    def test_filter_rebuilt_from_table(self, test_db):
+        """Test startup reloads unexpired revocations and purges expired ones"""
+        now = datetime.utcnow()
+        test_db.add_all([
+            RevokedToken(jti="a" * 32, expires_at=now + timedelta(minutes=10)),
+            RevokedToken(jti="b" * 32, expires_at=now - timedelta(minutes=10)),
+        ])
+        test_db.commit()
+
+        assert load_revocation_filter(test_db) == 1
+        assert "a" * 32 in revocation_filter
+        assert [row.jti for row in test_db.query(RevokedToken)] == ["a" * 32]
+
+
+class TestLoginRateLimit:
+    """Test the login/register rate limiter runs before bcrypt"""
+
+    def test_login_attempts_limited_per_username(self, client: TestClient, test_patient):
+        """Test guessing one user's password is cut off before the password is checked"""
+        for _ in range(settings.RATE_LIMIT_USERNAME_BURST):
+            response = client.post("/api/v1/auth/login",
+                                   json={"username": test_patient.username, "password": "wrong"})
+            assert response.status_code == 401
+        before = client.get("/metrics").json()
+
+        response = client.post("/api/v1/auth/login",
+                               json={"username": test_patient.username.upper(), "password": "password123"})
+
+        after = client.get("/metrics").json()
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+        assert after["password_pool"]["completed"] == before["password_pool"]["completed"]
+        assert after["rate_limiter"]["rejected_by_username"] == before["rate_limiter"]["rejected_by_username"] + 1
+
+    def test_register_limited_per_ip(self, client: TestClient, test_db):
+        """Test one client cannot force unlimited password hashing through registration"""
+        limiter = RateLimiter(MemoryBucketStore(max_keys=10), {"ip": BucketRule(1, 0.001)})
+        app.dependency_overrides[get_rate_limiter] = lambda: limiter
+        try:
+            responses = [
+                client.post("/api/v1/auth/register", json={
+                    "username": f"signup_{i}", "email": f"signup_{i}@example.com", "full_name": "Sign Up",
+                    "password": "password123", "role": "patient"
+                })
+                for i in range(2)
+            ]
+        finally:
+            app.dependency_overrides.pop(get_rate_limiter)
+
+        assert [response.status_code for response in responses] == [200, 429]
+        assert test_db.query(User).filter(User.username.like("signup_%")).count() == 1
+        assert limiter.stats()["rejected_by_ip"] == 1
+
+
+class TestPasswordRehash:
+    """Test hashes at an outdated bcrypt cost are upgraded after login in batches"""
+
+    @pytest.fixture(autouse=True)
+    def restore_bcrypt_rounds(self):
+        rounds = settings.BCRYPT_ROUNDS
+        yield
+        configure_bcrypt_rounds(rounds)
+
+    def test_login_queues_rehash_without_writing(self, client: TestClient, test_db, test_patient):
+        """Test login queues the upgraded hash and the batch flush writes it"""
+        old_hash = test_patient.hashed_password
+        configure_bcrypt_rounds(settings.BCRYPT_ROUNDS + 1)
+
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"username": test_patient.username, "password": "password123"}
+        )
+        assert response.status_code == 200
+        test_db.refresh(test_patient)
+        assert test_patient.hashed_password == old_hash
+        assert pending_rehashes[test_patient.id][0] == old_hash
+
+        assert flush_password_rehashes(test_db) == 1
+        test_db.refresh(test_patient)
+        assert test_patient.hashed_password.startswith("$2b$05$")
+        assert verify_password("password123", test_patient.hashed_password)
+        assert pending_rehashes == {}
+
+    def test_current_cost_not_rehashed(self, client: TestClient, test_patient):
+        """Test logins with a hash at the configured cost queue nothing"""
+        client.post("/api/v1/auth/login", json={"username": test_patient.username, "password": "password123"})
+        assert pending_rehashes == {}
+
+    def test_higher_cost_not_downgraded(self, client: TestClient, test_db, test_patient):
+        """Test a hash stronger than the configured cost is kept after login"""
+        test_patient.hashed_password = get_password_hash("password123", rounds=settings.BCRYPT_ROUNDS + 1)
+        test_db.commit()
+
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"username": test_patient.username, "password": "password123"}
+        )
+        assert response.status_code == 200
+        assert pending_rehashes == {}
+
+    def test_flush_skips_changed_hashes(self, test_db, test_patient):
+        """Test a queued rehash does not overwrite a hash changed since it was queued"""
+        current_hash = test_patient.hashed_password
+        queue_password_rehash(test_patient.id, "stale-hash", get_password_hash("other"))
+
+        flush_password_rehashes(test_db)
+        test_db.refresh(test_patient)
+        assert test_patient.hashed_password == current_hash
+
+
+class TestPasswordPool:
+    """Test bcrypt offloading to the bounded process pool"""
+
+    def test_hash_and_verify_in_workers(self):
+        """Test hashing and verification round-trip through worker processes"""
+        pool = PasswordPool(max_workers=1, max_pending=4)
+        try:
+            hashed = asyncio.run(pool.run(get_password_hash, "password123", settings.BCRYPT_ROUNDS))
+            assert asyncio.run(pool.run(verify_password, "password123", hashed)) is True
+            assert asyncio.run(pool.run(verify_password, "wrongpassword", hashed)) is False
+            assert pool.stats()["completed"] == 3
+            assert pool.stats()["pending"] == 0
+        finally:
+            pool.shutdown()
+
+    def test_rejects_beyond_queue_depth(self):
+        """Test operations past max_pending fail fast instead of queueing"""
+        pool = PasswordPool(max_workers=1, max_pending=1)
+
+        async def storm():
+            first = asyncio.ensure_future(pool.run(get_password_hash, "password123", settings.BCRYPT_ROUNDS))
+            await asyncio.sleep(0)  # let the first operation take the only slot
+            with pytest.raises(PoolSaturated):
+                await pool.run(get_password_hash, "password456", settings.BCRYPT_ROUNDS)
+            return await first
+
+        try:
+            assert asyncio.run(storm()).startswith("$2b$")
+            assert pool.stats()["rejected"] == 1
+        finally:
+            pool.shutdown()
+
+    def test_login_uses_pool(self, client: TestClient, test_patient):
+        """Test login verifies the password on the pool started with the app"""
+        before = client.get("/metrics").json()["password_pool"]["completed"]
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"username": test_patient.username, "password": "password123"}
+        )
+        assert response.status_code == 200
+        assert client.get("/metrics").json()["password_pool"]["completed"] == before + 1
+
+    def test_saturated_pool_returns_503(self, client: TestClient, test_patient):
+        """Test a saturated pool turns logins away with Retry-After"""
+        full_pool = PasswordPool(max_workers=1, max_pending=0)
+        app.dependency_overrides[get_password_pool] = lambda: full_pool
+        try:
+            response = client.post(
+                "/api/v1/auth/login",
+                json={"username": test_patient.username, "password": "password123"}
+            )
+        finally:
+            app.dependency_overrides.pop(get_password_pool)
+            full_pool.shutdown()
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    """Test the Bloom filter behind token revocation"""
+
+    def test_no_false_negatives(self):
+        """Test every added item is reported as present"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"token-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        assert all(item in bloom for item in items)
+        assert bloom.stats()["items"] == 1000
+
+    def test_false_positive_rate_near_target(self):
+        """Test unseen items are rarely reported present at full capacity"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"token-{i}")
+
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 10000 * 0.02
+
+    def test_clear(self):
+        """Test clearing empties the filter"""
+        bloom = BloomFilter(capacity=100)
+        bloom.add("token")
+        bloom.clear()
+
+        assert "token" not in bloom
+        assert bloom.stats()["items"] == 0
+
+    def test_concurrent_lookups_are_all_counted(self):
+        """Test lookups from many threads, as from the request threadpool, lose no counter updates"""
+        bloom = BloomFilter(capacity=100)
+        bloom.add("revoked")
+
+        def look_up(i):
+            return "revoked" in bloom and f"token-{i}" not in bloom
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(look_up, range(2000)))
+
+        stats = bloom.stats()
+        assert stats["lookups"] == 4000
+        assert stats["positives"] >= 2000
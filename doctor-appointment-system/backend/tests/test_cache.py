@@ -0,0 +1,62 @@
+import time
+
+from app.core.cache import LRUCache
+
+
+class TestLRUCache:
+    """Test the in-process LRU/TTL cache"""
+
+    def test_hits_and_misses(self):
+        """Test lookups are counted and falsy values are cached"""
+        cache = LRUCache(max_entries=10)
+        assert cache.get("a") is None
+        cache.set("a", 0)
+        assert cache.get("a") == 0
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_evicts_least_recently_used(self):
+        """Test the entry budget evicts the least recently used key"""
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+        assert len(cache) == 2
+
+    def test_entries_expire(self):
+        """Test entries past their TTL are dropped on lookup"""
+        cache = LRUCache(max_entries=10, ttl_seconds=60)
+        cache.set("short", 1, ttl_seconds=0.01)
+        cache.set("long", 2)
+        time.sleep(0.02)
+
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
+        assert cache.stats()["expirations"] == 1
+
+    def test_invalidation(self):
+        """Test single-key and predicate invalidation"""
+        cache = LRUCache(max_entries=10)
+        for key in [(1, "x"), (1, "y"), (2, "x")]:
+            cache.set(key, True)
+
+        assert cache.invalidate((2, "x")) is True
+        assert cache.invalidate((2, "x")) is False
+        assert cache.invalidate_where(lambda key: key[0] == 1) == 2
+        assert len(cache) == 0
+        assert cache.stats()["invalidations"] == 3
+
+    def test_zero_budget_disables_cache(self):
+        """Test a zero entry budget stores nothing"""
+        cache = LRUCache(max_entries=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
@@ -9,8 +9,16 @@ from app.crud.crud_schedule import (
     create_schedule, get_schedule, get_schedules_by_doctor,
     update_schedule, get_available_slots
 )
+from app.crud import crud_availability
+from app.crud.crud_availability import (
+    availability_cache, compute_free_slot_masks, extend_availability_horizons, get_free_slot_masks,
+    read_free_slot_masks
+)
+from app.crud.crud_schedule import count_schedule_conflicts, delete_schedule
 from app.schemas.schemas import UserCreate, AppointmentCreate, AppointmentUpdate, ScheduleCreate, ScheduleUpdate
-from app.models.models import UserRole, AppointmentStatus
+from app.models.models import (
+    Appointment, UserRole, AppointmentStatus, AvailabilityHorizon, Schedule, SlotAvailability, SlotState
+)
 
 
 class TestUserCRUD:
@@ -210,4 +218,182 @@ class TestScheduleCRUD:
 
         # No slots on other days
         non_tuesday_slots = [slot for slot in slots if slot.date.weekday() != 1]
-        assert len(non_tuesday_slots) == 0
\ No newline at end of file
+        assert len(non_tuesday_slots) == 0
+
+    def test_count_schedule_conflicts(self, test_db, test_doctor, test_patient, test_schedule):
+        """Test conflicts are counted in SQL by weekday, hours, status and date"""
+        tuesday = next_weekday(1)
+        rows = [
+            (tuesday, time(9, 0), AppointmentStatus.SCHEDULED),
+            (tuesday + timedelta(days=7), time(16, 30), AppointmentStatus.SCHEDULED),
+            (tuesday, time(10, 0), AppointmentStatus.CANCELLED),
+            (tuesday - timedelta(days=7), time(11, 0), AppointmentStatus.SCHEDULED),  # past
+            (tuesday + timedelta(days=1), time(11, 0), AppointmentStatus.SCHEDULED),  # Wednesday
+            (tuesday, time(17, 0), AppointmentStatus.SCHEDULED),  # after hours
+        ]
+        test_db.add_all([
+            Appointment(doctor_id=test_doctor.id, patient_id=test_patient.id, appointment_date=day,
+                        appointment_time=slot_time, reason="Conflict", status=status)
+            for day, slot_time, status in rows
+        ])
+        test_db.commit()
+
+        assert count_schedule_conflicts(test_db, test_schedule) == 2
+        assert count_schedule_conflicts(test_db, test_schedule, time(9, 0), time(16, 0)) == 1
+        assert count_schedule_conflicts(test_db, test_schedule, time(9, 0), time(17, 0)) == 0
+
+    def test_modify_split_shift_ignores_other_shift(self, test_db, test_doctor, test_patient, test_schedule):
+        """Test narrowing one shift does not count appointments in another shift that day"""
+        evening = Schedule(doctor_id=test_doctor.id, day_of_week=1, start_time=time(18, 0), end_time=time(20, 0))
+        test_db.add(evening)
+        test_db.add(Appointment(doctor_id=test_doctor.id, patient_id=test_patient.id,
+                                appointment_date=next_weekday(1), appointment_time=time(19, 0), reason="Evening"))
+        test_db.commit()
+
+        updated = update_schedule(test_db, test_schedule.id, ScheduleUpdate(end_time=time(12, 0)))
+        assert updated.end_time == time(12, 0)
+
+        with pytest.raises(ValueError, match="1 appointments would be affected"):
+            delete_schedule(test_db, evening.id)
+
+
+def next_weekday(day_of_week: int) -> date:
+    days_ahead = (day_of_week - date.today().weekday()) % 7 or 7
+    return date.today() + timedelta(days=days_ahead)
+
+
+class TestSlotAvailabilityCRUD:
+    """Test the materialized slot_availability read model"""
+
+    def test_create_schedule_materializes_horizon(self, test_db, test_doctor):
+        """Test creating a schedule writes slot rows for the whole horizon"""
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+
+        horizon = test_db.get(AvailabilityHorizon, test_doctor.id)
+        assert horizon.materialized_from == date.today()
+        assert horizon.materialized_through > date.today() + timedelta(days=30)
+
+        friday = next_weekday(4)
+        rows = test_db.query(SlotAvailability).filter(
+            SlotAvailability.doctor_id == test_doctor.id,
+            SlotAvailability.slot_date == friday
+        ).all()
+        assert len(rows) == 4
+        assert all(row.state == SlotState.FREE for row in rows)
+
+        start, end = date.today(), date.today() + timedelta(days=30)
+        assert read_free_slot_masks(test_db, test_doctor.id, start, end) == \
+            compute_free_slot_masks(test_db, test_doctor.id, start, end)
+
+    def test_booking_and_cancelling_flip_slot_state(self, test_db, test_doctor, test_patient):
+        """Test appointment writes keep the slot state in sync"""
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+        friday = next_weekday(4)
+
+        appointment = create_appointment(test_db, AppointmentCreate(
+            doctor_id=test_doctor.id, appointment_date=friday, appointment_time=time(8, 30), reason="Checkup"
+        ), test_patient.id)
+        slots = get_available_slots(test_db, test_doctor.id, friday, friday)
+        assert [slot.time for slot in slots] == [time(8, 0), time(9, 0), time(9, 30)]
+
+        # Rescheduling frees the old slot and books the new one
+        update_appointment(test_db, appointment.id, AppointmentUpdate(appointment_time=time(9, 0)))
+        slots = get_available_slots(test_db, test_doctor.id, friday, friday)
+        assert [slot.time for slot in slots] == [time(8, 0), time(8, 30), time(9, 30)]
+
+        update_appointment(test_db, appointment.id, AppointmentUpdate(status=AppointmentStatus.CANCELLED))
+        slots = get_available_slots(test_db, test_doctor.id, friday, friday)
+        assert len(slots) == 4
+
+    def test_schedule_changes_rewrite_affected_days(self, test_db, test_doctor):
+        """Test updating and deleting a schedule rewrites only its weekdays"""
+        friday_schedule = create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=2, start_time=time(8, 0), end_time=time(9, 0), slot_duration=30
+        ), test_doctor.id)
+        friday, wednesday = next_weekday(4), next_weekday(2)
+
+        update_schedule(test_db, friday_schedule.id, ScheduleUpdate(end_time=time(12, 0)))
+        assert len(get_available_slots(test_db, test_doctor.id, friday, friday)) == 8
+
+        delete_schedule(test_db, friday_schedule.id)
+        assert get_free_slot_masks(test_db, test_doctor.id, friday, friday) == []
+        assert len(get_available_slots(test_db, test_doctor.id, wednesday, wednesday)) == 2
+
+    def test_horizon_job_rolls_forward(self, test_db, test_doctor):
+        """Test the horizon job prunes past days and extends into new ones"""
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+        horizon = test_db.get(AvailabilityHorizon, test_doctor.id)
+        previous_through = horizon.materialized_through
+
+        later = date.today() + timedelta(days=10)
+        extend_availability_horizons(test_db, today=later)
+
+        assert horizon.materialized_from == later
+        assert horizon.materialized_through == previous_through + timedelta(days=10)
+        assert test_db.query(SlotAvailability).filter(SlotAvailability.slot_date < later).count() == 0
+        end = horizon.materialized_through
+        assert read_free_slot_masks(test_db, test_doctor.id, later, end) == \
+            compute_free_slot_masks(test_db, test_doctor.id, later, end)
+
+    def test_range_outside_horizon_is_computed(self, test_db, test_doctor, test_schedule):
+        """Test doctors without a materialized horizon fall back to schedule expansion"""
+        assert test_db.get(AvailabilityHorizon, test_doctor.id) is None
+        tuesday = next_weekday(1)
+        assert len(get_available_slots(test_db, test_doctor.id, tuesday, tuesday)) == 16
+
+    def test_cached_days_invalidated_by_writes(self, test_db, test_doctor, test_patient):
+        """Test booking and schedule edits drop exactly the affected cached days"""
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+        friday = next_weekday(4)
+        week_after = friday + timedelta(days=7)
+
+        get_free_slot_masks(test_db, test_doctor.id, friday, week_after)
+        hits = availability_cache.hits
+        get_free_slot_masks(test_db, test_doctor.id, friday, week_after)
+        assert availability_cache.hits == hits + 8
+
+        create_appointment(test_db, AppointmentCreate(
+            doctor_id=test_doctor.id, appointment_date=friday, appointment_time=time(8, 0), reason="Checkup"
+        ), test_patient.id)
+        assert availability_cache.get((test_doctor.id, friday)) is None
+        assert availability_cache.get((test_doctor.id, week_after)) is not None
+        assert len(get_available_slots(test_db, test_doctor.id, friday, friday)) == 3
+
+        schedule = get_schedules_by_doctor(test_db, test_doctor.id)[0]
+        update_schedule(test_db, schedule.id, ScheduleUpdate(start_time=time(7, 0)))
+        assert availability_cache.get((test_doctor.id, week_after)) is None
+        assert len(get_available_slots(test_db, test_doctor.id, week_after, week_after)) == 6
+
+    def test_load_racing_a_commit_is_not_cached(self, test_db, test_doctor, test_patient, monkeypatch):
+        """Test a mask loaded before a booking commits is served but not cached"""
+        create_schedule(test_db, ScheduleCreate(
+            day_of_week=4, start_time=time(8, 0), end_time=time(10, 0), slot_duration=30
+        ), test_doctor.id)
+        friday = next_weekday(4)
+        load_free_slot_masks = crud_availability.load_free_slot_masks
+
+        def load_then_book(db, doctor_id, start_date, end_date):
+            days = load_free_slot_masks(db, doctor_id, start_date, end_date)
+            create_appointment(test_db, AppointmentCreate(
+                doctor_id=test_doctor.id, appointment_date=friday, appointment_time=time(8, 0), reason="Checkup"
+            ), test_patient.id)
+            return days
+
+        monkeypatch.setattr(crud_availability, "load_free_slot_masks", load_then_book)
+        stale = get_free_slot_masks(test_db, test_doctor.id, friday, friday)
+        assert stale[0][1].bit_count() == 4
+        assert availability_cache.get((test_doctor.id, friday)) is None
+
+        monkeypatch.setattr(crud_availability, "load_free_slot_masks", load_free_slot_masks)
+        assert len(get_available_slots(test_db, test_doctor.id, friday, friday)) == 3
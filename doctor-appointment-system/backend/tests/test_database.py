@@ -0,0 +1,112 @@
+import os
+
+from sqlalchemy import create_engine, event, text
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.core.database import (
+    SQLITE_PROFILES, create_read_engine, sqlite_pragma_listener, sqlite_pragmas, to_read_only_url
+)
+from app.core.wal_checkpoint import WalCheckpointer
+
+
+def profile_engine(path, profile: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", sqlite_pragma_listener(sqlite_pragmas(profile)))
+    return engine
+
+
+def pragma(connection, name: str):
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+class TestSqliteProfiles:
+    """Test the SQLite PRAGMA profiles applied on connect"""
+
+    def test_wal_profile(self, tmp_path):
+        """Test the wal profile switches journal mode and tuning PRAGMAs on every connection"""
+        engine = profile_engine(tmp_path / "wal.db", "wal")
+        with engine.connect() as connection:
+            assert pragma(connection, "journal_mode") == "wal"
+            assert pragma(connection, "synchronous") == 1  # NORMAL
+            assert pragma(connection, "foreign_keys") == 1
+            assert pragma(connection, "busy_timeout") == SQLITE_PROFILES["wal"]["busy_timeout"]
+            assert pragma(connection, "temp_store") == 2  # MEMORY
+            assert pragma(connection, "cache_size") == SQLITE_PROFILES["wal"]["cache_size"]
+        engine.dispose()
+
+    def test_default_profile(self, tmp_path):
+        """Test the default profile keeps the rollback journal"""
+        engine = profile_engine(tmp_path / "default.db", "default")
+        with engine.connect() as connection:
+            assert pragma(connection, "journal_mode") == "delete"
+            assert pragma(connection, "foreign_keys") == 1
+        engine.dispose()
+
+    def test_settings_override_profile(self, monkeypatch):
+        """Test SQLITE_* settings take precedence over the profile"""
+        monkeypatch.setattr("app.core.database.settings.SQLITE_BUSY_TIMEOUT_MS", 250)
+        assert sqlite_pragmas("wal")["busy_timeout"] == 250
+        assert sqlite_pragmas("default")["busy_timeout"] == 250
+
+
+class TestReadEngine:
+    """Test the read-only engine behind get_read_db"""
+
+    def test_read_only_url(self):
+        """Test SQLite files are reopened read-only and other URLs are left alone"""
+        assert to_read_only_url("sqlite:////shared/appointments.db") == \
+            "sqlite:///file:/shared/appointments.db?mode=ro&uri=true"
+        assert to_read_only_url("sqlite://") == "sqlite://"
+        assert to_read_only_url("postgresql://user@db/app") == "postgresql://user@db/app"
+
+    def test_sqlite_reads_cannot_write(self, tmp_path):
+        """Test the read engine sees committed rows but refuses writes"""
+        url = f"sqlite:///{tmp_path / 'read.db'}"
+        writer = profile_engine(tmp_path / "read.db", "wal")
+        with writer.begin() as connection:
+            connection.execute(text("CREATE TABLE t (x INTEGER)"))
+            connection.execute(text("INSERT INTO t VALUES (1)"))
+
+        reader = create_read_engine(url, pool_size=2, max_overflow=0)
+        with reader.connect() as connection:
+            assert pragma(connection, "query_only") == 1
+            assert connection.execute(text("SELECT x FROM t")).scalar() == 1
+            with pytest.raises(OperationalError, match="readonly"):
+                connection.execute(text("INSERT INTO t VALUES (2)"))
+        assert reader.pool.size() == 2
+        reader.dispose()
+        writer.dispose()
+
+    def test_replica_url_and_in_memory(self, tmp_path):
+        """Test a replica URL takes precedence and in-memory databases share the primary engine"""
+        replica = create_read_engine("sqlite:///primary.db", replica_url=f"sqlite:///{tmp_path / 'replica.db'}")
+        assert replica.url.database == f"file:{tmp_path / 'replica.db'}"
+        replica.dispose()
+        assert create_read_engine("sqlite://") is None
+
+
+class TestWalCheckpointer:
+    """Test background WAL checkpoints"""
+
+    def test_passive_then_truncate(self, tmp_path):
+        """Test checkpoints copy the WAL back and truncate it once it grows past the limit"""
+        path = tmp_path / "checkpoint.db"
+        engine = profile_engine(path, "wal")
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE t (x INTEGER)"))
+            connection.execute(text("INSERT INTO t VALUES (1)"))
+
+        checkpointer = WalCheckpointer(engine, truncate_after_pages=1000)
+        checkpointer.run()
+        stats = checkpointer.stats()
+        assert stats["runs"] == 1
+        assert stats["truncations"] == 0
+        assert stats["last_checkpointed_pages"] == stats["last_wal_pages"] > 0
+
+        checkpointer.truncate_after_pages = 0
+        checkpointer.run()
+        assert checkpointer.stats()["truncations"] == 1
+        assert os.path.getsize(f"{path}-wal") == 0
+        engine.dispose()
@@ -1,6 +1,20 @@
+import threading
+import time as timer
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from unittest.mock import patch
+
 import pytest
 from fastapi.testclient import TestClient
 from datetime import date, time, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.core.database import Base, create_writer_engine
+from app.core.write_queue import GroupCommitQueue, get_write_queue
+from app.crud.crud_appointment import book_appointment, insert_booking
+from app.main import app
+from app.models.models import User, UserRole, Schedule, Appointment
+from app.schemas.schemas import AppointmentCreate
 
 
 class TestAppointmentBookingFlow:
@@ -211,6 +225,241 @@ class TestScheduleConflictScenarios:
         assert "appointments would be outside new hours" in response.json()["detail"]
 
 
+class TestConcurrentBooking:
+    """Test the atomic booking path under parallel requests"""
+
+    def test_parallel_bookings_for_one_slot(self, tmp_path):
+        """Test exactly one of many simultaneous bookings for a slot succeeds"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'concurrent.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30}
+        )
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = SessionLocal()
+        doctor = User(username="dr_race", email="dr.race@example.com", full_name="Dr. Race",
+                      hashed_password="x", role=UserRole.DOCTOR)
+        patients = [
+            User(username=f"race_{i}", email=f"race{i}@example.com", full_name=f"Racer {i}",
+                 hashed_password="x", role=UserRole.PATIENT)
+            for i in range(8)
+        ]
+        db.add_all([doctor] + patients)
+        db.commit()
+        db.add(Schedule(doctor_id=doctor.id, day_of_week=1, start_time=time(9, 0), end_time=time(17, 0)))
+        db.commit()
+        doctor_id, patient_ids = doctor.id, [p.id for p in patients]
+        db.close()
+
+        days_until_tuesday = (1 - date.today().weekday()) % 7 or 7
+        booking = AppointmentCreate(
+            doctor_id=doctor_id,
+            appointment_date=date.today() + timedelta(days=days_until_tuesday),
+            appointment_time=time(11, 0),
+            reason="Race"
+        )
+        barrier = threading.Barrier(len(patient_ids))
+
+        def book(patient_id):
+            session = SessionLocal()
+            try:
+                barrier.wait()
+                book_appointment(session, booking, patient_id)
+                return "booked"
+            except ValueError as e:
+                return str(e)
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=len(patient_ids)) as pool:
+            results = list(pool.map(book, patient_ids))
+
+        assert results.count("booked") == 1
+        assert all(r == "booked" or "not available" in r or "already booked" in r for r in results)
+
+        db = SessionLocal()
+        assert db.query(Appointment).filter(Appointment.doctor_id == doctor_id).count() == 1
+        db.close()
+        engine.dispose()
+
+
+class TestGroupCommitQueue:
+    """Test batching booking writes through the single-writer queue"""
+
+    def test_batched_bookings_resolve_individually(self, tmp_path):
+        """Test each queued booking gets its own outcome while batches share a commit"""
+        url = f"sqlite:///{tmp_path / 'queue.db'}"
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = SessionLocal()
+        doctor = User(username="dr_queue", email="dr.queue@example.com", full_name="Dr. Queue",
+                      hashed_password="x", role=UserRole.DOCTOR)
+        patient = User(username="queue_patient", email="queue@example.com", full_name="Queue Patient",
+                       hashed_password="x", role=UserRole.PATIENT)
+        db.add_all([doctor, patient])
+        db.commit()
+        db.add(Schedule(doctor_id=doctor.id, day_of_week=1, start_time=time(9, 0), end_time=time(17, 0)))
+        db.commit()
+        doctor_id, patient_id = doctor.id, patient.id
+        db.close()
+
+        days_until_tuesday = (1 - date.today().weekday()) % 7 or 7
+        tuesday = date.today() + timedelta(days=days_until_tuesday)
+        # Every slot is requested twice; the second request in a batch must fail alone
+        bookings = [
+            AppointmentCreate(doctor_id=doctor_id, appointment_date=tuesday,
+                              appointment_time=time(9 + i // 2, 0), reason="Queue")
+            for i in range(16)
+        ]
+
+        writer_engine = create_writer_engine(url)
+        write_queue = GroupCommitQueue(sessionmaker(bind=writer_engine, autoflush=False), max_delay=0.05)
+        write_queue.start()
+        try:
+            futures = [
+                write_queue.submit(lambda session, booking=booking: insert_booking(session, booking, patient_id).id)
+                for booking in bookings
+            ]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result(timeout=10))
+                except ValueError as e:
+                    outcomes.append(str(e))
+        finally:
+            write_queue.stop()
+            writer_engine.dispose()
+
+        booked = [outcome for outcome in outcomes if isinstance(outcome, int)]
+        assert len(booked) == 8
+        assert all(isinstance(outcomes[i], int) for i in range(0, 16, 2))
+        assert all("not available" in outcomes[i] for i in range(1, 16, 2))
+
+        stats = write_queue.stats()
+        assert stats["operations"] == 16
+        assert stats["failed"] == 8
+        assert stats["batches"] < 16
+
+        db = SessionLocal()
+        appointments = db.query(Appointment).filter(Appointment.doctor_id == doctor_id).all()
+        assert sorted(a.id for a in appointments) == sorted(booked)
+        assert len({a.appointment_time for a in appointments}) == 8
+        db.close()
+        engine.dispose()
+
+    def test_endpoints_use_write_queue(self, client: TestClient, test_db, test_schedule, patient_headers):
+        """Test booking and cancelling through the API when the write queue is enabled"""
+        writer_engine = create_writer_engine(str(test_db.get_bind().url))
+        write_queue = GroupCommitQueue(sessionmaker(bind=writer_engine, autoflush=False))
+        write_queue.start()
+        app.dependency_overrides[get_write_queue] = lambda: write_queue
+        try:
+            days_until_tuesday = (1 - date.today().weekday()) % 7 or 7
+            payload = {
+                "doctor_id": test_schedule.doctor_id,
+                "appointment_date": str(date.today() + timedelta(days=days_until_tuesday)),
+                "appointment_time": "14:00:00",
+                "reason": "Queued"
+            }
+            response = client.post("/api/v1/appointments/", json=payload, headers=patient_headers)
+            assert response.status_code == 200
+            appointment_id = response.json()["id"]
+            assert response.json()["status"] == "scheduled"
+
+            response = client.post("/api/v1/appointments/", json=payload, headers=patient_headers)
+            assert response.status_code == 400
+            assert "not available" in response.json()["detail"]
+
+            response = client.delete(f"/api/v1/appointments/{appointment_id}", headers=patient_headers)
+            assert response.status_code == 200
+            response = client.get(f"/api/v1/appointments/{appointment_id}", headers=patient_headers)
+            assert response.json()["status"] == "cancelled"
+            assert write_queue.stats()["operations"] == 3
+        finally:
+            write_queue.stop()
+            writer_engine.dispose()
+
+    def test_timed_out_write_is_cancelled(self, tmp_path):
+        """Test an operation still queued at the timeout never runs"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+        write_queue = GroupCommitQueue(sessionmaker(bind=engine))
+        ran = []
+
+        # The writer is not started yet, so the operation is still queued when the wait ends
+        with pytest.raises(FutureTimeoutError):
+            write_queue.run(lambda session: ran.append("late"), timeout=0.05)
+        write_queue.start()
+        try:
+            assert write_queue.run(lambda session: ran.append("next") or "done", timeout=5) == "done"
+        finally:
+            write_queue.stop()
+            engine.dispose()
+
+        assert ran == ["next"]
+        assert write_queue.stats()["cancelled"] == 1
+
+    def test_running_write_reports_its_outcome(self, tmp_path):
+        """Test an operation already running at the timeout is waited for rather than abandoned"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+        write_queue = GroupCommitQueue(sessionmaker(bind=engine))
+        write_queue.start()
+        try:
+            def slow(session):
+                timer.sleep(0.2)
+                return "committed"
+
+            assert write_queue.run(slow, timeout=0.05) == "committed"
+        finally:
+            write_queue.stop()
+            engine.dispose()
+        assert write_queue.stats()["cancelled"] == 0
+
+    def test_endpoint_timeout_leaves_no_booking(self, client: TestClient, test_db, test_schedule, patient_headers,
+                                                monkeypatch):
+        """Test a 503 from a busy queue means the booking was not made"""
+        writer_engine = create_writer_engine(str(test_db.get_bind().url))
+        write_queue = GroupCommitQueue(sessionmaker(bind=writer_engine, autoflush=False))
+        app.dependency_overrides[get_write_queue] = lambda: write_queue
+        monkeypatch.setattr(settings, "WRITE_QUEUE_TIMEOUT_SECONDS", 0.05)
+        try:
+            days_until_tuesday = (1 - date.today().weekday()) % 7 or 7
+            response = client.post("/api/v1/appointments/", json={
+                "doctor_id": test_schedule.doctor_id,
+                "appointment_date": str(date.today() + timedelta(days=days_until_tuesday)),
+                "appointment_time": "14:00:00",
+                "reason": "Queued"
+            }, headers=patient_headers)
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+
+            # Draining the queue afterwards must not commit the abandoned booking
+            write_queue.start()
+            write_queue.run(lambda session: None, timeout=5)
+        finally:
+            write_queue.stop()
+            writer_engine.dispose()
+        assert test_db.query(Appointment).count() == 0
+
+    def test_queued_write_on_missing_appointment(self, client: TestClient, test_db, test_appointment,
+                                                 doctor_headers):
+        """Test a queued update that finds no appointment answers 404 instead of failing"""
+        writer_engine = create_writer_engine(str(test_db.get_bind().url))
+        write_queue = GroupCommitQueue(sessionmaker(bind=writer_engine, autoflush=False))
+        write_queue.start()
+        app.dependency_overrides[get_write_queue] = lambda: write_queue
+        try:
+            with patch("app.api.v1.appointments.apply_appointment_update", return_value=None):
+                response = client.put(f"/api/v1/appointments/{test_appointment.id}",
+                                      json={"reason": "Moved"}, headers=doctor_headers)
+            assert response.status_code == 404
+        finally:
+            write_queue.stop()
+            writer_engine.dispose()
+
+
 class TestErrorHandling:
     """Test error handling and edge cases"""
 
@@ -0,0 +1,113 @@
+from datetime import date, time
+
+from sqlalchemy import MetaData, UniqueConstraint, create_engine, inspect, text
+
+from app.core.database import Base
+from app.migrations.runner import MIGRATIONS, run_migrations
+
+
+class TestMigrations:
+    """Test the versioned schema migrations"""
+
+    def test_upgrade_existing_database(self, tmp_path):
+        """Test migrations add the hot-filter indexes to a database created before them"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            for name in ["ix_appointments_doctor_status_date", "ix_appointments_patient_date",
+                         "ix_appointments_status_date", "ix_schedules_doctor_day_active", "ix_users_role"]:
+                connection.execute(text(f"DROP INDEX {name}"))
+
+        assert run_migrations(engine) == [1, 2, 3, 4, 5, 6]
+
+        inspector = inspect(engine)
+        appointment_indexes = {index["name"] for index in inspector.get_indexes("appointments")}
+        assert {"ix_appointments_doctor_status_date", "ix_appointments_patient_date",
+                "ix_appointments_status_date"} <= appointment_indexes
+        assert "ix_schedules_doctor_day_active" in {index["name"] for index in inspector.get_indexes("schedules")}
+        assert "ix_users_role" in {index["name"] for index in inspector.get_indexes("users")}
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT version FROM schema_version")).scalars().all() == \
+                [1, 2, 3, 4, 5, 6]
+        engine.dispose()
+
+    def test_upgrade_replaces_slot_constraint(self, tmp_path):
+        """Test the SQLite table rebuild keeps rows and lets a cancelled slot be booked again"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'slot.db'}")
+        legacy = MetaData()
+        for table in Base.metadata.sorted_tables:
+            table.to_metadata(legacy)
+        appointments = legacy.tables["appointments"]
+        appointments.indexes.discard(
+            next(index for index in appointments.indexes if index.name == "unique_doctor_active_appointment_slot"))
+        # The copy loses the PostgreSQL-only guard on the exclusion constraint
+        appointments.constraints.discard(
+            next(constraint for constraint in appointments.constraints
+                 if constraint.name == "ex_appointments_doctor_overlap"))
+        appointments.append_constraint(UniqueConstraint(
+            "doctor_id", "appointment_date", "appointment_time", name="unique_doctor_appointment_slot"))
+        legacy.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (id, username, email, full_name, hashed_password, role, is_active) "
+                "VALUES (1, 'doc', 'doc@example.com', 'Doc', 'x', 'DOCTOR', 1)"))
+            connection.execute(appointments.insert().values(
+                id=7, doctor_id=1, patient_id=1, appointment_date=date(2030, 1, 1),
+                appointment_time=time(10, 0), duration=30, reason="Checkup", status="CANCELLED"))
+
+        assert [c["name"] for c in inspect(engine).get_unique_constraints("appointments")] == \
+            ["unique_doctor_appointment_slot"]
+        assert 4 in run_migrations(engine)
+
+        inspector = inspect(engine)
+        assert inspector.get_unique_constraints("appointments") == []
+        assert "unique_doctor_active_appointment_slot" in {index["name"] for index in inspector.get_indexes("appointments")}
+        with engine.begin() as connection:
+            assert connection.execute(text("SELECT id, status FROM appointments")).all() == [(7, "CANCELLED")]
+            connection.execute(text(
+                "INSERT INTO appointments (doctor_id, patient_id, appointment_date, appointment_time, reason, status) "
+                "VALUES (1, 1, '2030-01-01', '10:00:00.000000', 'Rebooked', 'SCHEDULED')"))
+        engine.dispose()
+
+    def test_upgrade_makes_appointment_ids_autoincrement(self, tmp_path):
+        """Test the rebuilt table keeps rows and starts ids after those already moved to the archive"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'ids.db'}")
+        legacy = MetaData()
+        for table in Base.metadata.sorted_tables:
+            table.to_metadata(legacy)
+        appointments = legacy.tables["appointments"]
+        appointments.dialect_options["sqlite"]["autoincrement"] = False
+        appointments.constraints.discard(
+            next(constraint for constraint in appointments.constraints
+                 if constraint.name == "ex_appointments_doctor_overlap"))
+        legacy.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO users (id, username, email, full_name, hashed_password, role, is_active) "
+                "VALUES (1, 'doc', 'doc@example.com', 'Doc', 'x', 'DOCTOR', 1)"))
+            for table_name, appointment_id in [("appointments", 3), ("appointments_archive", 9)]:
+                connection.execute(legacy.tables[table_name].insert().values(
+                    id=appointment_id, doctor_id=1, patient_id=1, appointment_date=date(2020, 1, 1),
+                    appointment_time=time(10, 0), duration=30, reason="Checkup", status="COMPLETED"))
+        table_sql = text("SELECT sql FROM sqlite_master WHERE name = 'appointments'")
+        with engine.connect() as connection:
+            assert "AUTOINCREMENT" not in connection.execute(table_sql).scalar()
+
+        assert 6 in run_migrations(engine)
+        with engine.begin() as connection:
+            assert "AUTOINCREMENT" in connection.execute(table_sql).scalar()
+            assert connection.execute(text("SELECT id FROM appointments")).scalars().all() == [3]
+            connection.execute(text(
+                "INSERT INTO appointments (doctor_id, patient_id, appointment_date, appointment_time, reason, status) "
+                "VALUES (1, 1, '2030-01-01', '10:00:00.000000', 'New', 'SCHEDULED')"))
+            assert connection.execute(text("SELECT max(id) FROM appointments")).scalar() == 10
+        engine.dispose()
+
+    def test_migrations_are_applied_once(self, tmp_path):
+        """Test a second run on an up-to-date database does nothing"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        Base.metadata.create_all(bind=engine)
+
+        assert len(run_migrations(engine)) == len(MIGRATIONS)
+        assert run_migrations(engine) == []
+        engine.dispose()
@@ -121,6 +121,28 @@ class TestModels:
             test_db.commit()
         test_db.rollback()
 
+    def test_appointment_unique_ignores_cancelled(self, test_db, test_appointment, test_patient):
+        """Test a cancelled appointment does not hold its slot"""
+        test_appointment.status = AppointmentStatus.CANCELLED
+        test_db.commit()
+
+        rebooked = Appointment(
+            doctor_id=test_appointment.doctor_id,
+            patient_id=test_patient.id,
+            appointment_date=test_appointment.appointment_date,
+            appointment_time=test_appointment.appointment_time,
+            duration=30,
+            reason="Rebooked appointment"
+        )
+        test_db.add(rebooked)
+        test_db.commit()
+
+        # Reinstating the cancelled appointment would double-book the slot
+        test_appointment.status = AppointmentStatus.SCHEDULED
+        with pytest.raises(IntegrityError):
+            test_db.commit()
+        test_db.rollback()
+
     def test_appointment_status_enum(self, test_db, test_appointment):
         """Test appointment status enum values"""
         # Valid status changes
@@ -0,0 +1,238 @@
+import asyncio
+import importlib
+import inspect
+import pkgutil
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.crud
+from app.core.database import create_async_database_engine
+from app.crud import (
+    crud_appointment, crud_appointment_async, crud_availability, crud_refresh_token, crud_revoked_token,
+    crud_revoked_token_async, crud_schedule, crud_user, crud_user_async
+)
+from app.models.models import AppointmentStatus, SlotState, UserRole
+from app.schemas.schemas import AppointmentCreate, AppointmentUpdate, ScheduleCreate, ScheduleUpdate, UserCreate
+
+# "SCAN appointments" is a full table scan; "SCAN ... USING INDEX" and "SEARCH" are not
+TABLE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)\w+( AS \w+)?$")
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT")
+
+
+@contextmanager
+def recorded_statements():
+    """Collect the statements and parameters executed on any engine, async ones included"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINABLE):
+            # An executemany statement has one plan; explain it with its first parameter set
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+def table_scans(db, statements):
+    scans = []
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith("INSERT") and "SELECT" not in statement.upper():
+            continue
+        plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        scans += [(detail, statement) for *_, detail in plan if TABLE_SCAN.match(detail)]
+    return scans
+
+
+def next_tuesday() -> date:
+    return date.today() + timedelta(days=(1 - date.today().weekday()) % 7 or 7)
+
+
+def delete_booked_schedule(db, schedule_id: int) -> None:
+    with pytest.raises(ValueError, match="appointments would be affected"):
+        crud_schedule.delete_schedule(db, schedule_id)
+
+
+def flush_patient_rehash(db, patient) -> None:
+    crud_user.queue_password_rehash(patient.id, patient.hashed_password, "rehashed")
+    assert crud_user.flush_password_rehashes(db) == 1
+
+
+def run_async(db, call):
+    """Run an async CRUD call on an aiosqlite session over the test database"""
+    url = db.get_bind().url.set(drivername="sqlite+aiosqlite").render_as_string()
+
+    async def run():
+        engine = create_async_database_engine(url)
+        try:
+            async with AsyncSession(engine) as async_db:
+                return await call(async_db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def crud_function_names() -> set:
+    """Public functions defined in app.crud modules; async twins are suffixed with _async"""
+    names = set()
+    for module_info in pkgutil.iter_modules(app.crud.__path__):
+        module = importlib.import_module(f"app.crud.{module_info.name}")
+        suffix = "_async" if module_info.name.endswith("_async") else ""
+        names.update(
+            name + suffix for name, function in vars(module).items()
+            if inspect.isfunction(function) and function.__module__ == module.__name__ and not name.startswith("_")
+        )
+    return names
+
+
+# Public helpers that only build statements or handle results and never execute a query themselves
+QUERY_FREE = {
+    "with_participants", "appointment_by_id", "filter_appointments", "archive_horizon", "reaches_archive",
+    "list_models", "list_statements", "row_statements", "appointment_rows", "merge_pages",
+    "doctor_rows_statement", "queue_password_rehash", "availability_generation", "invalidate_availability",
+}
+
+
+CRUD_CALLS = {
+    "create_user": lambda db, ctx: crud_user.create_user(db, UserCreate(
+        username="plan_user", email="plan@example.com", full_name="Plan User", password="password123",
+        role=UserRole.PATIENT
+    )),
+    "get_user_by_username": lambda db, ctx: crud_user.get_user_by_username(db, "dr_test"),
+    "get_user_by_id": lambda db, ctx: crud_user.get_user_by_id(db, ctx["doctor"].id),
+    "get_users_by_role": lambda db, ctx: crud_user.get_users_by_role(db, UserRole.PATIENT),
+    "get_all_doctors": lambda db, ctx: crud_user.get_all_doctors(db),
+    "get_doctor_rows": lambda db, ctx: crud_user.get_doctor_rows(db),
+    "flush_password_rehashes": lambda db, ctx: flush_patient_rehash(db, ctx["patient"]),
+    "get_user_by_username_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_user_async.get_user_by_username(async_db, "dr_test")),
+    "get_user_by_id_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_user_async.get_user_by_id(async_db, ctx["doctor"].id)),
+    "get_doctor_rows_async": lambda db, ctx: run_async(db, crud_user_async.get_doctor_rows),
+    "get_refresh_token": lambda db, ctx: crud_refresh_token.get_refresh_token(
+        db, crud_refresh_token.issue_refresh_token(db, ctx["patient"].id)),
+    "issue_refresh_token": lambda db, ctx: crud_refresh_token.issue_refresh_token(db, ctx["patient"].id),
+    "rotate_refresh_token": lambda db, ctx: crud_refresh_token.rotate_refresh_token(
+        db, crud_refresh_token.issue_refresh_token(db, ctx["patient"].id)),
+    "revoke_refresh_token": lambda db, ctx: crud_refresh_token.revoke_refresh_token(
+        db, crud_refresh_token.issue_refresh_token(db, ctx["patient"].id)),
+    "revoke_refresh_token_family": lambda db, ctx: crud_refresh_token.revoke_refresh_token_family(db, "f" * 32),
+    "create_appointment": lambda db, ctx: crud_appointment.create_appointment(db, AppointmentCreate(
+        doctor_id=ctx["doctor"].id, appointment_date=next_tuesday(), appointment_time=time(11, 0), reason="Plan"
+    ), ctx["patient"].id),
+    "book_appointment": lambda db, ctx: crud_appointment.book_appointment(db, AppointmentCreate(
+        doctor_id=ctx["doctor"].id, appointment_date=next_tuesday(), appointment_time=time(12, 0), reason="Plan"
+    ), ctx["patient"].id),
+    "insert_booking": lambda db, ctx: crud_appointment.insert_booking(db, AppointmentCreate(
+        doctor_id=ctx["doctor"].id, appointment_date=next_tuesday(), appointment_time=time(12, 30), reason="Plan"
+    ), ctx["patient"].id),
+    "revoke_token": lambda db, ctx: crud_revoked_token.revoke_token(
+        db, "f" * 32, datetime.utcnow() + timedelta(minutes=5)),
+    "load_revocation_filter": lambda db, ctx: crud_revoked_token.load_revocation_filter(db),
+    "get_revoked_token": lambda db, ctx: crud_revoked_token.get_revoked_token(db, "f" * 32),
+    "get_revoked_token_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_revoked_token_async.get_revoked_token(async_db, "f" * 32)),
+    "get_appointment": lambda db, ctx: crud_appointment.get_appointment(db, ctx["appointment"].id),
+    "get_appointments_by_patient": lambda db, ctx: crud_appointment.get_appointments_by_patient(
+        db, ctx["patient"].id),
+    "get_appointments_by_doctor": lambda db, ctx: crud_appointment.get_appointments_by_doctor(
+        db, ctx["doctor"].id),
+    "get_appointment_rows_by_patient": lambda db, ctx: crud_appointment.get_appointment_rows_by_patient(
+        db, ctx["patient"].id),
+    "get_appointment_rows_by_doctor": lambda db, ctx: crud_appointment.get_appointment_rows_by_doctor(
+        db, ctx["doctor"].id),
+    "find_appointment": lambda db, ctx: crud_appointment.find_appointment(db, ctx["appointment"].id + 1),
+    "find_appointment_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_appointment_async.find_appointment(async_db, ctx["appointment"].id + 1)),
+    "get_appointment_rows_by_patient_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_appointment_async.get_appointment_rows_by_patient(async_db, ctx["patient"].id)),
+    "get_appointment_rows_by_doctor_async": lambda db, ctx: run_async(
+        db, lambda async_db: crud_appointment_async.get_appointment_rows_by_doctor(async_db, ctx["doctor"].id)),
+    "archive_appointments": lambda db, ctx: crud_appointment.archive_appointments(
+        db, next_tuesday() + timedelta(days=1)),
+    "load_archived_through": lambda db, ctx: crud_appointment.load_archived_through(db),
+    "apply_appointment_update": lambda db, ctx: crud_appointment.apply_appointment_update(
+        db, ctx["appointment"].id, AppointmentUpdate(appointment_time=time(13, 30))),
+    "update_appointment": lambda db, ctx: crud_appointment.update_appointment(
+        db, ctx["appointment"].id, AppointmentUpdate(appointment_time=time(13, 0))),
+    "cancel_appointment": lambda db, ctx: crud_appointment.update_appointment(
+        db, ctx["appointment"].id, AppointmentUpdate(status=AppointmentStatus.CANCELLED)),
+    "delete_appointment": lambda db, ctx: crud_appointment.delete_appointment(db, ctx["appointment"].id),
+    "check_slot_availability": lambda db, ctx: crud_appointment.check_slot_availability(
+        db, ctx["doctor"].id, next_tuesday(), time(14, 0), exclude_appointment_id=ctx["appointment"].id),
+    "create_schedule": lambda db, ctx: crud_schedule.create_schedule(db, ScheduleCreate(
+        day_of_week=3, start_time=time(9, 0), end_time=time(12, 0), slot_duration=30
+    ), ctx["doctor"].id),
+    "get_schedule": lambda db, ctx: crud_schedule.get_schedule(db, ctx["schedule"].id),
+    "get_schedules_by_doctor": lambda db, ctx: crud_schedule.get_schedules_by_doctor(db, ctx["doctor"].id),
+    "count_schedule_conflicts": lambda db, ctx: crud_schedule.count_schedule_conflicts(
+        db, ctx["schedule"], time(9, 0), time(10, 0)),
+    "update_schedule": lambda db, ctx: crud_schedule.update_schedule(
+        db, ctx["schedule"].id, ScheduleUpdate(end_time=time(18, 0))),
+    "delete_schedule": lambda db, ctx: delete_booked_schedule(db, ctx["schedule"].id),
+    "get_available_slots": lambda db, ctx: crud_schedule.get_available_slots(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29)),
+    "compile_doctor_schedule": lambda db, ctx: crud_availability.compile_doctor_schedule(db, ctx["doctor"].id),
+    "get_booked_slots": lambda db, ctx: crud_availability.get_booked_slots(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29)),
+    "compute_free_slot_masks": lambda db, ctx: crud_availability.compute_free_slot_masks(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29)),
+    "read_free_slot_masks": lambda db, ctx: crud_availability.read_free_slot_masks(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29)),
+    "load_free_slot_masks": lambda db, ctx: crud_availability.load_free_slot_masks(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=120)),
+    "get_free_slot_masks": lambda db, ctx: crud_availability.get_free_slot_masks(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29)),
+    "iter_free_slot_masks": lambda db, ctx: list(crud_availability.iter_free_slot_masks(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=29))),
+    "materialize_days": lambda db, ctx: crud_availability.materialize_days(
+        db, ctx["doctor"].id, date.today(), date.today() + timedelta(days=13), weekdays={1}),
+    "extend_doctor_horizon": lambda db, ctx: crud_availability.extend_doctor_horizon(db, ctx["doctor"].id),
+    "refresh_schedule_availability": lambda db, ctx: crud_availability.refresh_schedule_availability(
+        db, ctx["doctor"].id, {1}),
+    "extend_availability_horizons": lambda db, ctx: crud_availability.extend_availability_horizons(db),
+    "set_slot_state": lambda db, ctx: crud_availability.set_slot_state(
+        db, ctx["doctor"].id, next_tuesday(), time(15, 0), SlotState.BOOKED),
+    "find_next_available_slots": lambda db, ctx: crud_availability.find_next_available_slots(
+        db, 5, doctor_ids=[ctx["doctor"].id]),
+}
+
+# The rolling horizon job visits every doctor's horizon row (one per doctor) by design
+EXPECTED_SCANS = {
+    "extend_availability_horizons": {"SCAN availability_horizons"},
+}
+
+
+class TestQueryPlans:
+    """Test every CRUD query is served by an index rather than a table scan"""
+
+    @pytest.mark.parametrize("name", sorted(CRUD_CALLS))
+    def test_crud_queries_use_indexes(self, name, test_db, test_doctor, test_patient, test_schedule,
+                                      test_appointment):
+        """Test the query plans of a CRUD function contain no full table scans"""
+        ctx = {"doctor": test_doctor, "patient": test_patient, "schedule": test_schedule,
+               "appointment": test_appointment}
+        crud_availability.extend_doctor_horizon(test_db, test_doctor.id)
+        test_db.commit()
+
+        with recorded_statements() as statements:
+            CRUD_CALLS[name](test_db, ctx)
+
+        assert statements
+        expected = EXPECTED_SCANS.get(name, set())
+        assert [(detail, statement) for detail, statement in table_scans(test_db, statements)
+                if detail not in expected] == []
+
+    def test_every_crud_query_is_checked(self):
+        """Test every public CRUD function has its plans checked or is declared query-free"""
+        assert crud_function_names() - QUERY_FREE - set(CRUD_CALLS) == set()
+        assert QUERY_FREE <= crud_function_names()
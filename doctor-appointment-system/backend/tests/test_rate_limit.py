@@ -0,0 +1,100 @@
+from starlette.requests import Request
+
+from app.core.rate_limit import (
+    BucketRule, MemoryBucketStore, RateLimiter, SQLiteBucketStore, client_ip, parse_networks, take_token
+)
+
+RULE = BucketRule(capacity=2, refill_per_second=0.5)
+
+PROXIES = parse_networks(["172.28.0.10", "10.0.0.0/8"])
+
+
+def make_request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+class TestRateLimiter:
+    """Test the token-bucket limiter and its stores"""
+
+    def test_take_token_refills_over_time(self):
+        """Test a bucket empties, reports the wait, and refills at its rate"""
+        tokens, wait = take_token(1, 0, RULE, 0)
+        assert (tokens, wait) == (0, 0)
+        tokens, wait = take_token(tokens, 0, RULE, 0)
+        assert wait == 2.0
+        assert take_token(tokens, 0, RULE, 2.0) == (0, 0)
+        assert take_token(0, 0, RULE, 100) == (RULE.capacity - 1, 0)
+
+    def test_rejects_when_any_scope_is_empty(self):
+        """Test a username bucket limits attempts across different IPs"""
+        limiter = RateLimiter(MemoryBucketStore(max_keys=100), {"ip": BucketRule(10, 1), "username": RULE})
+
+        assert limiter.check(ip="1.1.1.1", username="alice") == 0
+        assert limiter.check(ip="2.2.2.2", username="alice") == 0
+        assert limiter.check(ip="3.3.3.3", username="alice") > 0
+        assert limiter.check(ip="3.3.3.3", username="bob") == 0
+
+        assert limiter.stats() == {"allowed": 3, "rejected": 1, "rejected_by_ip": 0, "rejected_by_username": 1}
+
+    def test_rejected_call_spends_no_token(self):
+        """Test attempts refused by the username bucket leave the IP bucket untouched"""
+        limiter = RateLimiter(MemoryBucketStore(max_keys=100), {"ip": BucketRule(3, 0.001), "username": RULE})
+
+        assert limiter.check(ip="1.1.1.1", username="alice") == 0
+        assert limiter.check(ip="1.1.1.1", username="alice") == 0
+        for _ in range(5):
+            assert limiter.check(ip="1.1.1.1", username="alice") > 0
+        assert limiter.check(ip="1.1.1.1", username="bob") == 0
+        assert limiter.check(ip="1.1.1.1", username="carol") > 0
+
+        assert limiter.stats()["rejected_by_ip"] == 1
+
+    def test_sqlite_store_takes_all_or_nothing(self, tmp_path):
+        """Test the shared store charges no bucket when one of them is empty"""
+        store = SQLiteBucketStore(str(tmp_path / "rate_limit.db"))
+        try:
+            assert store.take("username:alice", RULE, 0) == 0
+            assert store.take("username:alice", RULE, 0) == 0
+            waits = store.take_all([("ip:1.1.1.1", RULE), ("username:alice", RULE)], 0)
+            assert waits == [0, 2.0]
+            assert store.take_all([("ip:1.1.1.1", RULE), ("ip:1.1.1.1-other", RULE)], 0) == [0, 0]
+            assert store.take("ip:1.1.1.1", RULE, 0) == 0
+            assert store.take("ip:1.1.1.1", RULE, 0) == 2.0
+        finally:
+            store.close()
+
+    def test_client_ip_trusts_forwarded_only_from_proxies(self):
+        """Test X-Forwarded-For names the client only when a trusted proxy sent it"""
+        assert client_ip(make_request("203.0.113.7", "198.51.100.1"), PROXIES) == "203.0.113.7"
+        assert client_ip(make_request("172.28.0.10", "198.51.100.1"), PROXIES) == "198.51.100.1"
+        # Entries left of the first untrusted hop were written by the client
+        assert client_ip(make_request("172.28.0.10", "1.2.3.4, 198.51.100.1, 10.0.0.3"), PROXIES) == "198.51.100.1"
+        assert client_ip(make_request("testclient", "198.51.100.1"), PROXIES) == "testclient"
+
+    def test_client_ip_exempts_proxy_without_forwarded(self):
+        """Test a trusted proxy that forwards no address skips the IP rule"""
+        assert client_ip(make_request("172.28.0.10"), PROXIES) is None
+        assert client_ip(make_request("172.28.0.10", "10.0.0.3"), PROXIES) == "10.0.0.3"
+        assert client_ip(make_request("203.0.113.7"), PROXIES) == "203.0.113.7"
+
+    def test_memory_store_bounds_keys(self):
+        """Test the in-memory store keeps only the most recently used buckets"""
+        store = MemoryBucketStore(max_keys=2)
+        for key in ["a", "b", "c"]:
+            store.take(key, RULE, 0)
+        assert len(store) == 2
+
+    def test_sqlite_store_shared_between_workers(self, tmp_path):
+        """Test two stores on one file draw from the same buckets"""
+        path = str(tmp_path / "rate_limit.db")
+        first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+        try:
+            assert first.take("username:alice", RULE, 0) == 0
+            assert second.take("username:alice", RULE, 0) == 0
+            assert first.take("username:alice", RULE, 0) == 2.0
+            assert second.take("username:alice", RULE, 2.0) == 0
+            assert len(first) == 1
+        finally:
+            first.close()
+            second.close()
@@ -1,6 +1,14 @@
+import base64
+import json
 import pytest
 from fastapi.testclient import TestClient
 from datetime import date, time, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, create_read_engine, get_read_db
+from app.crud.crud_availability import availability_cache
+from app.main import app
+from app.models.models import User, UserRole, Schedule
 
 
 class TestSchedules:
@@ -148,6 +156,190 @@ class TestSchedules:
         times = [slot["time"] for slot in data]
         assert "10:00:00" not in times
 
+    def test_get_available_slots_split_shift(self, client: TestClient, doctor_headers, test_doctor, test_schedule):
+        """Test available slots for a doctor with two shifts on the same day"""
+        response = client.post(
+            "/api/v1/schedules/",
+            json={
+                "day_of_week": 1,  # Tuesday evening shift
+                "start_time": "18:00:00",
+                "end_time": "19:00:00",
+                "slot_duration": 20
+            },
+            headers=doctor_headers
+        )
+        assert response.status_code == 200
+
+        today = date.today()
+        days_until_tuesday = (1 - today.weekday()) % 7 or 7
+        next_tuesday = today + timedelta(days=days_until_tuesday)
+
+        response = client.get(
+            f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots",
+            params={"start_date": str(next_tuesday), "end_date": str(next_tuesday)}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 19
+        assert [slot["time"] for slot in data[-3:]] == ["18:00:00", "18:20:00", "18:40:00"]
+        assert all(slot["doctor_id"] == test_doctor.id for slot in data)
+
+    def test_available_slots_cache_metrics(self, client: TestClient, test_doctor, test_schedule):
+        """Test repeated availability requests are served from the cache and reported in metrics"""
+        today = date.today()
+        params = {"start_date": str(today), "end_date": str(today + timedelta(days=6))}
+
+        first = client.get(f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots", params=params)
+        before = client.get("/metrics").json()["availability_cache"]
+        second = client.get(f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots", params=params)
+        after = client.get("/metrics").json()["availability_cache"]
+
+        assert first.json() == second.json()
+        assert after["hits"] == before["hits"] + 7
+        assert after["misses"] == before["misses"]
+
+    def test_available_slots_ignore_lagging_replica(self, client: TestClient, test_doctor, test_schedule,
+                                                    tmp_path):
+        """Test availability is read from the primary, so a stale replica never fills the cache"""
+        replica_path = tmp_path / "replica.db"
+        writer = create_engine(f"sqlite:///{replica_path}")
+        Base.metadata.create_all(bind=writer)
+        writer.dispose()
+        replica = create_read_engine(replica_url=f"sqlite:///{replica_path}")
+        ReplicaSession = sessionmaker(bind=replica)
+
+        def override_get_read_db():
+            db = ReplicaSession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_read_db] = override_get_read_db
+        try:
+            next_tuesday = date.today() + timedelta(days=(1 - date.today().weekday()) % 7 or 7)
+            response = client.get(
+                f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots",
+                params={"start_date": str(next_tuesday), "end_date": str(next_tuesday)}
+            )
+            assert response.status_code == 200
+            assert len(response.json()) > 0
+            assert availability_cache.get((test_doctor.id, next_tuesday))
+
+            response = client.get("/api/v1/schedules/next-available", params={"doctor_id": test_doctor.id})
+            assert len(response.json()) > 0
+
+            # The replica really is behind: reads that may use it see no schedule
+            response = client.get(f"/api/v1/schedules/doctor/{test_doctor.id}")
+            assert response.json() == []
+        finally:
+            replica.dispose()
+
+    def test_get_available_slots_ndjson_stream(self, client: TestClient, test_doctor, test_schedule,
+                                               test_appointment):
+        """Test streaming a long availability range as NDJSON"""
+        start_date = date.today()
+        end_date = start_date + timedelta(days=180)
+
+        response = client.get(
+            f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots",
+            params={"start_date": str(start_date), "end_date": str(end_date)},
+            headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        slots = [json.loads(line) for line in response.text.splitlines()]
+        tuesdays = {slot["date"] for slot in slots}
+        assert len(tuesdays) >= 25
+        assert all(date.fromisoformat(day).weekday() == 1 for day in tuesdays)
+        assert len(slots) == len(tuesdays) * 16 - 1  # one booked slot
+        assert {"date": str(test_appointment.appointment_date), "time": "10:00:00",
+                "doctor_id": test_doctor.id} not in slots
+
+    def test_get_available_slots_ndjson_range_limit(self, client: TestClient, test_doctor):
+        """Test streamed ranges are capped separately from JSON ranges"""
+        start_date = date.today()
+        response = client.get(
+            f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots",
+            params={"start_date": str(start_date), "end_date": str(start_date + timedelta(days=400))},
+            headers={"Accept": "application/x-ndjson"}
+        )
+        assert response.status_code == 400
+        assert "Date range cannot exceed 365 days" in response.json()["detail"]
+
+    def test_get_available_slots_compact_formats(self, client: TestClient, test_doctor, test_schedule,
+                                                 test_appointment):
+        """Test the runs and bitmap encodings of available slots"""
+        day = str(test_appointment.appointment_date)
+        url = f"/api/v1/schedules/doctor/{test_doctor.id}/available-slots"
+
+        response = client.get(url, params={"start_date": day, "end_date": day, "format": "runs"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["doctor_id"] == test_doctor.id
+        assert data["format"] == "runs"
+        # 09:00-10:00 and 10:30-17:00 around the booked 10:00 slot
+        assert data["days"] == [{"date": day, "runs": [[540, 30, 2], [630, 30, 13]]}]
+
+        response = client.get(url, params={"start_date": day, "end_date": day, "format": "bitmap"})
+        day_data = response.json()["days"][0]
+        assert (day_data["start"], day_data["step"]) == (540, 30)
+        bits = int.from_bytes(base64.b64decode(day_data["bitmap"]), "little")
+        assert bits == 0xFFFF & ~(1 << 2)
+
+        response = client.get(url, params={"start_date": day, "end_date": day, "format": "csv"})
+        assert response.status_code == 422
+
+    def test_next_available_across_doctors(self, client: TestClient, test_db, test_doctor, test_schedule,
+                                           test_appointment):
+        """Test next-available merges slots from every doctor in time order"""
+        other = User(
+            username="dr_other", email="dr.other@example.com", full_name="Dr. Other",
+            hashed_password="x", role=UserRole.DOCTOR, is_active=True
+        )
+        test_db.add(other)
+        test_db.commit()
+        test_db.add(Schedule(doctor_id=other.id, day_of_week=1, start_time=time(9, 15),
+                             end_time=time(10, 15), slot_duration=30))
+        test_db.commit()
+
+        tuesday = test_appointment.appointment_date
+        response = client.get(
+            "/api/v1/schedules/next-available",
+            params={"limit": 5, "from_date": str(tuesday)}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [(slot["time"], slot["doctor_id"]) for slot in data] == [
+            ("09:00:00", test_doctor.id),
+            ("09:15:00", other.id),
+            ("09:30:00", test_doctor.id),
+            ("09:45:00", other.id),
+            ("10:30:00", test_doctor.id),  # 10:00 is booked
+        ]
+        assert all(slot["date"] == str(tuesday) for slot in data)
+        assert data[1]["doctor_name"] == "Dr. Other"
+
+        # Filtering by doctor only returns that doctor's slots
+        response = client.get(
+            "/api/v1/schedules/next-available",
+            params={"limit": 3, "from_date": str(tuesday), "doctor_id": other.id}
+        )
+        data = response.json()
+        assert [(slot["date"], slot["time"]) for slot in data] == [
+            (str(tuesday), "09:15:00"),
+            (str(tuesday), "09:45:00"),
+            (str(tuesday + timedelta(days=7)), "09:15:00"),
+        ]
+        assert all(slot["doctor_id"] == other.id for slot in data)
+
+    def test_next_available_without_schedules(self, client: TestClient, test_doctor):
+        """Test next-available returns nothing when no doctor has a schedule"""
+        response = client.get("/api/v1/schedules/next-available")
+        assert response.status_code == 200
+        assert response.json() == []
+
     def test_get_available_slots_invalid_date_range(self, client: TestClient, test_doctor):
         """Test available slots with invalid date range"""
         start_date = date.today()
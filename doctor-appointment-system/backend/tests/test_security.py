@@ -1,10 +1,16 @@
 import pytest
 from datetime import timedelta
+from unittest.mock import patch
+from app.core.config import settings
 from app.core.security import (
     verify_password,
     get_password_hash,
     create_access_token,
-    decode_access_token
+    decode_access_token,
+    token_cache,
+    calibrate_bcrypt_rounds,
+    configure_bcrypt_rounds,
+    password_needs_rehash
 )
 
 
@@ -120,4 +126,43 @@ class TestSecurity:
             tampered_token = token + "TAMPERED"
 
         payload = decode_access_token(tampered_token)
-        assert payload is None
\ No newline at end of file
+        assert payload is None
+
+    def test_repeat_decode_served_from_cache(self):
+        """Test a repeated token skips signature verification"""
+        token = create_access_token({"sub": "cached_user", "user_id": 7})
+        first = decode_access_token(token)
+
+        with patch("app.core.security.jwt.decode") as jwt_decode:
+            second = decode_access_token(token)
+
+        jwt_decode.assert_not_called()
+        assert second == first
+        second["sub"] = "changed"
+        assert decode_access_token(token)["sub"] == "cached_user"
+
+    def test_invalid_token_not_cached(self):
+        """Test rejected tokens are verified again on every request"""
+        token = create_access_token({"sub": "testuser"}) + "TAMPERED"
+        entries = len(token_cache)
+
+        assert decode_access_token(token) is None
+        assert decode_access_token(token) is None
+        assert len(token_cache) == entries
+
+    def test_calibrate_bcrypt_rounds_bounds(self):
+        """Test calibration stays between the minimum and maximum cost"""
+        assert calibrate_bcrypt_rounds(0, min_rounds=4, max_rounds=6) == 4
+        assert calibrate_bcrypt_rounds(3600, min_rounds=4, max_rounds=6) == 6
+
+    def test_password_needs_rehash_below_cost(self):
+        """Test only hashes made at a lower cost than the configured one are flagged"""
+        rounds = settings.BCRYPT_ROUNDS
+        old_hash = get_password_hash("password123")
+        try:
+            configure_bcrypt_rounds(rounds + 1)
+            assert password_needs_rehash(old_hash) is True
+            assert password_needs_rehash(get_password_hash("password123")) is False
+        finally:
+            configure_bcrypt_rounds(rounds)
+        assert password_needs_rehash(get_password_hash("password123", rounds=rounds + 1)) is False
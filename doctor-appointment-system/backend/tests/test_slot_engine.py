@@ -0,0 +1,96 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, time, timedelta
+
+from app.core.slot_engine import (
+    WeeklySlotMap, encode_bitmap, encode_runs, iter_minutes, iter_slots, minute_of, render_slots_json,
+    render_slots_ndjson, time_of
+)
+
+ScheduleRow = namedtuple("ScheduleRow", "day_of_week start_time end_time slot_duration")
+
+# 2030-01-07 is a Monday
+MONDAY = date(2030, 1, 7)
+
+
+class TestSlotEngine:
+    """Test the bitmap slot engine"""
+
+    def test_minute_conversions(self):
+        """Test converting between times and minute offsets"""
+        assert minute_of(time(9, 30)) == 570
+        assert time_of(570) == time(9, 30)
+        assert list(iter_minutes((1 << 5) | (1 << 600) | 1)) == [0, 5, 600]
+
+    def test_compile_split_shift(self):
+        """Test a split shift compiles into one bitmap for the weekday"""
+        slot_map = WeeklySlotMap.compile([
+            ScheduleRow(0, time(9, 0), time(10, 0), 30),
+            ScheduleRow(0, time(14, 0), time(15, 0), 20),
+        ])
+
+        minutes = list(iter_minutes(slot_map.mask_for(MONDAY)))
+        assert minutes == [540, 570, 840, 860, 880]
+        assert slot_map.mask_for(MONDAY + timedelta(days=1)) == 0
+
+    def test_free_days_clears_booked_slots(self):
+        """Test booked slots are removed and fully booked days are skipped"""
+        slot_map = WeeklySlotMap.compile([
+            ScheduleRow(0, time(9, 0), time(10, 0), 30),
+            ScheduleRow(1, time(9, 0), time(9, 30), 30),
+        ])
+        tuesday = MONDAY + timedelta(days=1)
+
+        days = slot_map.free_days(MONDAY, MONDAY + timedelta(days=7), [
+            (MONDAY, time(9, 0)),
+            (tuesday, time(9, 0)),
+        ])
+
+        slots = list(iter_slots(days))
+        assert slots == [
+            (MONDAY, time(9, 30)),
+            (MONDAY + timedelta(days=7), time(9, 0)),
+            (MONDAY + timedelta(days=7), time(9, 30)),
+        ]
+
+    def test_empty_schedule(self):
+        """Test a doctor without schedules has no slots"""
+        slot_map = WeeklySlotMap.compile([])
+        assert not slot_map
+        assert slot_map.free_days(MONDAY, MONDAY + timedelta(days=30)) == []
+
+    def test_render_slots_json(self):
+        """Test rendered JSON matches the AvailableSlot response shape"""
+        slot_map = WeeklySlotMap.compile([ScheduleRow(0, time(9, 0), time(10, 0), 30)])
+        days = slot_map.free_days(MONDAY, MONDAY)
+
+        assert json.loads(render_slots_json(7, days)) == [
+            {"date": "2030-01-07", "time": "09:00:00", "doctor_id": 7},
+            {"date": "2030-01-07", "time": "09:30:00", "doctor_id": 7},
+        ]
+        assert json.loads(render_slots_json(7, [])) == []
+
+    def test_render_slots_ndjson(self):
+        """Test NDJSON rendering yields one chunk of lines per day"""
+        slot_map = WeeklySlotMap.compile([ScheduleRow(0, time(9, 0), time(10, 0), 30)])
+        chunks = list(render_slots_ndjson(7, slot_map.free_days(MONDAY, MONDAY + timedelta(days=7))))
+
+        assert len(chunks) == 2
+        lines = chunks[1].decode().splitlines()
+        assert [json.loads(line)["time"] for line in lines] == ["09:00:00", "09:30:00"]
+
+    def test_encode_runs(self):
+        """Test evenly spaced slots collapse into start/step/count runs"""
+        mask = sum(1 << m for m in [540, 570, 600, 840, 860, 880, 1000])
+        assert encode_runs(mask) == [[540, 30, 3], [840, 20, 3], [1000, 0, 1]]
+        assert encode_runs(0) == []
+
+    def test_encode_bitmap(self):
+        """Test the bitmap is laid out on the slot grid"""
+        mask = sum(1 << m for m in [540, 570, 660])  # 09:00, 09:30, 11:00
+        start, step, bitmap = encode_bitmap(mask)
+
+        assert (start, step) == (540, 30)
+        bits = int.from_bytes(base64.b64decode(bitmap), "little")
+        assert [start + i * step for i in range(bits.bit_length()) if bits >> i & 1] == [540, 570, 660]
@@ -56,4 +56,10 @@ class TestUsers:
         assert response.status_code == 200
         data = response.json()
         assert len(data) >= 1
-        assert any(d["id"] == test_doctor.id for d in data)
\ No newline at end of file
+        assert any(d["id"] == test_doctor.id for d in data)
+
+    def test_user_schemas_document_email_format(self, client: TestClient):
+        """Test user responses and the list rows both document email addresses"""
+        schemas = client.get("/openapi.json").json()["components"]["schemas"]
+        assert schemas["UserResponse"]["properties"]["email"]["format"] == "email"
+        assert schemas["UserRowResponse"]["properties"]["email"]["format"] == "email"
@@ -10,6 +10,8 @@ API_BASE_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 # Initialize session storage
 if 'auth_tokens' not in st.session_state:
     st.session_state.auth_tokens = {}
+if 'refresh_tokens' not in st.session_state:
+    st.session_state.refresh_tokens = {}
 
 
 # Helper functions
@@ -32,10 +34,17 @@ def get_auth_token():
     return st.session_state.auth_tokens.get(session_id)
 
 
-def set_auth_token(token):
-    """Set auth token for current session"""
+def get_refresh_token():
+    """Get refresh token for current session"""
+    return st.session_state.refresh_tokens.get(get_session_id())
+
+
+def set_auth_token(token, refresh_token=None):
+    """Set auth token, and the refresh token when one was issued, for current session"""
     session_id = get_session_id()
     st.session_state.auth_tokens[session_id] = token
+    if refresh_token:
+        st.session_state.refresh_tokens[session_id] = refresh_token
 
 
 def clear_auth_token():
@@ -43,32 +52,106 @@ def clear_auth_token():
     session_id = get_session_id()
     if session_id in st.session_state.auth_tokens:
         del st.session_state.auth_tokens[session_id]
+    st.session_state.refresh_tokens.pop(session_id, None)
     # Also clear query params
     st.query_params.clear()
 
 
-def make_request(method, endpoint, json=None, params=None):
+def session_cookies(with_refresh=False):
+    """Cookies carrying the current session's tokens.
+
+    The refresh token is only sent to /auth/refresh and /auth/logout, matching
+    the /api/v1/auth path the backend scopes that cookie to.
+    """
+    cookies = {}
+    token = get_auth_token()
+    if token:
+        cookies['access_token'] = token
+    refresh_token = get_refresh_token()
+    if with_refresh and refresh_token:
+        cookies['refresh_token'] = refresh_token
+    return cookies
+
+
+def forwarded_headers():
+    """X-Forwarded-For naming the browser, so the backend rate limits each user instead of this server"""
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        client = get_instance().get_client(get_script_run_ctx().session_id)
+        remote_ip = client.request.remote_ip
+    except Exception:
+        return {}
+    return {'X-Forwarded-For': remote_ip} if remote_ip else {}
+
+
+def refresh_session():
+    """Renew an expired access token with the refresh token instead of logging in again"""
+    response = requests.post(
+        f"{API_BASE_URL}/api/v1/auth/refresh",
+        cookies=session_cookies(with_refresh=True),
+        headers=forwarded_headers()
+    )
+    if response.status_code != 200:
+        return False
+    data = response.json()
+    set_auth_token(data["access_token"], data["refresh_token"])
+    return True
+
+
+def make_request(method, endpoint, json=None, params=None, with_refresh=False):
     """Make API request with error handling"""
     url = f"{API_BASE_URL}{endpoint}"
     try:
-        cookies = {}
-        token = get_auth_token()
-        if token:
-            cookies = {'access_token': token}
-
         response = requests.request(
             method=method,
             url=url,
             json=json,
             params=params,
-            cookies=cookies
+            cookies=session_cookies(with_refresh),
+            headers=forwarded_headers()
         )
+        if response.status_code == 401 and get_refresh_token() and not endpoint.startswith("/api/v1/auth/"):
+            if refresh_session():
+                response = requests.request(
+                    method=method,
+                    url=url,
+                    json=json,
+                    params=params,
+                    cookies=session_cookies(),
+                    headers=forwarded_headers()
+                )
         return response
     except requests.exceptions.ConnectionError:
         st.error("Unable to connect to the backend. Please ensure the backend is running.")
         return None
 
 
+def fetch_my_appointments(params=None):
+    """Fetch the current user's appointments, following X-Next-Cursor across pages"""
+    params = dict(params or {})
+    appointments = []
+    while True:
+        response = make_request("GET", "/api/v1/appointments/my", params=params)
+        if not response or response.status_code != 200:
+            return None
+        appointments.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return appointments
+        params["cursor"] = cursor
+
+
+def expand_slot_runs(days):
+    """Expand compact "runs" availability ([start_minute, step, count]) into HH:MM:SS times"""
+    return [
+        f"{(start + i * step) // 60:02d}:{(start + i * step) % 60:02d}:00"
+        for day in days
+        for start, step, count in day["runs"]
+        for i in range(count)
+    ]
+
+
 def check_existing_session():
     """Check if user has an existing valid session"""
     if 'logged_in' not in st.session_state:
@@ -79,6 +162,8 @@ def check_existing_session():
         token = get_auth_token()
         if token:
             response = make_request("GET", "/api/v1/auth/me")
+            if response and response.status_code == 401 and get_refresh_token() and refresh_session():
+                response = make_request("GET", "/api/v1/auth/me")
             if response and response.status_code == 200:
                 # Valid session exists
                 user_data = response.json()
@@ -105,14 +190,14 @@ def login(username, password):
         st.session_state.logged_in = True
         st.session_state.user = data["user"]
         # Store token in session state with session ID
-        set_auth_token(data["access_token"])
+        set_auth_token(data["access_token"], data["refresh_token"])
         return True
     return False
 
 
 def logout():
     """Logout user"""
-    make_request("POST", "/api/v1/auth/logout")
+    make_request("POST", "/api/v1/auth/logout", with_refresh=True)
     # Clear session state
     st.session_state.logged_in = False
     st.session_state.user = None
@@ -293,16 +378,10 @@ else:
             # Filter appointments
             filter_date = st.date_input("Filter by date", value=date.today())
 
-            response = make_request("GET", "/api/v1/appointments/my")
-            if response and response.status_code == 200:
-                appointments = response.json()
-
-                # Filter by date if requested
-                filtered_appointments = [
-                    apt for apt in appointments
-                    if apt['appointment_date'] == str(filter_date)
-                ] if filter_date else appointments
-
+            # Filter by date on the server if requested
+            date_params = {"from_date": str(filter_date), "to_date": str(filter_date)} if filter_date else None
+            filtered_appointments = fetch_my_appointments(date_params)
+            if filtered_appointments is not None:
                 if filtered_appointments:
                     for apt in filtered_appointments:
                         with st.container():
@@ -332,10 +411,8 @@ else:
 
         with tab3:
             st.subheader("Statistics")
-            response = make_request("GET", "/api/v1/appointments/my")
-            if response and response.status_code == 200:
-                appointments = response.json()
-
+            appointments = fetch_my_appointments()
+            if appointments is not None:
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     total = len(appointments)
@@ -356,6 +433,40 @@ else:
         with tab1:
             st.subheader("Book New Appointment")
 
+            # Earliest free slots across all doctors in a single request
+            with st.expander("Next available appointments"):
+                next_response = make_request("GET", "/api/v1/schedules/next-available", params={"limit": 5})
+                if next_response and next_response.status_code == 200:
+                    next_slots = next_response.json()
+                    if next_slots:
+                        next_slot = st.radio(
+                            "Earliest openings",
+                            options=next_slots,
+                            format_func=lambda x: f"{x['date']} at {x['time']} - Dr. {x['doctor_name']}"
+                        )
+                        next_reason = st.text_input("Reason for appointment", key="next_reason")
+                        if st.button("Book This Slot"):
+                            if next_reason:
+                                booking_response = make_request(
+                                    "POST",
+                                    "/api/v1/appointments/",
+                                    json={
+                                        "doctor_id": next_slot['doctor_id'],
+                                        "appointment_date": next_slot['date'],
+                                        "appointment_time": next_slot['time'],
+                                        "reason": next_reason
+                                    }
+                                )
+                                if booking_response and booking_response.status_code == 200:
+                                    st.success("Appointment booked successfully!")
+                                    st.balloons()
+                                elif booking_response:
+                                    st.error(booking_response.json().get("detail", "Booking failed"))
+                            else:
+                                st.error("Please provide a reason for the appointment")
+                    else:
+                        st.info("No open slots in the next 30 days.")
+
             # Get list of doctors
             response = make_request("GET", "/api/v1/users/doctors")
             if response and response.status_code == 200:
@@ -384,16 +495,17 @@ else:
                                 f"/api/v1/schedules/doctor/{selected_doctor['id']}/available-slots",
                                 params={
                                     "start_date": str(appointment_date),
-                                    "end_date": str(appointment_date)
+                                    "end_date": str(appointment_date),
+                                    "format": "runs"
                                 }
                             )
 
                             if slots_response and slots_response.status_code == 200:
-                                available_slots = slots_response.json()
+                                available_slots = expand_slot_runs(slots_response.json()["days"])
 
                                 if available_slots:
                                     with col2:
-                                        time_options = [slot['time'] for slot in available_slots]
+                                        time_options = available_slots
                                         selected_time = st.selectbox("Select Time", options=time_options)
 
                                     reason = st.text_area("Reason for appointment")
@@ -426,10 +538,8 @@ else:
         with tab2:
             st.subheader("My Appointments")
 
-            response = make_request("GET", "/api/v1/appointments/my")
-            if response and response.status_code == 200:
-                appointments = response.json()
-
+            appointments = fetch_my_appointments()
+            if appointments is not None:
                 if appointments:
                     # Group by status
                     scheduled = [a for a in appointments if a['status'] == 'scheduled']